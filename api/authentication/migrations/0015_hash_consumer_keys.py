@@ -0,0 +1,41 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_consumer_keys(apps, schema_editor):
+    """Keep existing keys working by storing their prefix and digest"""
+    ConsumerKey = apps.get_model("authentication", "ConsumerKey")
+    consumer_keys = list(ConsumerKey.objects.all())
+    for consumer_key in consumer_keys:
+        consumer_key.prefix = consumer_key.key[:8]
+        consumer_key.digest = hashlib.sha256(consumer_key.key.encode()).hexdigest()
+    ConsumerKey.objects.bulk_update(consumer_keys, ["prefix", "digest"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0014_auto_20200508_0906'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumerkey',
+            name='prefix',
+            field=models.CharField(db_index=True, default='', max_length=8),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='consumerkey',
+            name='digest',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        # The raw keys can not be restored from their digests
+        migrations.RunPython(hash_consumer_keys),
+        migrations.RemoveField(
+            model_name='consumerkey',
+            name='key',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0015_hash_consumer_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIKeyActivityRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=50)),
+                ('method', models.CharField(max_length=10)),
+                ('granularity', models.CharField(choices=[('minute', 'minute'), ('hour', 'hour'), ('day', 'day')], max_length=10)),
+                ('period_start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_key_activity_rollups', to='authentication.Company')),
+                ('key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_rollups', to='authentication.ConsumerKey')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='apikeyactivityrollup',
+            index=models.Index(fields=['company', 'granularity', 'period_start'], name='authenticat_company_5e4774_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='apikeyactivityrollup',
+            unique_together={('key', 'granularity', 'period_start', 'url', 'method')},
+        ),
+    ]
@@ -7,7 +7,7 @@ from django.core.mail import EmailMultiAlternatives
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.urls import reverse
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
 from django.db import models
 from django.contrib.auth import get_user_model, password_validation
@@ -16,6 +16,7 @@ from django.dispatch import receiver
 from django.core.mail import send_mail
 from django.db import IntegrityError
 from django.conf import settings
+from django.core.cache import caches
 from django.contrib.auth.models import (
     BaseUserManager,
     AbstractBaseUser,
@@ -26,7 +27,7 @@ from rest_framework.exceptions import ValidationError
 
 from core.models import AbstractBaseModel, ActiveObjectsQuerySet
 from core.utils.validators import validate_phone_number, validate_required_arguments
-from core.utils.helpers import generate_token
+from core.utils.helpers import generate_token, get_cache_key, get_key_digest
 
 
 class UserManager(BaseUserManager):
@@ -311,6 +312,12 @@ class ResetPasswordToken(models.Model):
 
 
 class ConsumerKey(models.Model):
+    """
+    Api key of an integration, only a prefix to find it by and the sha256
+    digest of the key are stored. The raw key is available on the instance
+    that created it and is shown to the user only once
+    """
+    PREFIX_LENGTH = 8
 
     @staticmethod
     def generate_key():
@@ -333,26 +340,55 @@ class ConsumerKey(models.Model):
         auto_now_add=True
     )
 
-    # Key field, though it is not the primary key of the model
-    key = models.CharField(
-        max_length=300,
-        db_index=True,
-        unique=True
+    prefix = models.CharField(
+        max_length=PREFIX_LENGTH,
+        db_index=True
     )
+    digest = models.CharField(max_length=64)
     name = models.CharField(
         max_length=70,
         unique=True
     )
    
     def save(self, *args, **kwargs):
-        if not self.key:
+        if not self.digest:
             self.key = self.generate_key()
+            self.prefix = self.key[:self.PREFIX_LENGTH]
+            self.digest = get_key_digest(self.key)
         return super().save(*args, **kwargs)
 
     def __str__(self):
         return "Consumer key: {user}".format(user=self.user)
 
 
+CONSUMER_KEY_CACHE_PREFIX = "consumer_key"
+
+def get_consumer_key_cache_key(digest):
+    """The raw key is never part of the cache key, only its digest"""
+    return get_cache_key(CONSUMER_KEY_CACHE_PREFIX, digest)
+
+@receiver([post_save, post_delete], sender=ConsumerKey, dispatch_uid="invalidate_consumer_key")
+def invalidate_consumer_key(sender, instance, **kwargs):
+    """Drop the cached key so a deleted key stops authenticating immediately"""
+    caches[settings.CONSUMER_KEY_CACHE_ALIAS].delete(get_consumer_key_cache_key(instance.digest))
+
+@receiver(post_save, sender=User, dispatch_uid="invalidate_consumer_key_user")
+def invalidate_consumer_key_user(sender, instance, **kwargs):
+    """The cached key holds its user, drop it when an api key agent changes"""
+    if not instance.is_api_key_agent:
+        return
+    digests = ConsumerKey.objects.filter(user=instance).values_list("digest", flat=True)
+    caches[settings.CONSUMER_KEY_CACHE_ALIAS].delete_many([get_consumer_key_cache_key(digest) for digest in digests])
+
+@receiver(post_save, sender=Company, dispatch_uid="invalidate_consumer_key_company")
+def invalidate_consumer_key_company(sender, instance, created, **kwargs):
+    """The cached key holds the company of its user too, drop the keys of a company that changes"""
+    if created:
+        return
+    digests = ConsumerKey.objects.filter(user__company=instance).values_list("digest", flat=True)
+    caches[settings.CONSUMER_KEY_CACHE_ALIAS].delete_many([get_consumer_key_cache_key(digest) for digest in digests])
+
+
 class APIKeyActivity(AbstractBaseModel):
     company = models.ForeignKey(
         "Company",
@@ -368,6 +404,37 @@ class APIKeyActivity(AbstractBaseModel):
     method = models.CharField(max_length=10)
 
 
+ACTIVITY_ROLLUP_GRANULARITIES = (
+    ("minute", "minute"),
+    ("hour", "hour"),
+    ("day", "day")
+)
+
+class APIKeyActivityRollup(models.Model):
+    """Number of requests of a key to an endpoint per minute, hour or day"""
+    company = models.ForeignKey(
+        "Company",
+        on_delete=models.CASCADE,
+        related_name="api_key_activity_rollups"
+    )
+    key = models.ForeignKey(
+        "ConsumerKey",
+        on_delete=models.CASCADE,
+        related_name="activity_rollups"
+    )
+    url = models.CharField(max_length=50)
+    method = models.CharField(max_length=10)
+    granularity = models.CharField(max_length=10, choices=ACTIVITY_ROLLUP_GRANULARITIES)
+    period_start = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("key", "granularity", "period_start", "url", "method")
+        indexes = [
+            models.Index(fields=["company", "granularity", "period_start"]),
+        ]
+
+
 @receiver(post_save, sender=AddStaffModel, dispatch_uid="create_staff_registration_token")
 def send_staff_registry_email(sender, instance, **kwargs):
     subject = "Jambo SMS Staff registration link"
@@ -12,7 +12,7 @@ from rest_framework.exceptions import ValidationError
 
 from core.utils.validators import validate_phone_number
 from core.utils.helpers import get_errored_integrity_field, raise_validation_error
-from .models import User, AddStaffModel, Company, ResetPasswordToken, ConsumerKey, APIKeyActivity
+from .models import User, AddStaffModel, Company, ResetPasswordToken, ConsumerKey, APIKeyActivityRollup
 
 fake = Faker()
 class CompanySerializer(serializers.ModelSerializer):
@@ -220,6 +220,8 @@ class PasswordResetSerializer(serializers.Serializer):
 
 
 class CreateConsumerKeySerializer(serializers.ModelSerializer):
+    # Only the instance that generated the key has it, listed keys show their prefix
+    key = serializers.CharField(read_only=True)
 
     def save(self, **kwargs):
         user = self.create_bot_user()
@@ -237,18 +239,18 @@ class CreateConsumerKeySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ConsumerKey
-        fields = ["key", "id", "name"]
+        fields = ["key", "prefix", "id", "name"]
         extra_kwargs = {
             'user': {'read_only':True},
-            'key': {'read_only':True}
+            'prefix': {'read_only':True}
             }
 
     
-class KeyActivitySerializer(serializers.ModelSerializer):
+class KeyActivityRollupSerializer(serializers.ModelSerializer):
 
     class Meta:
-        model = APIKeyActivity
-        fields = "__all__"
+        model = APIKeyActivityRollup
+        fields = ["key", "url", "method", "granularity", "period_start", "count"]
 
 class ProfileSerializer(serializers.ModelSerializer):
 
@@ -2,15 +2,19 @@ from jwt import encode, decode
 
 from django.core.mail import send_mail
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from rest_framework.response import Response
 from rest_framework import status, generics
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
 
 from . import serializers
 from .models import (AddStaffModel, Company, ResetPasswordToken,
- ConsumerKey, APIKeyActivity, User)
+ ConsumerKey, APIKeyActivityRollup, ACTIVITY_ROLLUP_GRANULARITIES, User)
+from core.pagination import ApproximateCountPagination
 from core.permissions import (IsAdmin, IsDirector, IsCompanyOwned,
  IsSuperUser, IsReseller, IsVerified)
 from core.views import CustomCreateAPIView, CustomDestroyAPIView, CustomListAPIView
@@ -149,22 +153,51 @@ class DeleteConsumerKeyView(CustomDestroyAPIView):
         instance.delete()
 
 
-class GetKeyActivityKeyView(generics.ListAPIView):
-
+class ActivityRollupMixin:
+    """Filter activity rollups by the granularity, since and until query params"""
+
+    def filter_rollups(self, queryset):
+        params = self.request.query_params
+        granularity = params.get("granularity", "hour")
+        if granularity not in dict(ACTIVITY_ROLLUP_GRANULARITIES):
+            raise ValidationError({"granularity": [f'"{granularity}" is not a valid choice.']})
+        queryset = queryset.filter(granularity=granularity)
+        for param, lookup in (("since", "period_start__gte"), ("until", "period_start__lt")):
+            if not params.get(param):
+                continue
+            moment = parse_datetime(params[param])
+            if moment is None:
+                raise ValidationError({param: ["Enter a valid date/time."]})
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            queryset = queryset.filter(**{lookup: moment})
+        return queryset.order_by("-period_start", "url", "method")
+
+
+class GetKeyActivityKeyView(ActivityRollupMixin, CustomListAPIView):
+    """List the request counts of all the company keys per endpoint and period"""
     permission_classes = [IsAuthenticated,]
-    serializer_class = serializers.KeyActivitySerializer
-    queryset = APIKeyActivity.objects.all()
+    serializer_class = serializers.KeyActivityRollupSerializer
+    pagination_class = ApproximateCountPagination
+    queryset = APIKeyActivityRollup.objects.all()
 
+    def get_queryset(self):
+        return self.filter_rollups(super().get_queryset())
 
-class GetSingleKeyActivityKeyView(generics.ListAPIView):
 
+class GetSingleKeyActivityKeyView(ActivityRollupMixin, generics.ListAPIView):
+    """List the request counts of a single key per endpoint and period"""
     permission_classes = [IsAuthenticated,]
-    serializer_class = serializers.KeyActivitySerializer
+    serializer_class = serializers.KeyActivityRollupSerializer
+    pagination_class = ApproximateCountPagination
     queryset = ConsumerKey.objects.all()
 
+    def get_queryset(self):
+        return super().get_queryset().filter(company=self.request.user.company)
+
     def get(self, request, *args, **kwargs):
         instance = self.get_object()
-        queryset = instance.activity.all()
+        queryset = self.filter_rollups(instance.activity_rollups.all())
         page = self.paginate_queryset(queryset)
         serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0014_auto_20200508_0906'),
+        ('payment', '0010_auto_20200904_0940'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('ref_no', models.CharField(max_length=60, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='ref_no',
+            field=models.OneToOneField(db_column='ref_no', null=True, on_delete=django.db.models.deletion.SET_NULL, to='payment.PaymentKey', to_field='ref_no'),
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(choices=[('sms', 'sms'), ('email', 'email')], default='sms', max_length=10)),
+                ('amount', models.IntegerField()),
+                ('balance_after', models.IntegerField()),
+                ('reason', models.CharField(max_length=30)),
+                ('reference', models.CharField(max_length=60, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='authentication.Company')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceReservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('resource', models.CharField(choices=[('sms', 'sms'), ('email', 'email')], default='sms', max_length=10)),
+                ('amount', models.IntegerField()),
+                ('consumed', models.IntegerField(null=True)),
+                ('status', models.CharField(choices=[('held', 'held'), ('settled', 'settled')], default='held', max_length=10)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_reservations', to='authentication.Company')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
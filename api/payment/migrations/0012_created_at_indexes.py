@@ -0,0 +1,17 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0011_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['company', 'created_at', 'id'], name='payment_pay_company_48e134_idx'),
+        ),
+    ]
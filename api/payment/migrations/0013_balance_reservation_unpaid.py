@@ -0,0 +1,18 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0012_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balancereservation',
+            name='unpaid',
+            field=models.IntegerField(default=0),
+        ),
+    ]
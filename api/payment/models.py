@@ -15,6 +15,11 @@ class Payment(AbstractBaseModel):
     payment_action = models.CharField(max_length=20, choices=PAYMENT_ACTIONS, default="sms_topup")
     ref_no = models.OneToOneField("PaymentKey", on_delete=models.SET_NULL, to_field="ref_no", db_column="ref_no", null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["company", "created_at", "id"]),
+        ]
+
     def __str__(self):
         return f'Amount: {self.amount}'
 
@@ -46,3 +51,44 @@ class BrandingFee(models.Model):
 class PaymentKey(AbstractBaseModel):
     ref_no = models.CharField(max_length=60, unique=True)
     is_active = models.BooleanField(default=True)
+
+
+BALANCE_RESOURCES = (
+    ("sms", "sms"),
+    ("email", "email")
+)
+
+RESERVATION_STATUSES = (
+    ("held", "held"),
+    ("settled", "settled")
+)
+
+class LedgerEntry(models.Model):
+    """
+    Append only record of every change to a company's sms or email balance,
+    debits are negative and credits positive
+    """
+    company = models.ForeignKey(
+        "authentication.Company", on_delete=models.CASCADE, related_name="ledger_entries"
+    )
+    resource = models.CharField(max_length=10, choices=BALANCE_RESOURCES, default="sms")
+    amount = models.IntegerField()
+    balance_after = models.IntegerField()
+    reason = models.CharField(max_length=30)
+    reference = models.CharField(max_length=60, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class BalanceReservation(AbstractBaseModel):
+    """
+    Balance debited up front for a send and settled once the provider
+    has reported how much of it was actually used
+    """
+    company = models.ForeignKey(
+        "authentication.Company", on_delete=models.CASCADE, related_name="balance_reservations"
+    )
+    resource = models.CharField(max_length=10, choices=BALANCE_RESOURCES, default="sms")
+    amount = models.IntegerField()
+    consumed = models.IntegerField(null=True)
+    unpaid = models.IntegerField(default=0)
+    status = models.CharField(max_length=10, choices=RESERVATION_STATUSES, default="held")
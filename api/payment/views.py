@@ -8,6 +8,7 @@ from core.views import CustomCreateAPIView, CustomListAPIView
 from . import serializers, models
 from core.utils.helpers import raise_validation_error
 from core.views import CustomCreateAPIView, CustomListAPIView
+from core.pagination import CreatedAtCursorPagination
 from core.permissions import IsSuperUser, IsReseller
 
 class MpesaCallbackView(generics.CreateAPIView):
@@ -20,6 +21,7 @@ class PaymentListView(generics.CreateAPIView, CustomListAPIView):
     """Enables Mpesa payment for sms recharge"""
     serializer_class = serializers.PaymentSerializer
     queryset = models.Payment.objects.all()
+    pagination_class = CreatedAtCursorPagination
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
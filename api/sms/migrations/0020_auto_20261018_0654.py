@@ -0,0 +1,33 @@
+# Generated by Django 2.2.12 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0019_deliveredsms_sentsms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smsrequest',
+            name='batch_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='smsrequest',
+            name='completed_batch_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='smsrequest',
+            name='failed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='smsrequest',
+            name='sent_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
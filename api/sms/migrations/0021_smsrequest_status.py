@@ -0,0 +1,24 @@
+# Generated by Django 2.2.12 on 2026-10-18 06:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0020_auto_20261018_0654'),
+    ]
+
+    operations = [
+        # requests made before this migration were sent synchronously
+        migrations.AddField(
+            model_name='smsrequest',
+            name='status',
+            field=models.CharField(choices=[('queued', 'queued'), ('sending', 'sending'), ('sent', 'sent'), ('partially_failed', 'partially_failed'), ('failed', 'failed')], default='sent', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='smsrequest',
+            name='status',
+            field=models.CharField(choices=[('queued', 'queued'), ('sending', 'sending'), ('sent', 'sent'), ('partially_failed', 'partially_failed'), ('failed', 'failed')], default='queued', max_length=20),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:03
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0014_auto_20200508_0906'),
+        ('sms', '0021_smsrequest_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('kind', models.CharField(choices=[('members', 'members'), ('sms', 'sms'), ('personalized_sms', 'personalized_sms'), ('email', 'email')], max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('processing', 'processing'), ('completed', 'completed'), ('failed', 'failed')], default='queued', max_length=20)),
+                ('file_name', models.CharField(max_length=255)),
+                ('content', models.BinaryField()),
+                ('params', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('total_rows', models.IntegerField(default=0)),
+                ('processed_rows', models.IntegerField(default=0)),
+                ('skipped_rows', models.IntegerField(default=0)),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(null=True)),
+                ('error', django.contrib.postgres.fields.jsonb.JSONField(null=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_jobs', to='authentication.Company')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
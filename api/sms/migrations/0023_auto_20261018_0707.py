@@ -0,0 +1,25 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0011_ledger'),
+        ('sms', '0022_uploadjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smsrequest',
+            name='reservation',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sms_request', to='payment.BalanceReservation'),
+        ),
+        migrations.AddField(
+            model_name='smsrequest',
+            name='segment_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0014_auto_20200508_0906'),
+        ('sms', '0023_auto_20261018_0707'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedSMS',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('phone_number', models.CharField(max_length=30)),
+                ('message', models.CharField(max_length=800)),
+                ('status_code', models.IntegerField(null=True)),
+                ('reason', models.CharField(max_length=255)),
+                ('attempts', models.IntegerField(default=1)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failed_sms', to='authentication.Company')),
+                ('sms_request', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='failed_sms', to='sms.SMSRequest')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
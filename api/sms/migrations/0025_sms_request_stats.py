@@ -0,0 +1,32 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0024_failedsms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentsms',
+            name='sms_request',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sent_sms', to='sms.SMSRequest'),
+        ),
+        migrations.CreateModel(
+            name='SMSRequestStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('network', models.CharField(max_length=30)),
+                ('delivered', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('sms_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_stats', to='sms.SMSRequest')),
+            ],
+            options={
+                'unique_together': {('sms_request', 'network')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0025_sms_request_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailgroupmember',
+            index=models.Index(fields=['company', 'created_at', 'id'], name='sms_emailgr_company_11e1e3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailrequest',
+            index=models.Index(fields=['company', 'created_at', 'id'], name='sms_emailre_company_050de9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupmember',
+            index=models.Index(fields=['company', 'created_at', 'id'], name='sms_groupme_company_8e2b22_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='smsrequest',
+            index=models.Index(fields=['company', 'created_at', 'id'], name='sms_smsrequ_company_5b4843_idx'),
+        ),
+    ]
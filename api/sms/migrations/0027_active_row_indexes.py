@@ -0,0 +1,45 @@
+# Generated by Django 2.2.12 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0026_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='emailgroupmember',
+            name='sms_emailgr_company_11e1e3_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='emailrequest',
+            name='sms_emailre_company_050de9_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='groupmember',
+            name='sms_groupme_company_8e2b22_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='smsrequest',
+            name='sms_smsrequ_company_5b4843_idx',
+        ),
+        migrations.AddIndex(
+            model_name='emailgroupmember',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['company', 'created_at', 'id'], name='sms_emailmember_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailrequest',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['company', 'created_at', 'id'], name='sms_emailrequest_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupmember',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['company', 'created_at', 'id'], name='sms_groupmember_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='smsrequest',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['company', 'created_at', 'id'], name='sms_smsrequest_active_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.12 on 2026-10-18 08:10
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0027_active_row_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnmatchedDeliveryReport',
+            fields=[
+                ('message_id', models.CharField(max_length=60, primary_key=True, serialize=False)),
+                ('report', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
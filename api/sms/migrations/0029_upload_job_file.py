@@ -0,0 +1,23 @@
+# Generated by Django 2.2.12 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0028_unmatched_delivery_report'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='uploadjob',
+            name='content',
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='file',
+            field=models.FileField(default='', max_length=255, upload_to='upload_jobs/'),
+            preserve_default=False,
+        ),
+    ]
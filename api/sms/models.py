@@ -1,8 +1,35 @@
+from django.conf import settings
+from django.core.cache import caches
 from django.db import models
-from django.contrib.postgres.fields import ArrayField
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.postgres.fields import ArrayField, JSONField
 from core.models import AbstractBaseModel, ActiveObjectsQuerySet
 from core.utils.validators import validate_phone_list, validate_phone_number
-
+from core.utils.helpers import get_cache_key
+
+SMS_REQUEST_STATUSES = (
+    ("queued", "queued"),
+    ("sending", "sending"),
+    ("sent", "sent"),
+    ("partially_failed", "partially_failed"),
+    ("failed", "failed")
+)
+
+UPLOAD_JOB_KINDS = (
+    ("members", "members"),
+    ("sms", "sms"),
+    ("personalized_sms", "personalized_sms"),
+    ("email", "email")
+)
+
+UPLOAD_JOB_STATUSES = (
+    ("queued", "queued"),
+    ("processing", "processing"),
+    ("completed", "completed"),
+    ("failed", "failed")
+)
 
 class SMSRequest(AbstractBaseModel):
     company = models.ForeignKey(
@@ -14,9 +41,25 @@ class SMSRequest(AbstractBaseModel):
         base_field=models.CharField(max_length=20), blank=True, null=True
     )
     sms_count = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=SMS_REQUEST_STATUSES, default="queued")
+    sent_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    batch_count = models.IntegerField(default=0)
+    completed_batch_count = models.IntegerField(default=0)
+    segment_count = models.IntegerField(default=0)
+    reservation = models.OneToOneField(
+        "payment.BalanceReservation", on_delete=models.SET_NULL, null=True, related_name="sms_request"
+    )
 
     objects = ActiveObjectsQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["company", "created_at", "id"], name="sms_smsrequest_active_idx", condition=Q(is_deleted=False)
+            ),
+        ]
+
 class EmailRequest(AbstractBaseModel):
     company = models.ForeignKey(
         "authentication.Company", on_delete=models.CASCADE,related_name="email_requests"
@@ -31,6 +74,13 @@ class EmailRequest(AbstractBaseModel):
 
     objects = ActiveObjectsQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["company", "created_at", "id"], name="sms_emailrequest_active_idx", condition=Q(is_deleted=False)
+            ),
+        ]
+
 
 class SMSGroup(models.Model):
     company = models.ForeignKey(
@@ -76,6 +126,11 @@ class GroupMember(AbstractBaseModel):
 
     class Meta:
         unique_together = ('company', 'phone',)
+        indexes = [
+            models.Index(
+                fields=["company", "created_at", "id"], name="sms_groupmember_active_idx", condition=Q(is_deleted=False)
+            ),
+        ]
 
 
 class EmailGroupMember(AbstractBaseModel):
@@ -91,6 +146,11 @@ class EmailGroupMember(AbstractBaseModel):
 
     class Meta:
         unique_together = ('company', 'email',)
+        indexes = [
+            models.Index(
+                fields=["company", "created_at", "id"], name="sms_emailmember_active_idx", condition=Q(is_deleted=False)
+            ),
+        ]
 
 
 class SMSBranding(models.Model):
@@ -102,15 +162,58 @@ class SMSBranding(models.Model):
     )
 
 
+SENDER_ID_CACHE_PREFIX = "sender_id"
+
+@receiver([post_save, post_delete], sender=SMSBranding)
+def invalidate_sender_id(sender, instance, **kwargs):
+    """Drop the cached sender id so branding changes apply to the next send"""
+    cache_key = get_cache_key(SENDER_ID_CACHE_PREFIX, instance.company_id)
+    caches[settings.SENDER_ID_CACHE_ALIAS].delete(cache_key)
+
+
 class SentSMS(models.Model):
     company = models.ForeignKey(
         "authentication.Company", on_delete=models.CASCADE,related_name="sent_sms"
     )
+    sms_request = models.ForeignKey(
+        "SMSRequest", on_delete=models.SET_NULL, null=True, related_name="sent_sms"
+    )
     message_id = models.CharField(max_length=60, primary_key=True)
     status = models.CharField(max_length=30)
     status_code = models.IntegerField()
 
 
+class SMSRequestStats(models.Model):
+    """
+    Delivery report counters of an sms request per network, maintained as
+    reports are flushed so that reading them never scans SentSMS
+    """
+    sms_request = models.ForeignKey(
+        "SMSRequest", on_delete=models.CASCADE, related_name="delivery_stats"
+    )
+    network = models.CharField(max_length=30)
+    delivered = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("sms_request", "network")
+
+
+class FailedSMS(AbstractBaseModel):
+    """Dead letter record of a recipient the provider could not send to after all retries"""
+    company = models.ForeignKey(
+        "authentication.Company", on_delete=models.CASCADE,related_name="failed_sms"
+    )
+    sms_request = models.ForeignKey(
+        "SMSRequest", on_delete=models.SET_NULL, null=True, related_name="failed_sms"
+    )
+    phone_number = models.CharField(max_length=30)
+    message = models.CharField(max_length=800)
+    status_code = models.IntegerField(null=True)
+    reason = models.CharField(max_length=255)
+    attempts = models.IntegerField(default=1)
+
+
 class DeliveredSMS(AbstractBaseModel):
     sent_sms = models.OneToOneField(
         "SentSMS", on_delete=models.CASCADE,related_name="brand"
@@ -121,3 +224,29 @@ class DeliveredSMS(AbstractBaseModel):
     network = models.CharField(max_length=30)
     failure_reason = models.CharField(max_length=30, null=True)
     retry_count = models.CharField(max_length=30, null=True)
+
+
+class UnmatchedDeliveryReport(models.Model):
+    """A delivery report that arrived before its SentSMS row, retried by the periodic flush"""
+    message_id = models.CharField(max_length=60, primary_key=True)
+    report = JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class UploadJob(AbstractBaseModel):
+    """A csv or excel upload that is parsed and imported by a celery worker"""
+    company = models.ForeignKey(
+        "authentication.Company", on_delete=models.CASCADE,related_name="upload_jobs"
+    )
+    kind = models.CharField(max_length=20, choices=UPLOAD_JOB_KINDS)
+    status = models.CharField(max_length=20, choices=UPLOAD_JOB_STATUSES, default="queued")
+    file_name = models.CharField(max_length=255)
+    file = models.FileField(upload_to="upload_jobs/", max_length=255)
+    params = JSONField(default=dict)
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    skipped_rows = models.IntegerField(default=0)
+    result = JSONField(null=True)
+    error = JSONField(null=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
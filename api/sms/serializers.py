@@ -1,7 +1,9 @@
 from django.shortcuts import get_object_or_404
-from django.db.utils import IntegrityError
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 
 from rest_framework.exceptions import ValidationError
 from rest_framework import serializers
@@ -10,12 +12,15 @@ from rest_framework.validators import UniqueTogetherValidator
 from . import models
 from core.utils.sms_helpers import (send_sms, 
 create_personalized_message, send_mass_unique_sms, count_sms,
-count_personalized_sms, update_sms_count, update_email_count)
+count_personalized_sms, update_email_count,
+get_group_recipients, get_number_of_sms_for_message, bulk_upsert_group_members,
+add_group_members, remove_group_members)
+from core.fields import PrimaryKeyListField
+from core.utils.balance_helpers import reserve_balance
 from core.utils.helpers import ( 
 CsvExcelReader, add_country_code, raise_validation_error, camel_to_snake)
 from core.utils.validators import ( 
-validate_phone_list, validate_excel_csv, validate_csv_row,
-validate_first_name_column, get_intnl_phone)
+validate_phone_list, validate_excel_csv, validate_first_name_column)
 
 NETWORK_CODE_TO_PROVIDER_MAPPPER = {
     "63903": "Airtel Kenya",
@@ -24,6 +29,16 @@ NETWORK_CODE_TO_PROVIDER_MAPPPER = {
     "63902": "Safaricom"
 }
 
+group_membership_mapping = {
+    None: (models.SMSGroup, models.GroupMember),
+    "email": (models.EmailGroup, models.EmailGroupMember)
+}
+
+group_model_mapping = {
+    "phone": models.SMSGroup,
+    "email": models.EmailGroup
+}
+
 
 class SMSRequestSerializer(serializers.ModelSerializer):
 
@@ -56,14 +71,25 @@ class SMSRequestSerializer(serializers.ModelSerializer):
         return super().is_valid(raise_exception)
 
     def create(self, validated_data):
-        recepients = self.get_receipients(validated_data)
+        """
+        Group members are only counted here, the worker streams them
+        into the send batches
+        """
+        recepients = list(dict.fromkeys(validated_data.get("recepients", [])))
+        group_ids = [group.pk for group in validated_data.get("groups", [])]
+        recepient_count = len(recepients)
+        if group_ids:
+            recepient_count += self.get_group_recepients(group_ids, recepients).count()
         validated_data["recepients"] = recepients
         company = self.context["request"].user.company
-        sms_count = count_sms(validated_data["message"], recepients)
-        update_sms_count(sms_count, company)
-        send_sms(validated_data["message"], recepients, company.pk)
+        sms_count = get_number_of_sms_for_message(validated_data["message"]) * recepient_count
         validated_data["sms_count"] = sms_count
-        return self.save_request(validated_data)
+        message = validated_data["message"]
+        with transaction.atomic():
+            validated_data["reservation"] = reserve_balance(company, sms_count)
+            instance = self.save_request(validated_data)
+            transaction.on_commit(lambda: send_sms.delay(message, recepients, company.pk, instance.pk, group_ids))
+        return instance
 
     def save_request(self, validated_data):
         groups = validated_data.pop("groups", [])
@@ -72,29 +98,33 @@ class SMSRequestSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+    def get_group_recepients(self, group_ids, recepients):
+        """Get the distinct members of the groups that are not among the recepients"""
+        medium = self.context["request"].query_params.get("medium", "phone")
+        group_model = group_model_mapping[medium]
+        if not get_group_recipients(group_model, group_ids, medium).exists():
+            raise ValidationError(
+            {"detail": "There are no members in the specified group(s)"}
+            )
+        return get_group_recipients(group_model, group_ids, medium, exclude=recepients)
+
     def get_receipients(self, validated_data):
-        recepients = validated_data.get("recepients", [])
-        groups = validated_data.get("groups")
+        recepients = list(dict.fromkeys(validated_data.get("recepients", [])))
+        group_ids = [group.pk for group in validated_data.get("groups", [])]
     
-        if groups:
-            merged_queryset = models.GroupMember.objects.none()
-            for group in groups:
-                merged_queryset = merged_queryset | group.members.all()
-            if not merged_queryset:
-                raise ValidationError(
-                {"detail": "There are no members in the specified group(s)"}
-                )
-            medium = self.context["request"].query_params.get("medium", "phone")
-
-            group_recepients = list(merged_queryset.values_list(medium, flat=True))
-            recepients = set(recepients + group_recepients)
+        if group_ids:
+            recepients += list(self.get_group_recepients(group_ids, recepients))
         
-        return list(recepients)
+        return recepients
 
     class Meta:
         model = models.SMSRequest
-        fields = ["message", "groups", "recepients", "id", "sms_count", "is_deleted", "created_at"]
-        extra_kwargs = {'company': {'read_only':True}}
+        fields = ["message", "groups", "recepients", "id", "sms_count", "is_deleted", "created_at",
+            "status", "sent_count", "failed_count"]
+        extra_kwargs = {'company': {'read_only':True},
+            'status': {'read_only':True},
+            'sent_count': {'read_only':True},
+            'failed_count': {'read_only':True}}
 
 class EmailRequestSerializer(SMSRequestSerializer):
 
@@ -120,14 +150,37 @@ class EmailRequestSerializer(SMSRequestSerializer):
         fields = ["message", "subject", "groups", "recepients", "id", "email_count"]
         extra_kwargs = {'company': {'read_only':True}}
 
-class SMSGroupSerializer(serializers.ModelSerializer):
+class GroupMemberCountMixin(serializers.Serializer):
+    """
+    Groups show how many members they have instead of the members, which are
+    listed a page at a time by GroupMemberListView
+    """
+    member_count = serializers.SerializerMethodField()
+    members = PrimaryKeyListField(queryset=models.GroupMember.objects.none(), write_only=True, required=False)
+
+    def get_fields(self, *args, **kwargs):
+        fields = super().get_fields(*args, **kwargs)
+        if self.context["request"].user.is_anonymous:
+            return fields
+        company = self.context["request"].user.company
+        member_model = self.Meta.model._meta.get_field("members").related_model
+        fields["members"].queryset = member_model.objects.filter(company=company, is_deleted=False)
+        return fields
+
+    def get_member_count(self, obj):
+        """Groups listed by GroupView come with the count annotated"""
+        member_count = getattr(obj, "member_count", None)
+        return obj.members.filter(is_deleted=False).count() if member_count is None else member_count
+
+
+class SMSGroupSerializer(GroupMemberCountMixin, serializers.ModelSerializer):
     class Meta:
         model = models.SMSGroup
         fields = "__all__"
         extra_kwargs = {'company': {'read_only':True}}
 
 
-class EmailGroupSerializer(serializers.ModelSerializer):
+class EmailGroupSerializer(GroupMemberCountMixin, serializers.ModelSerializer):
     class Meta:
         model = models.EmailGroup
         fields = "__all__"
@@ -145,9 +198,13 @@ class SMSTemplateSerializer(serializers.ModelSerializer):
         extra_kwargs = {'company': {'read_only':True}}
 
 
-class DeleteSMSRequestsSerializer(serializers.Serializer):
-
-    message_requests = serializers.ListField(child=serializers.PrimaryKeyRelatedField(queryset=models.SMSGroup.objects.none()), write_only=True)
+class BulkDeleteSerializer(serializers.Serializer):
+    """
+    Validate a list of company owned objects of the request medium with one query,
+    subclasses declare the PrimaryKeyListField named by pk_list_field
+    """
+    pk_list_field = None
+    model_mapping = {}
 
     def get_fields(self, *args, **kwargs):
         fields = super().get_fields(*args, **kwargs)
@@ -155,18 +212,111 @@ class DeleteSMSRequestsSerializer(serializers.Serializer):
             return fields
         company = self.context["request"].user.company
         medium = self.context["request"].query_params.get("medium")
-        self.model_mapping = {
-            None: models.SMSRequest,
-            'email': models.EmailRequest
-        }
-        fields["message_requests"].child.queryset = self.model_mapping[medium].objects.filter(company=company)
+        fields[self.pk_list_field].queryset = self.model_mapping[medium].objects.filter(company=company)
         return fields
 
-    
+
+class DeleteSMSRequestsSerializer(BulkDeleteSerializer):
+
+    message_requests = PrimaryKeyListField(queryset=models.SMSRequest.objects.none(), write_only=True)
+
+    pk_list_field = "message_requests"
+    model_mapping = {
+        None: models.SMSRequest,
+        'email': models.EmailRequest
+    }
+
+    def delete(self):
+        return self.validated_data["message_requests"].soft_delete()
+
+
+class DeleteGroupsSerializer(BulkDeleteSerializer):
+
+    groups = PrimaryKeyListField(queryset=models.SMSGroup.objects.none(), write_only=True)
+
+    pk_list_field = "groups"
+    model_mapping = {
+        None: models.SMSGroup,
+        'email': models.EmailGroup
+    }
+
     def delete(self):
-        message_requests = self.validated_data.get("message_requests")
-        for request in message_requests:
-            request.soft_delete(commit=True)
+        return self.validated_data["groups"].delete()
+
+
+class DeleteGroupMembersSerializer(BulkDeleteSerializer):
+
+    members = PrimaryKeyListField(queryset=models.GroupMember.objects.none(), write_only=True)
+
+    pk_list_field = "members"
+    model_mapping = {
+        None: models.GroupMember,
+        'email': models.EmailGroupMember
+    }
+
+    def delete(self):
+        return self.validated_data["members"].delete()
+
+class MemberFilterSerializer(serializers.Serializer):
+    """Select company members by the group they are in and when they were created"""
+    group = serializers.PrimaryKeyRelatedField(queryset=models.SMSGroup.objects.none(), required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def get_fields(self, *args, **kwargs):
+        fields = super().get_fields(*args, **kwargs)
+        if self.context["request"].user.is_anonymous:
+            return fields
+        company = self.context["request"].user.company
+        medium = self.context["request"].query_params.get("medium")
+        fields["group"].queryset = group_membership_mapping[medium][0].objects.filter(company=company)
+        return fields
+
+    def filter_members(self, queryset, filters):
+        """Filter a members queryset with validated filter data"""
+        if "group" in filters:
+            queryset = queryset.filter(pk__in=filters["group"].members.values("pk"))
+        for param, lookup in (("created_after", "created_at__gte"), ("created_before", "created_at__lt")):
+            if param in filters:
+                queryset = queryset.filter(**{lookup: filters[param]})
+        return queryset
+
+
+class GroupMembershipSerializer(serializers.Serializer):
+    """
+    Members to add to or remove from a group, given as a list of ids or selected
+    with a filter. Either way they are checked to belong to the company in one query
+    """
+    members = PrimaryKeyListField(queryset=models.GroupMember.objects.none(), required=False)
+    filter = MemberFilterSerializer(required=False)
+
+    def get_fields(self, *args, **kwargs):
+        fields = super().get_fields(*args, **kwargs)
+        if self.context["request"].user.is_anonymous:
+            return fields
+        company = self.context["request"].user.company
+        medium = self.context["request"].query_params.get("medium")
+        self.member_queryset = group_membership_mapping[medium][1].objects.filter(company=company, is_deleted=False)
+        fields["members"].queryset = self.member_queryset
+        return fields
+
+    def validate(self, data):
+        if ("members" in data) == ("filter" in data):
+            raise ValidationError("Send either a list of members or a filter")
+        return data
+
+    def get_members(self):
+        """Get the queryset of the members listed or selected by the filter"""
+        if "members" in self.validated_data:
+            return self.validated_data["members"]
+        return self.fields["filter"].filter_members(self.member_queryset, self.validated_data["filter"])
+
+    def add_to(self, group):
+        return add_group_members(group, self.get_members())
+
+    def remove_from(self, group):
+        return remove_group_members(group, self.get_members())
+
 
 class GroupMemberSerializer(serializers.ModelSerializer):
     group = serializers.PrimaryKeyRelatedField(queryset=models.SMSGroup.objects.all(), write_only=True, required=False)
@@ -201,23 +351,11 @@ class EmailGroupMemberSerializer(GroupMemberSerializer):
         extra_kwargs = {'company': {'read_only':True}}
 
 
-class SingleSMSGroupSerializer(serializers.ModelSerializer):
+class SingleSMSGroupSerializer(SMSGroupSerializer):
+    pass
 
-    member_list = GroupMemberSerializer(many=True, read_only=True, source='members')
-
-    class Meta:
-        model = models.SMSGroup
-        fields = "__all__"
-        extra_kwargs = {'company': {'read_only':True}}
-
-class SingleEmailGroupSerializer(serializers.ModelSerializer):
-
-    member_list = EmailGroupMemberSerializer(many=True, read_only=True, source='members')
-    
-    class Meta:
-        model = models.EmailGroup
-        fields = "__all__"
-        extra_kwargs = {'company': {'read_only':True}}
+class SingleEmailGroupSerializer(EmailGroupSerializer):
+    pass
 
 
 class GroupMemberUploadSerializer(serializers.Serializer):
@@ -237,21 +375,75 @@ headers_mapping = {
         'email': ['email']
     }
 
+member_columns_mapping = {
+        None: ['phone', 'first_name', 'last_name'],
+        'email': ['email', 'first_name', 'last_name']
+    }
+
 serializer_model_mapping = {
         None: (GroupMemberUploadSerializer, models.GroupMember),
         "email": (EmailGroupMemberUploadSerializer, models.EmailGroupMember)
     }
 
-class CsvMembersUploadSerializer(serializers.Serializer):
+
+class UploadJobContextMixin:
+    """
+    Reads the company and query params from the request or, when the upload
+    is processed by a background upload job, from the job in the context
+    """
+
+    def get_company(self):
+        job = self.context.get("job")
+        if job:
+            return job.company
+        return self.context["request"].user.company
+
+    def get_query_param(self, name):
+        job = self.context.get("job")
+        if job:
+            return job.params.get("query_params", {}).get(name)
+        return self.context["request"].query_params.get(name)
+
+    def is_anonymous(self):
+        return not self.context.get("job") and self.context["request"].user.is_anonymous
+
+    def iter_valid_rows(self, reader, columns, fallback_serializer=None):
+        """
+        Validate the file in chunks of UPLOAD_CHUNK_SIZE rows, the progress of an
+        upload job is recorded once the caller is done with each chunk
+        """
+        job = self.context.get("job")
+        if job:
+            models.UploadJob.objects.filter(pk=job.pk).update(total_rows=reader.row_count)
+        for data in reader.iter_chunks():
+            rows, skipped_lines = reader.get_valid_rows(columns, data, fallback_serializer)
+            yield (rows, skipped_lines)
+            if job:
+                models.UploadJob.objects.filter(pk=job.pk).update(
+                    processed_rows=F("processed_rows") + len(data),
+                    skipped_rows=F("skipped_rows") + len(skipped_lines)
+                )
+
+    def read_valid_rows(self, reader, columns, fallback_serializer=None):
+        """Validate the whole file, returns a tuple of row dicts and skipped line numbers"""
+        rows = []
+        skipped_lines = []
+        for chunk_rows, chunk_skipped_lines in self.iter_valid_rows(reader, columns, fallback_serializer):
+            rows.extend(chunk_rows.values())
+            skipped_lines.extend(chunk_skipped_lines)
+        return (rows, skipped_lines)
+
+
+class CsvMembersUploadSerializer(UploadJobContextMixin, serializers.Serializer):
     file = serializers.FileField(validators=[validate_excel_csv], required=True)
     group = serializers.PrimaryKeyRelatedField(queryset=models.SMSGroup.objects.all())
 
     def get_fields(self, *args, **kwargs):
         fields = super().get_fields(*args, **kwargs)
-        if self.context["request"].user.is_anonymous:
+        if self.is_anonymous():
             return fields  
-        company = self.context["request"].user.company
-        medium = self.context["request"].query_params.get("medium")
+        company = self.get_company()
+        medium = self.get_query_param("medium")
         model_mapping = {
             None: models.SMSGroup,
             'email': models.EmailGroup
@@ -262,36 +454,19 @@ class CsvMembersUploadSerializer(serializers.Serializer):
     def save(self, *args, **kwargs):
         """Saves all valid data to the database while adding them to group if passed"""
         file = self.validated_data["file"]
-        medium = self.context["request"].query_params.get("medium")
+        medium = self.get_query_param("medium")
         serializer_class, model = serializer_model_mapping[medium]
         required_headers = headers_mapping[medium]
-        csv_excel_reader = CsvExcelReader(file, required_headers)
+        csv_excel_reader = CsvExcelReader(file, required_headers, stream=True)
+        group = self.validated_data["group"]
         members = []
         skipped_lines = []
-        group = self.validated_data["group"]
-
-        for i, row in csv_excel_reader.data.iterrows():
-            serializer = serializer_class(data=dict(row))
-            is_valid = serializer.is_valid()
-            if not is_valid:
-                skipped_lines.append(i+1)
-                continue
-            if not medium:
-                intnl_phone = get_intnl_phone(serializer)
-                if not intnl_phone:
-                    skipped_lines.append(i+1)
-                    continue
-                serializer.validated_data["phone"] = intnl_phone
-
-            serializer.validated_data["company"] = group.company
-            try:
-                instance, _ = model.objects.get_or_create(**serializer.validated_data)
-            except IntegrityError: # catch unique together error
-                skipped_lines.append(i+1)
-                continue
-            members.append(instance)
-            group.members.add(instance)
-        group.save()
+        chunks = self.iter_valid_rows(
+            csv_excel_reader, member_columns_mapping[medium], fallback_serializer=serializer_class
+        )
+        for rows, chunk_skipped_lines in chunks:
+            members += bulk_upsert_group_members(group, model, list(rows.values()), required_headers[0])
+            skipped_lines += chunk_skipped_lines
         members = serializer_class(members, many=True).data
         data = {"members": members}
         if skipped_lines:
@@ -307,12 +482,12 @@ class PersonalizedMsgSerializer(serializers.Serializer):
 
 
 validation_mapping = {
-            "sms": (GroupMemberUploadSerializer, ["phone"]),
-            "personalized": (PersonalizedMsgSerializer, ["phone", "first_name"]),
-            "email": (EmailGroupMemberSerializer, ["email", "subject"])
+            "sms": ["phone"],
+            "personalized": ["phone", "first_name"],
+            "email": ["email", "subject"]
         }
 
-class CsvSmsContactUpload(serializers.Serializer):
+class CsvSmsContactUpload(UploadJobContextMixin, serializers.Serializer):
     file = serializers.FileField(validators=[validate_excel_csv])
     message = serializers.CharField(required=True)
     greeting_text = serializers.CharField(required=False)
@@ -322,13 +497,14 @@ class CsvSmsContactUpload(serializers.Serializer):
         """Send sms to csv uploaded contacts"""
         message = self.validated_data["message"]
         recepients, skipped_lines = self.read_csv()
-        company = self.context["request"].user.company
+        company = self.get_company()
         recepients = list(set(recepients))
         sms_count = count_sms(message, recepients)
-        update_sms_count(sms_count, company)
-        send_sms.delay(message, recepients, company.pk)
-        sms_request = models.SMSRequest(message=message, recepients=recepients, company=company, sms_count=sms_count)
-        sms_request.save()
+        with transaction.atomic():
+            reservation = reserve_balance(company, sms_count)
+            sms_request = models.SMSRequest(message=message, recepients=recepients, company=company, sms_count=sms_count, reservation=reservation)
+            sms_request.save()
+            transaction.on_commit(lambda: send_sms.delay(message, recepients, company.pk, sms_request.pk))
         data = {
             "recepients": recepients,
             "sms_count": sms_count
@@ -347,12 +523,15 @@ class CsvSmsContactUpload(serializers.Serializer):
             raise ValidationError({"greeting_text": "There must be a greeting message for personalized messages"})
         recepients, skipped_lines = self.read_csv(validate="personalized")
         message = self.validated_data["message"]
-        company = self.context["request"].user.company
+        company = self.get_company()
         sms_count = count_personalized_sms(message, greeting_text, recepients)
-        update_sms_count(sms_count, company)
-        sms_request = models.SMSRequest(message=message, recepients=[contact["phone"] for contact in recepients], company=company, sms_count=sms_count)
-        sms_request.save()
-        send_mass_unique_sms.delay(message, greeting_text, recepients, company.pk)
+        with transaction.atomic():
+            reservation = reserve_balance(company, sms_count)
+            sms_request = models.SMSRequest(message=message, recepients=[contact["phone"] for contact in recepients], company=company, sms_count=sms_count, reservation=reservation)
+            sms_request.save()
+            transaction.on_commit(
+                lambda: send_mass_unique_sms.delay(message, greeting_text, recepients, company.pk, sms_request.pk)
+            )
         data = {
             "recepients": recepients,
             "sms_count": sms_count
@@ -370,21 +549,13 @@ class CsvSmsContactUpload(serializers.Serializer):
         if not subject:
             raise raise_validation_error({"subject": "This field is required."})
         required_headers = ["email"]
-        csv_excel_reader = CsvExcelReader(file, required_headers)
-        recepients = []
-        skipped_lines = []
-
-        for i, row in csv_excel_reader.data.iterrows():
-            serializer = EmailGroupMemberUploadSerializer(data=dict(row))
-            is_valid = serializer.is_valid()
-            if not is_valid:
-                skipped_lines.append(i+1)
-                continue
-
-            email = serializer.validated_data["email"]
-            recepients.append(email)
+        csv_excel_reader = CsvExcelReader(file, required_headers, stream=True)
+        rows, skipped_lines = self.read_valid_rows(
+            csv_excel_reader, required_headers, fallback_serializer=EmailGroupMemberUploadSerializer
+        )
+        recepients = [row["email"] for row in rows]
 
-        company = self.context["request"].user.company
+        company = self.get_company()
         email_count = len(recepients)
         update_email_count(email_count, company)
         models.EmailRequest(company=company, message=message, recepients=recepients, email_count=email_count, subject=subject)
@@ -402,33 +573,55 @@ class CsvSmsContactUpload(serializers.Serializer):
                 personalized messages or a list of phone no.s for same messages
         returns: a tuple skipped lines and list of phone no.s or objects
         """
-        recepients = []
-        skipped_lines = []
         file = self.validated_data["file"]
-        serializer_class, required_headers = validation_mapping[validate]
-
-        csv_excel_reader = CsvExcelReader(file, required_headers)
-        rows = csv_excel_reader.data.iterrows()
-        for i, row in rows:
-            serializer = serializer_class(data=dict(row))
-            is_valid = serializer.is_valid()
-            if not is_valid:
-                skipped_lines.append(i+1)
-                continue
-            intnl_phone = get_intnl_phone(serializer)
-            if not intnl_phone:
-                skipped_lines.append(i+1)
-                continue
-            if validate == "personalized":
-                first_name = serializer.validated_data["first_name"]
-                contact = {"first_name": first_name, "phone": intnl_phone}
-            else:
-                contact = intnl_phone
-                
-            recepients.append(contact)
+        required_headers = validation_mapping[validate]
+
+        csv_excel_reader = CsvExcelReader(file, required_headers, stream=True)
+        rows, skipped_lines = self.read_valid_rows(csv_excel_reader, required_headers)
+        if validate == "personalized":
+            recepients = rows
+        else:
+            recepients = [row["phone"] for row in rows]
         return (recepients, skipped_lines)
 
 
+class SMSRequestStatsSerializer(serializers.BaseSerializer):
+    """Delivery stats of an sms request, read from its per network counters"""
+
+    def to_representation(self, instance):
+        networks = {
+            stats.network: {"delivered": stats.delivered, "failed": stats.failed}
+            for stats in instance.delivery_stats.all()
+        }
+        delivered = sum(counts["delivered"] for counts in networks.values())
+        failed = sum(counts["failed"] for counts in networks.values())
+        return {
+            "id": instance.pk,
+            "status": instance.status,
+            "sent": instance.sent_count,
+            "delivered": delivered,
+            "failed": failed,
+            "pending": max(instance.sent_count - delivered - failed, 0),
+            "networks": networks
+        }
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    eta = serializers.SerializerMethodField()
+
+    def get_eta(self, obj):
+        """Seconds left to process the remaining rows at the rate seen so far"""
+        if obj.status != "processing" or not obj.processed_rows or not obj.started_at:
+            return None
+        elapsed = (timezone.now() - obj.started_at).total_seconds()
+        remaining_rows = max(obj.total_rows - obj.processed_rows, 0)
+        return round(elapsed / obj.processed_rows * remaining_rows)
+
+    class Meta:
+        model = models.UploadJob
+        exclude = ["file", "params"]
+
+
 class SMSBrandSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -449,16 +642,17 @@ class AdminSMSBrandSerializer(serializers.ModelSerializer):
             "company": {'read_only':True}}
 
 
-class DeliveredSMSSerializer(serializers.ModelSerializer):
-
-    def is_valid(self, raise_exception=False):
-        initial_data = self.initial_data
-        initial_data = {camel_to_snake(k):v for (k, v) in initial_data.items()}
-        initial_data["network"] = NETWORK_CODE_TO_PROVIDER_MAPPPER[initial_data["network_code"]]
-        initial_data["sent_sms"] = initial_data.pop("id")
-        self.initial_data = initial_data
-        return super.is_valid(raise_exception=True)
-
-    class Meta:
-        model = models.DeliveredSMS
-        fields = "__all__"
+class DeliveryReportSerializer(serializers.Serializer):
+    """Validates a provider delivery report callback without any database queries"""
+    id = serializers.CharField(max_length=60)
+    status = serializers.CharField(max_length=30)
+    phoneNumber = serializers.CharField(max_length=30)
+    networkCode = serializers.CharField(max_length=10)
+    failureReason = serializers.CharField(max_length=30, required=False, allow_blank=True, allow_null=True)
+    retryCount = serializers.CharField(max_length=30, required=False, allow_null=True)
+
+    def validate(self, attrs):
+        report = {camel_to_snake(key): value for key, value in attrs.items()}
+        report["sent_sms_id"] = report.pop("id")
+        report["network"] = NETWORK_CODE_TO_PROVIDER_MAPPPER.get(report["network_code"], "Unknown")
+        return report
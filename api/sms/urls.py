@@ -5,14 +5,18 @@ app_name = "sms"
 
 urlpatterns = [
     path("", views.SMSRequestView.as_view(), name="sms"),
+    path("<int:pk>/stats/", views.SMSRequestStatsView.as_view(), name="sms_request_stats"),
     path("template/", views.SMSTemplateView.as_view(), name="sms_template"),
     path("template/<int:pk>/", views.SingleSMSTemplateView.as_view(), name="single_sms_template"),
     path("groups/", views.GroupView.as_view(), name="group"),
     path("groups/<int:pk>/", views.SingleGroupView.as_view(), name="single_group"),
+    path("groups/<int:pk>/members/", views.GroupMemberListView.as_view(), name="group_member_list"),
     path("groups/members/", views.GroupMembersView.as_view(), name="group_members"),
     path("group-members/<int:pk>/", views.SingleGroupMembersView.as_view(), name="single_group_member"),
     path("group-members/upload/", views.MassMemberUploadView.as_view(), name="mass-upload-member"),
     path("upload/", views.CsvSmsView.as_view(), name="csv_sms"),
+    path("upload/jobs/", views.UploadJobView.as_view(), name="upload_jobs"),
+    path("upload/jobs/<int:pk>/", views.SingleUploadJobView.as_view(), name="single_upload_job"),
     path("delivery_report/", views.SMSDeliveryCallbackView.as_view(), name="delivery_report"),
     path("branding/", views.CreateBrandName.as_view(), name="branding_request"),
     path("branding/requests/", views.ListBrandNameRequests.as_view(), name="list_branding_request"),
@@ -1,14 +1,19 @@
 from django.db import IntegrityError
+from django.db.models import Count, Q
 
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 
 from . import serializers, models
-from core.utils.sms_helpers import send_sms
-from core.permissions import IsCompanyOwned, IsSuperUser
+from core.utils.sms_helpers import send_sms, add_group_members, remove_group_members
+from core.utils.delivery_helpers import enqueue_delivery_report
+from core.utils.upload_helpers import is_large_upload, create_upload_job
+from core.permissions import IsCompanyOwned, IsSuperUser, HasCallbackToken
+from core.pagination import CreatedAtCursorPagination, IdCursorPagination
 from core.views import CustomCreateAPIView, CustomUpdateAPIView
 from core.utils.helpers import CsvExcelReader, get_errored_integrity_field
 
@@ -61,13 +66,22 @@ class ModelSerializerMappingMixin:
 class SMSRequestView(generics.ListAPIView, CustomCreateAPIView, ModelSerializerMappingMixin):
     """create, list and delete sms requests """
 
+    pagination_class = CreatedAtCursorPagination
+
     def get_serializer_class(self):
         medium = self.request.query_params.get("medium", None)
         return self.map_serializer_to_view(medium, "request")
 
     def get_queryset(self):
         medium = self.request.query_params.get("medium", None)
-        return self.map_queryset_to_view(medium, "request")
+        return self.map_queryset_to_view(medium, "request").filter(is_deleted=False)
+
+    def create(self, request, *args, **kwargs):
+        """SMS requests are sent in the background and only accepted here"""
+        response = super().create(request, *args, **kwargs)
+        if not request.query_params.get("medium"):
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
 
     def delete(self, request):
         serializer = serializers.DeleteSMSRequestsSerializer(
@@ -93,11 +107,10 @@ class SingleSMSTemplateView(generics.RetrieveUpdateDestroyAPIView, CustomCreateA
     queryset = models.SMSTemplate.objects.all()
 
 class GroupView(generics.ListAPIView, ModelSerializerMappingMixin, CustomCreateAPIView):
-    """Create or list groups"""
+    """Create, list or delete groups"""
 
     queryset = models.SMSGroup.objects.all()
     serializer_class = serializers.SMSGroupSerializer
-    pagination_class = None
 
     def get_serializer_class(self):
         medium = self.request.query_params.get("medium", None)
@@ -105,7 +118,17 @@ class GroupView(generics.ListAPIView, ModelSerializerMappingMixin, CustomCreateA
 
     def get_queryset(self):
         medium = self.request.query_params.get("medium", None)
-        return self.map_queryset_to_view(medium, "group")
+        return self.map_queryset_to_view(medium, "group").annotate(
+            member_count=Count("members", filter=Q(members__is_deleted=False))
+        ).order_by("id")
+
+    def delete(self, request):
+        serializer = serializers.DeleteGroupsSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 
@@ -132,26 +155,73 @@ class SingleGroupView(generics.RetrieveUpdateDestroyAPIView, ModelSerializerMapp
         Change members m2m field update behaviour 
         to add or remove existing members instead of replacing
         """
-        new_members = serializer.validated_data.pop("members", None)
+        members = serializer.validated_data.pop("members", None)
         group_member_action = {
-            "PATCH": serializer.instance.members.add,
-            "PUT": serializer.instance.members.remove
+            "PATCH": add_group_members,
+            "PUT": remove_group_members
         }
-        if new_members:
-            group_member_action[self.request.method](*new_members)
-            serializer.instance.save()
-        serializer.save()
+        group = serializer.save()
+        if members is not None:
+            group_member_action[self.request.method](group, members)
+
+
+class GroupMemberListView(generics.ListAPIView, ModelSerializerMappingMixin):
+    """
+    List the members of a group a page at a time, paging on the member id.
+    POST adds and DELETE removes members in bulk, both respond with counts
+    """
+
+    pagination_class = IdCursorPagination
+
+    def get_serializer_class(self):
+        medium = self.request.query_params.get("medium", None)
+        return self.map_serializer_to_view(medium, "member")
+
+    def get_group(self):
+        medium = self.request.query_params.get("medium", None)
+        return get_object_or_404(self.map_queryset_to_view(medium, "group"), pk=self.kwargs["pk"])
+
+    def get_queryset(self):
+        return self.get_group().members.all()
+
+    def get_membership_serializer(self, request):
+        serializer = serializers.GroupMembershipSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer
+
+    def post(self, request, *args, **kwargs):
+        group = self.get_group()
+        added = self.get_membership_serializer(request).add_to(group)
+        return Response({"added": added, "member_count": group.members.filter(is_deleted=False).count()}, status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        group = self.get_group()
+        removed = self.get_membership_serializer(request).remove_from(group)
+        return Response({"removed": removed, "member_count": group.members.filter(is_deleted=False).count()}, status.HTTP_200_OK)
 
 
 class GroupMembersView(generics.ListAPIView,CustomCreateAPIView, ModelSerializerMappingMixin):
-    """Create or list members"""
+    """Create, list or delete members"""
+
+    pagination_class = CreatedAtCursorPagination
+
     def get_serializer_class(self):
         medium = self.request.query_params.get("medium", None)
         return self.map_serializer_to_view(medium, "member")
 
     def get_queryset(self):
         medium = self.request.query_params.get("medium")
-        return self.map_queryset_to_view(medium, "member")
+        return self.map_queryset_to_view(medium, "member").filter(is_deleted=False)
+
+    def delete(self, request):
+        serializer = serializers.DeleteGroupMembersSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 
@@ -175,6 +245,9 @@ class MassMemberUploadView(generics.GenericAPIView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        if is_large_upload(serializer.validated_data["file"]):
+            job = create_upload_job(request, "members")
+            return Response(serializers.UploadJobSerializer(job).data, status.HTTP_202_ACCEPTED)
         data = serializer.save()
         return Response(data, status.HTTP_201_CREATED)
 
@@ -187,18 +260,54 @@ class CsvSmsView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         if self.request.query_params.get("sms") == "personalized":
-            data = serializer.send_personalized_sms()
+            kind, send = "personalized_sms", serializer.send_personalized_sms
         elif self.request.query_params.get("medium") == "email":
-            data = serializer.send_email() 
+            kind, send = "email", serializer.send_email
         else:
-            data = serializer.send_sms()
+            kind, send = "sms", serializer.send_sms
+        if is_large_upload(serializer.validated_data["file"]):
+            job = create_upload_job(request, kind)
+            return Response(serializers.UploadJobSerializer(job).data, status.HTTP_202_ACCEPTED)
+        data = send()
         return Response(data, status.HTTP_201_CREATED)
 
 
-class SMSDeliveryCallbackView(generics.CreateAPIView):
-    """Handles callback for sms delivery data"""
-    serializer_class = serializers.DeliveredSMSSerializer
-    queryset = models.DeliveredSMS.objects.all()
+class UploadJobView(generics.ListAPIView):
+    """List background upload jobs"""
+    serializer_class = serializers.UploadJobSerializer
+
+    def get_queryset(self):
+        return models.UploadJob.objects.filter(company=self.request.user.company).order_by("-created_at")
+
+
+class SingleUploadJobView(generics.RetrieveAPIView):
+    """Poll the progress and result of a background upload job"""
+    permission_classes = [IsAuthenticated, IsCompanyOwned]
+    serializer_class = serializers.UploadJobSerializer
+    queryset = models.UploadJob.objects.all()
+
+
+class SMSRequestStatsView(generics.RetrieveAPIView):
+    """Get the sent, delivered, failed and pending counts of an sms request"""
+    permission_classes = [IsAuthenticated, IsCompanyOwned]
+    serializer_class = serializers.SMSRequestStatsSerializer
+    queryset = models.SMSRequest.objects.all()
+
+
+class SMSDeliveryCallbackView(APIView):
+    """
+    Handles callback for sms delivery data, reports are only validated and
+    buffered here and written in bulk by flush_delivery_reports. The provider
+    has no user, it is authenticated by the shared token of the callback url
+    """
+    authentication_classes = []
+    permission_classes = [HasCallbackToken]
+
+    def post(self, request, *args, **kwargs):
+        serializer = serializers.DeliveryReportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        enqueue_delivery_report(serializer.validated_data)
+        return Response(status=status.HTTP_202_ACCEPTED)
 
 
 class CreateBrandName(CustomCreateAPIView):
@@ -1,9 +1,7 @@
-from api.authentication.models import ConsumerKey
 from rest_framework import authentication
 from rest_framework import exceptions
 
-from core.utils.helpers import log_api_key_request
-from api.authentication.models import APIKeyActivity
+from core.utils.api_key_helpers import get_consumer_key, log_api_key_activity
 
 
 class ConsumerKeyAuthentication(authentication.BaseAuthentication):
@@ -11,11 +9,10 @@ class ConsumerKeyAuthentication(authentication.BaseAuthentication):
         consumer_key = request.META.get('HTTP_CONSUMER_KEY')
         if not consumer_key:
             return None
-        try:
-            consumer_key = ConsumerKey.objects.get(key=consumer_key)
-        except ConsumerKey.DoesNotExist:
+        consumer_key = get_consumer_key(consumer_key)
+        if consumer_key is None:
             return None
 
-        log_api_key_request(APIKeyActivity, consumer_key.user.company, consumer_key, request.path, request.META['REQUEST_METHOD'])
+        log_api_key_activity(consumer_key, request.path, request.META['REQUEST_METHOD'])
 
-        return (consumer_key.user, None)
+        return (consumer_key.user, consumer_key)
@@ -0,0 +1,28 @@
+from rest_framework import serializers
+
+
+class PrimaryKeyListField(serializers.ListField):
+    """
+    List of primary keys validated against the queryset with one query, it
+    validates to a queryset of the listed objects. Unknown keys are reported
+    per list index like a ListField of PrimaryKeyRelatedField would
+    """
+    child = serializers.IntegerField()
+    default_error_messages = {
+        "does_not_exist": serializers.PrimaryKeyRelatedField.default_error_messages["does_not_exist"]
+    }
+
+    def __init__(self, *args, queryset=None, **kwargs):
+        self.queryset = queryset
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        pks = super().to_internal_value(data)
+        found = set(self.queryset.filter(pk__in=pks).values_list("pk", flat=True))
+        errors = {
+            index: [self.error_messages["does_not_exist"].format(pk_value=pk)]
+            for index, pk in enumerate(pks) if pk not in found
+        }
+        if errors:
+            raise serializers.ValidationError(errors)
+        return self.queryset.filter(pk__in=pks)
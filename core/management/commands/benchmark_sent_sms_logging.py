@@ -0,0 +1,50 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api.authentication.models import Company
+from api.sms.models import SentSMS
+from core.utils.sms_helpers import log_sent_message, log_sent_messages
+
+
+class Command(BaseCommand):
+    help = "Compare SentSMS rows/second of per recipient inserts against the bulk logging pipeline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+
+    def create_recipients(self, rows):
+        run_id = uuid.uuid4().hex
+        return [{
+            "statusCode": 101,
+            "number": "+254700000000",
+            "status": "Success",
+            "cost": "KES 0.8000",
+            "messageId": f"ATXid_{run_id}_{index}"
+        } for index in range(rows)]
+
+    def run(self, label, log, company, rows):
+        recipients = self.create_recipients(rows)
+        start = time.perf_counter()
+        log(recipients, company)
+        elapsed = time.perf_counter() - start
+        SentSMS.objects.filter(company=company).delete()
+        self.stdout.write(f"{label}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s)")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        company = Company.objects.create(name=f"benchmark-{uuid.uuid4().hex[:8]}", county="Nairobi")
+
+        def log_per_recipient(recipients, company):
+            for recipient in recipients:
+                log_sent_message(recipient, company)
+
+        try:
+            self.run("per recipient create", log_per_recipient, company, rows)
+            self.run("bulk_create", lambda recipients, company: log_sent_messages(recipients, company.pk), company, rows)
+            with override_settings(SENT_SMS_LOG_METHOD="copy"):
+                self.run("copy", lambda recipients, company: log_sent_messages(recipients, company.pk), company, rows)
+        finally:
+            company.delete()
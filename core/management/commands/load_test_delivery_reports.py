@@ -0,0 +1,108 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from api.authentication.models import Company
+from api.sms import views
+from api.sms.models import DeliveredSMS, SentSMS
+from core.utils.delivery_helpers import flush_report_buffer
+from core.utils.sms_helpers import log_sent_messages
+
+
+class Command(BaseCommand):
+    help = "Measure sustained delivery report callbacks/second of the buffered path against a per callback insert"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reports", type=int, default=10000)
+        parser.add_argument("--threads", type=int, default=8)
+
+    def create_sent_messages(self, company, count):
+        run_id = uuid.uuid4().hex
+        recipients = [{
+            "statusCode": 101,
+            "number": "+254700000000",
+            "status": "Success",
+            "cost": "KES 0.8000",
+            "messageId": f"ATXid_{run_id}_{index}"
+        } for index in range(count)]
+        log_sent_messages(recipients, company.pk)
+        return [recipient["messageId"] for recipient in recipients]
+
+    def create_reports(self, message_ids):
+        return [{
+            "id": message_id,
+            "status": "Success",
+            "phoneNumber": "+254700000000",
+            "networkCode": "63902",
+            "retryCount": 0
+        } for message_id in message_ids]
+
+    def post_reports(self, reports, threads):
+        request_factory = APIRequestFactory()
+        view = views.SMSDeliveryCallbackView.as_view()
+        url = f"/api/v1/sms/delivery_report/?token={settings.DELIVERY_REPORT_CALLBACK_TOKEN}"
+
+        def post(chunk):
+            try:
+                for report in chunk:
+                    response = view(request_factory.post(url, report))
+                    assert response.status_code == 202, response.data
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(post, [reports[index::threads] for index in range(threads)]))
+
+    def buffered(self, reports, threads):
+        """Post callbacks while a consumer flushes the buffer until every report is written"""
+        posting = threading.Event()
+        posting.set()
+
+        def consume():
+            try:
+                while posting.is_set():
+                    if not flush_report_buffer():
+                        time.sleep(0.05)
+                flush_report_buffer()
+            finally:
+                connection.close()
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        try:
+            self.post_reports(reports, threads)
+        finally:
+            posting.clear()
+            consumer.join()
+
+    def run(self, label, ingest, company, count, threads):
+        message_ids = self.create_sent_messages(company, count)
+        reports = self.create_reports(message_ids)
+        start = time.perf_counter()
+        ingest(reports, threads)
+        elapsed = time.perf_counter() - start
+        written = DeliveredSMS.objects.filter(sent_sms__company=company).count()
+        SentSMS.objects.filter(company=company).delete()
+        self.stdout.write(
+            f"{label}: {written}/{count} reports in {elapsed:.2f}s ({count / elapsed:.0f} callbacks/s)"
+        )
+
+    def handle(self, *args, **options):
+        count, threads = options["reports"], options["threads"]
+        company = Company.objects.create(name=f"load-test-{uuid.uuid4().hex[:8]}", county="Nairobi")
+        try:
+            with override_settings(DELIVERY_REPORT_CALLBACK_TOKEN=uuid.uuid4().hex):
+                # without a shared buffer every report is written inside its callback
+                with override_settings(DELIVERY_REPORT_REDIS_URL=None, LOCAL_WRITE_BUFFERS=False):
+                    self.run("per callback insert", self.post_reports, company, count, threads)
+                with override_settings(DELIVERY_REPORT_FLUSH_THRESHOLD=0, LOCAL_WRITE_BUFFERS=True):
+                    self.run("buffered callbacks", self.buffered, company, count, threads)
+        finally:
+            company.delete()
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class AbstractBaseModel(models.Model):
@@ -59,3 +60,17 @@ class ActiveObjectsQuerySet(models.QuerySet):
         """
 
         return self._active()
+
+    def soft_delete(self):
+        """
+        Soft delete all the objects of the queryset with a single update.
+        """
+
+        return self.update(is_deleted=True, updated_at=timezone.now())
+
+    def undo_soft_delete(self):
+        """
+        Undo soft delete of all the objects of the queryset with a single update.
+        """
+
+        return self.update(is_deleted=False, updated_at=timezone.now())
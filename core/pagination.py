@@ -0,0 +1,50 @@
+import json
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key, every page is an index range scan
+    whatever its position in the list
+    """
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the creation time, newest first. Pages are read from
+    the (company, created_at, id) indexes without counting or skipping rows
+    """
+    ordering = ("-created_at", "-id")
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+def get_estimated_count(queryset):
+    """Get the number of rows the query planner expects a queryset to return"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class ApproximateCountPagination(LimitOffsetPagination):
+    """
+    Limit offset pagination that counts up to PAGINATION_EXACT_COUNT_LIMIT rows
+    and reports the query planner estimate for anything larger
+    """
+
+    def get_count(self, queryset):
+        limit = settings.PAGINATION_EXACT_COUNT_LIMIT
+        count = queryset.order_by().values("pk")[:limit + 1].count()
+        if count <= limit:
+            return count
+        return max(get_estimated_count(queryset), count)
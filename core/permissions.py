@@ -1,3 +1,6 @@
+import hmac
+
+from django.conf import settings
 from rest_framework.permissions import BasePermission
 
 
@@ -51,3 +54,17 @@ class IsVerified(BasePermission):
 
     def has_permission(self, request, view):
         return request.user.is_verified
+
+
+class HasCallbackToken(BasePermission):
+    """
+    Allows access only to provider callbacks carrying the shared secret
+    DELIVERY_REPORT_CALLBACK_TOKEN in the token query param or the
+    X-Callback-Token header, every callback is rejected while it is not set
+    """
+    message = "Invalid callback token."
+
+    def has_permission(self, request, view):
+        expected = settings.DELIVERY_REPORT_CALLBACK_TOKEN
+        token = request.query_params.get("token") or request.META.get("HTTP_X_CALLBACK_TOKEN", "")
+        return bool(expected) and hmac.compare_digest(token.encode(), expected.encode())
@@ -0,0 +1,51 @@
+from math import ceil
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from api.authentication.models import ConsumerKey
+from core.utils.helpers import get_cache_key
+from core.utils.rate_limit_helpers import acquire_tokens
+
+
+class TenantRateThrottle(BaseThrottle):
+    """
+    Limits the requests of every company and, for requests authenticated with
+    a consumer key, of every key with token buckets shared through redis.
+    A request takes a token from all its buckets or from none of them
+    """
+
+    def get_buckets(self, request):
+        """Get the (key, rate per second, capacity) buckets a request is charged to"""
+        user = request.user
+        if not user or not user.is_authenticated or not user.company_id:
+            return []
+        buckets = [(
+            get_cache_key("throttle", "company", user.company_id),
+            settings.COMPANY_RATE_LIMIT, settings.COMPANY_RATE_LIMIT_BURST
+        )]
+        if isinstance(request.auth, ConsumerKey):
+            buckets.append((
+                get_cache_key("throttle", "consumer_key", request.auth.pk),
+                settings.CONSUMER_KEY_RATE_LIMIT, settings.CONSUMER_KEY_RATE_LIMIT_BURST
+            ))
+        return buckets
+
+    def allow_request(self, request, view):
+        buckets = self.get_buckets(request)
+        if not buckets:
+            return True
+        allowed, levels, self.wait_time = acquire_tokens(buckets)
+
+        # Headers show the limit, tokens left and refill time of the emptiest bucket, the
+        # one that throttles first, RateLimitHeadersMiddleware adds them to the response
+        remaining, (_, rate, capacity) = min(zip(levels, buckets))
+        request._request.rate_limit = {
+            "limit": capacity,
+            "remaining": max(int(remaining), 0),
+            "reset": ceil(max(capacity - remaining, 0) / rate)
+        }
+        return allowed
+
+    def wait(self):
+        return self.wait_time
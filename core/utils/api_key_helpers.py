@@ -0,0 +1,184 @@
+import hmac
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from psycopg2.extras import execute_values
+
+from jamboSms.celery import app
+
+from api.authentication.models import (
+    ConsumerKey, APIKeyActivity, APIKeyActivityRollup, ACTIVITY_ROLLUP_GRANULARITIES, get_consumer_key_cache_key)
+from .buffer_helpers import get_buffer, push_to_buffer, drain_buffer
+from .helpers import get_key_digest
+
+API_KEY_ACTIVITY_BUFFER = "api_key_activity"
+ROLLUP_TRUNCATIONS = {
+    "minute": {"second": 0, "microsecond": 0},
+    "hour": {"minute": 0, "second": 0, "microsecond": 0},
+    "day": {"hour": 0, "minute": 0, "second": 0, "microsecond": 0}
+}
+
+
+def get_consumer_key(key):
+    """
+    Get a consumer key with its user and company by the prefix index and a
+    constant time comparison of the digest, cached by the digest of the key
+    for CONSUMER_KEY_CACHE_TIMEOUT seconds
+    params:
+        key - string, the raw key sent by the client
+    returns: ConsumerKey or None if the key does not exist
+    """
+    cache = caches[settings.CONSUMER_KEY_CACHE_ALIAS]
+    digest = get_key_digest(key)
+    cache_key = get_consumer_key_cache_key(digest)
+    consumer_key = cache.get(cache_key)
+    if consumer_key is None:
+        candidates = ConsumerKey.objects.select_related("user__company").filter(
+            prefix=key[:ConsumerKey.PREFIX_LENGTH]
+        )
+        consumer_key = next(
+            (candidate for candidate in candidates if hmac.compare_digest(candidate.digest, digest)), None
+        )
+        if consumer_key is None:
+            return None
+        cache.set(cache_key, consumer_key, settings.CONSUMER_KEY_CACHE_TIMEOUT)
+    return consumer_key
+
+def get_activity_buffer():
+    """Get the redis api key activity buffer, None when activity is written as it comes"""
+    return get_buffer(API_KEY_ACTIVITY_BUFFER, settings.API_KEY_ACTIVITY_REDIS_URL)
+
+def log_api_key_activity(consumer_key, url, request_method):
+    """
+    Buffer an api key request, it is inserted with the next flush
+    params:
+        consumer_key - ConsumerKey object
+        url - requested url
+        request_method - request method
+    """
+    activity = {
+        "company_id": consumer_key.user.company_id,
+        "key_id": consumer_key.pk,
+        "url": url[:APIKeyActivity._meta.get_field("url").max_length],
+        "method": request_method,
+        "created_at": timezone.now().isoformat()
+    }
+    push_to_buffer(
+        get_activity_buffer(), activity, settings.API_KEY_ACTIVITY_FLUSH_THRESHOLD,
+        flush_activity_buffer, flush_api_key_activity, write_api_key_activity
+    )
+
+def get_period_start(moment, granularity):
+    """Truncate a datetime to the start of its minute, hour or day"""
+    return moment.replace(**ROLLUP_TRUNCATIONS[granularity])
+
+def get_rollup_rows(activities):
+    """
+    Count activity per key, endpoint and period of every granularity
+    params:
+        activities - list of (company id, key id, url, method, created_at) tuples
+    returns: sorted list of rollup rows
+    """
+    counts = Counter(
+        (company_id, key_id, url, method, granularity, get_period_start(created_at, granularity))
+        for company_id, key_id, url, method, created_at in activities
+        for granularity, _ in ACTIVITY_ROLLUP_GRANULARITIES
+    )
+    return sorted(row + (count,) for row, count in counts.items())
+
+def write_api_key_activity(activities):
+    """
+    Insert buffered activity keeping the time of the requests and add it to
+    the minute, hour and day rollups with one statement each, activity of
+    keys deleted in the meantime is dropped
+    params:
+        activities - list of dicts from log_api_key_activity
+    returns: number of rows inserted
+    """
+    table = APIKeyActivity._meta.db_table
+    key_table = ConsumerKey._meta.db_table
+    rollup_table = APIKeyActivityRollup._meta.db_table
+    rows = [(
+        activity["company_id"], activity["key_id"], activity["url"], activity["method"],
+        parse_datetime(activity["created_at"]), False
+    ) for activity in activities]
+    with transaction.atomic(), connection.cursor() as cursor:
+        inserted = execute_values(
+            cursor,
+            f"INSERT INTO {table} (company_id, key_id, url, method, created_at, updated_at, is_deleted) "
+            f"SELECT activity.company_id, activity.key_id, activity.url, activity.method, "
+            f"activity.created_at, activity.created_at, activity.is_deleted "
+            f"FROM (VALUES %s) AS activity (company_id, key_id, url, method, created_at, is_deleted) "
+            f"JOIN {key_table} ON {key_table}.id = activity.key_id "
+            f"RETURNING {table}.company_id, {table}.key_id, {table}.url, {table}.method, {table}.created_at",
+            rows, page_size=len(rows), fetch=True
+        )
+        if inserted:
+            # Rows are sorted so that concurrent flushes lock the rollups in the same order
+            rollup_rows = get_rollup_rows(inserted)
+            execute_values(
+                cursor,
+                f"INSERT INTO {rollup_table} (company_id, key_id, url, method, granularity, period_start, count) "
+                f"VALUES %s ON CONFLICT (key_id, granularity, period_start, url, method) "
+                f"DO UPDATE SET count = {rollup_table}.count + EXCLUDED.count",
+                rollup_rows, page_size=len(rollup_rows)
+            )
+    return len(inserted)
+
+def flush_activity_buffer():
+    """Insert buffered api key activity in batches of API_KEY_ACTIVITY_BATCH_SIZE"""
+    return drain_buffer(get_activity_buffer(), settings.API_KEY_ACTIVITY_BATCH_SIZE, write_api_key_activity)
+
+@app.task(name="flush_api_key_activity")
+def flush_api_key_activity():
+    """Flush the api key activity buffer from a worker, queued by size and by celery beat"""
+    return flush_activity_buffer()
+
+def delete_in_batches(table, condition, params, batch_size):
+    """
+    Delete the rows of a table matching condition a batch at a time so that
+    pruning a large table never holds long locks
+    params:
+        table - table name
+        condition - sql condition with %s placeholders for params
+        params - list
+        batch_size - integer
+    returns: number of rows deleted
+    """
+    deleted = 0
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE {condition} ORDER BY id LIMIT %s)",
+                params + [batch_size]
+            )
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
+
+@app.task(name="prune_api_key_activity")
+def prune_api_key_activity():
+    """
+    Delete raw activity older than API_KEY_ACTIVITY_RETENTION_DAYS and minute
+    and hour rollups past their retention, day rollups are kept
+    returns: number of raw activity rows deleted
+    """
+    now = timezone.now()
+    batch_size = settings.API_KEY_ACTIVITY_PRUNE_BATCH_SIZE
+    for granularity, days in (
+        ("minute", settings.API_KEY_ACTIVITY_MINUTE_ROLLUP_RETENTION_DAYS),
+        ("hour", settings.API_KEY_ACTIVITY_HOUR_ROLLUP_RETENTION_DAYS)
+    ):
+        delete_in_batches(
+            APIKeyActivityRollup._meta.db_table, "granularity = %s AND period_start < %s",
+            [granularity, now - timedelta(days=days)], batch_size
+        )
+    return delete_in_batches(
+        APIKeyActivity._meta.db_table, "created_at < %s",
+        [now - timedelta(days=settings.API_KEY_ACTIVITY_RETENTION_DAYS)], batch_size
+    )
@@ -0,0 +1,103 @@
+from django.db import connection, transaction
+
+from rest_framework.exceptions import ValidationError
+
+from api.authentication.models import Company
+from api.payment.models import LedgerEntry, BalanceReservation
+
+BALANCE_FIELDS = {
+    "sms": "sms_count",
+    "email": "email_count"
+}
+
+INSUFFICIENT_BALANCE_MESSAGES = {
+    "sms": "You do not have enough SMS balance to send this messages, please top up. Your balance is {}",
+    "email": "You do not have enough emails balance to send this messages, please top up. Your balance is {}"
+}
+
+def apply_balance_change(company_id, amount, resource="sms", check_balance=True):
+    """
+    Change a balance with a single UPDATE on the company row, a debit only
+    applies when the balance covers it so concurrent sends cannot overdraw
+    params:
+        company_id - integer
+        amount - integer, negative for debits
+        resource - sms or email
+        check_balance - Boolean, whether a debit must be covered by the balance
+    returns: the new balance or None if the balance does not cover the debit
+    """
+    field = BALANCE_FIELDS[resource]
+    table = Company._meta.db_table
+    condition = f" AND {field} + %s >= 0" if check_balance and amount < 0 else ""
+    params = [amount, company_id] + ([amount] if condition else [])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {field} = {field} + %s WHERE id = %s{condition} RETURNING {field}", params
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def record_balance_change(company, amount, resource="sms", reason="", reference=None, check_balance=True):
+    """
+    Apply a balance change and append it to the ledger in one transaction
+    returns: the new balance
+    """
+    with transaction.atomic():
+        balance = apply_balance_change(company.pk, amount, resource, check_balance)
+        if balance is None:
+            balance = Company.objects.values_list(BALANCE_FIELDS[resource], flat=True).get(pk=company.pk)
+            setattr(company, BALANCE_FIELDS[resource], balance)
+            raise ValidationError({"detail": INSUFFICIENT_BALANCE_MESSAGES[resource].format(balance)})
+        LedgerEntry.objects.create(
+            company_id=company.pk, resource=resource, amount=amount,
+            balance_after=balance, reason=reason, reference=reference
+        )
+    setattr(company, BALANCE_FIELDS[resource], balance)
+    return balance
+
+def debit_balance(company, amount, resource="sms", reason="send", reference=None):
+    """Debit a balance, raises a ValidationError when the balance does not cover it"""
+    return record_balance_change(company, -amount, resource, reason, reference)
+
+def credit_balance(company, amount, resource="sms", reason="topup", reference=None):
+    """Credit a balance"""
+    return record_balance_change(company, amount, resource, reason, reference)
+
+def reserve_balance(company, amount, resource="sms", reference=None):
+    """
+    Debit the estimated cost of a send up front
+    returns: BalanceReservation instance
+    """
+    with transaction.atomic():
+        debit_balance(company, amount, resource, "reservation", reference)
+        return BalanceReservation.objects.create(company_id=company.pk, resource=resource, amount=amount)
+
+def settle_reservation(reservation_id, consumed):
+    """
+    Settle a reservation against what the provider actually used, the unused
+    part is refunded and extra usage is debited if the balance covers it or
+    recorded as unpaid on the reservation. A reservation is only settled once.
+    params:
+        reservation_id - integer
+        consumed - integer
+    returns: Boolean, whether this call settled the reservation
+    """
+    with transaction.atomic():
+        updated = BalanceReservation.objects.filter(pk=reservation_id, status="held").update(
+            status="settled", consumed=consumed
+        )
+        if not updated:
+            return False
+        reservation = BalanceReservation.objects.select_related("company").get(pk=reservation_id)
+        difference = reservation.amount - consumed
+        reference = f"reservation:{reservation_id}"
+        if difference > 0:
+            credit_balance(reservation.company, difference, reservation.resource, "refund", reference)
+        elif difference < 0:
+            try:
+                with transaction.atomic():
+                    debit_balance(reservation.company, -difference, reservation.resource, "overage", reference)
+            except ValidationError:
+                # the send already happened, the overage is owed rather than overdrawing the balance
+                BalanceReservation.objects.filter(pk=reservation_id).update(unpaid=-difference)
+    return True
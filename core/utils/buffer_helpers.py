@@ -0,0 +1,125 @@
+import json
+import threading
+from collections import deque
+
+import redis
+from django.conf import settings
+
+from .helpers import get_cache_key
+from .rate_limit_helpers import get_redis_connection
+
+_local_buffers = {}
+
+
+class RedisBuffer:
+    """Items queued in a redis list shared by the web and celery workers"""
+    flushes_in_process = False
+
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.key = get_cache_key(name, "buffer")
+
+    def push(self, *items):
+        """Append json serializable items to the buffer, returns the number of buffered items"""
+        return self.connection.rpush(self.key, *[json.dumps(item) for item in items])
+
+    def pop(self, count):
+        """Remove and return up to count of the oldest items"""
+        pipeline = self.connection.pipeline()
+        pipeline.lrange(self.key, 0, count - 1)
+        pipeline.ltrim(self.key, count, -1)
+        items, _ = pipeline.execute()
+        return [json.loads(item) for item in items]
+
+
+class LocalBuffer:
+    """
+    In process buffer used in tests when LOCAL_WRITE_BUFFERS is set. Workers
+    can not see it so it is flushed by the process that fills it
+    """
+    flushes_in_process = True
+
+    def __init__(self):
+        self.items = deque()
+        self.lock = threading.Lock()
+
+    def push(self, *items):
+        """Same as RedisBuffer.push"""
+        with self.lock:
+            self.items.extend(items)
+            return len(self.items)
+
+    def pop(self, count):
+        """Same as RedisBuffer.pop"""
+        with self.lock:
+            return [self.items.popleft() for _ in range(min(count, len(self.items)))]
+
+
+def get_buffer(name, redis_url):
+    """
+    Get the redis buffer called name. Without redis_url items are written as they
+    come, which None stands for, unless LOCAL_WRITE_BUFFERS asks for an in process buffer
+    """
+    connection = get_redis_connection(redis_url) if redis_url else None
+    if connection:
+        return RedisBuffer(connection, name)
+    if not settings.LOCAL_WRITE_BUFFERS:
+        return None
+    if name not in _local_buffers:
+        _local_buffers[name] = LocalBuffer()
+    return _local_buffers[name]
+
+def push_to_buffer(buffer, item, threshold, flush, flush_task, write):
+    """
+    Buffer an item and flush the buffer every threshold buffered items,
+    local buffers are flushed in process and shared ones by a worker
+    params:
+        buffer - RedisBuffer, LocalBuffer or None to write the item right away,
+            it is also written right away while redis can not be reached
+        item - json serializable item
+        threshold - integer, 0 leaves flushing to a periodic task
+        flush - function writing the buffer
+        flush_task - celery task calling flush
+        write - function taking a list of items
+    """
+    if buffer is None:
+        write([item])
+        return
+    try:
+        buffered = buffer.push(item)
+    except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
+        # like acquire_tokens, an unreachable redis slows the item down instead of failing the request
+        write([item])
+        return
+    if not threshold or buffered % threshold:
+        return
+    if buffer.flushes_in_process:
+        flush()
+    else:
+        flush_task.delay()
+
+def drain_buffer(buffer, batch_size, write):
+    """
+    Pass the buffered items to write in batches of batch_size until the
+    buffer is empty, a batch that fails to be written is put back
+    params:
+        buffer - RedisBuffer, LocalBuffer or None
+        batch_size - integer
+        write - function taking a list of items and returning the number written
+    returns: number of items written
+    """
+    if buffer is None:
+        return 0
+    written = 0
+    while True:
+        items = buffer.pop(batch_size)
+        if not items:
+            break
+        try:
+            written += write(items)
+        except Exception:
+            buffer.push(*items)
+            raise
+        if len(items) < batch_size:
+            break
+    return written
@@ -0,0 +1,182 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from psycopg2.extras import execute_values, Json
+
+from jamboSms.celery import app
+
+from api.sms.models import DeliveredSMS, SentSMS, SMSRequestStats, UnmatchedDeliveryReport
+from .buffer_helpers import get_buffer, push_to_buffer, drain_buffer
+
+DELIVERY_REPORT_BUFFER = "delivery_reports"
+DELIVERY_REPORT_FIELDS = (
+    "sent_sms_id", "status", "phone_number", "network_code", "network", "failure_reason", "retry_count"
+)
+# Africa's Talking final delivery statuses, Sent, Submitted and Buffered are still pending
+DELIVERED_STATUSES = ("Success",)
+FAILED_STATUSES = ("Failed", "Rejected")
+
+def get_report_buffer():
+    """Get the redis delivery report buffer, None when reports are written as they come"""
+    return get_buffer(DELIVERY_REPORT_BUFFER, settings.DELIVERY_REPORT_REDIS_URL)
+
+def enqueue_delivery_report(report):
+    """
+    Buffer a validated delivery report and queue a flush every
+    DELIVERY_REPORT_FLUSH_THRESHOLD buffered reports
+    params:
+        report - dict with the DELIVERY_REPORT_FIELDS
+    """
+    push_to_buffer(
+        get_report_buffer(), report, settings.DELIVERY_REPORT_FLUSH_THRESHOLD,
+        flush_report_buffer, flush_delivery_reports, write_delivery_reports
+    )
+
+def get_delivery_outcome(status):
+    """Get the stats counter a delivery report status is counted in, None while pending"""
+    if status in DELIVERED_STATUSES:
+        return "delivered"
+    if status in FAILED_STATUSES:
+        return "failed"
+    return None
+
+def get_stats_changes(previous, reports):
+    """
+    Get the change of the delivered and failed counters per sms request and
+    network, a message moving from one outcome to another is moved between counters
+    params:
+        previous - dict of message id to its (sms request id, status, network) before the reports
+        reports - list of reports of known messages
+    returns: list of (sms request id, network, delivered change, failed change) tuples
+    """
+    changes = defaultdict(Counter)
+    for report in reports:
+        sms_request_id, status, network = previous[report["sent_sms_id"]]
+        if not sms_request_id:
+            continue
+        previous_outcome = get_delivery_outcome(status)
+        outcome = get_delivery_outcome(report["status"])
+        if (previous_outcome, network) == (outcome, report["network"]):
+            continue
+        if previous_outcome:
+            changes[(sms_request_id, network)][previous_outcome] -= 1
+        if outcome:
+            changes[(sms_request_id, report["network"])][outcome] += 1
+    return [
+        (sms_request_id, network, change["delivered"], change["failed"])
+        for (sms_request_id, network), change in changes.items() if any(change.values())
+    ]
+
+def write_delivery_reports(reports):
+    """
+    Upsert DeliveredSMS rows, update the status of their SentSMS rows and
+    the SMSRequestStats counters with one statement each. Reports of messages
+    without a SentSMS row yet are parked in UnmatchedDeliveryReport and the
+    last report of a message wins
+    params:
+        reports - list of dicts with the DELIVERY_REPORT_FIELDS
+    returns: number of reports written
+    """
+    latest = {report["sent_sms_id"]: report for report in reports}
+    delivered_table = DeliveredSMS._meta.db_table
+    sent_table = SentSMS._meta.db_table
+    stats_table = SMSRequestStats._meta.db_table
+    unmatched_table = UnmatchedDeliveryReport._meta.db_table
+    columns = ", ".join(DELIVERY_REPORT_FIELDS)
+    updated_columns = ", ".join(
+        f"{field} = EXCLUDED.{field}" for field in DELIVERY_REPORT_FIELDS[1:] + ("updated_at",)
+    )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Locking the messages in a fixed order keeps concurrent flushes from
+        # counting the same change twice or deadlocking
+        cursor.execute(
+            f"SELECT {sent_table}.message_id, {sent_table}.sms_request_id, {delivered_table}.status, "
+            f"{delivered_table}.network FROM {sent_table} LEFT JOIN {delivered_table} "
+            f"ON {delivered_table}.sent_sms_id = {sent_table}.message_id "
+            f"WHERE {sent_table}.message_id = ANY(%s) ORDER BY {sent_table}.message_id FOR UPDATE OF {sent_table}",
+            [list(latest)]
+        )
+        previous = {message_id: state for message_id, *state in cursor.fetchall()}
+        reports = [report for message_id, report in latest.items() if message_id in previous]
+        unmatched = [report for message_id, report in latest.items() if message_id not in previous]
+        if unmatched:
+            # The provider can call back before the send task has saved the message
+            execute_values(
+                cursor,
+                f"INSERT INTO {unmatched_table} (message_id, report, created_at) VALUES %s "
+                f"ON CONFLICT (message_id) DO UPDATE SET report = EXCLUDED.report",
+                [(report["sent_sms_id"], Json(report), timezone.now()) for report in unmatched],
+                page_size=len(unmatched)
+            )
+        if not reports:
+            return 0
+        # A parked report is older than the one written now
+        cursor.execute(
+            f"DELETE FROM {unmatched_table} WHERE message_id = ANY(%s)",
+            [[report["sent_sms_id"] for report in reports]]
+        )
+
+        now = timezone.now()
+        execute_values(
+            cursor,
+            f"INSERT INTO {delivered_table} ({columns}, created_at, updated_at, is_deleted) VALUES %s "
+            f"ON CONFLICT (sent_sms_id) DO UPDATE SET {updated_columns}",
+            [tuple(report.get(field) for field in DELIVERY_REPORT_FIELDS) + (now, now, False) for report in reports],
+            page_size=len(reports)
+        )
+        execute_values(
+            cursor,
+            f"UPDATE {sent_table} SET status = report.status FROM (VALUES %s) AS report (message_id, status) "
+            f"WHERE {sent_table}.message_id = report.message_id AND {sent_table}.status <> report.status",
+            [(report["sent_sms_id"], report["status"]) for report in reports], page_size=len(reports)
+        )
+        stats_changes = get_stats_changes(previous, reports)
+        if stats_changes:
+            execute_values(
+                cursor,
+                f"INSERT INTO {stats_table} (sms_request_id, network, delivered, failed) VALUES %s "
+                f"ON CONFLICT (sms_request_id, network) DO UPDATE SET "
+                f"delivered = {stats_table}.delivered + EXCLUDED.delivered, "
+                f"failed = {stats_table}.failed + EXCLUDED.failed",
+                stats_changes, page_size=len(stats_changes)
+            )
+    return len(reports)
+
+def flush_report_buffer():
+    """
+    Write buffered delivery reports in batches of DELIVERY_REPORT_BATCH_SIZE
+    until the buffer is empty
+    returns: number of reports written
+    """
+    return drain_buffer(get_report_buffer(), settings.DELIVERY_REPORT_BATCH_SIZE, write_delivery_reports)
+
+def retry_unmatched_reports():
+    """
+    Write parked delivery reports whose SentSMS row now exists in batches of
+    DELIVERY_REPORT_BATCH_SIZE and drop the ones older than
+    DELIVERY_REPORT_UNMATCHED_RETENTION seconds
+    returns: number of reports written
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.DELIVERY_REPORT_UNMATCHED_RETENTION)
+    UnmatchedDeliveryReport.objects.filter(created_at__lt=cutoff).delete()
+    matched = UnmatchedDeliveryReport.objects.filter(
+        message_id__in=SentSMS.objects.values("message_id")
+    ).order_by("created_at").values_list("report", flat=True)
+    written = 0
+    while True:
+        reports = list(matched[:settings.DELIVERY_REPORT_BATCH_SIZE])
+        # Writing a matched report deletes it from the parked reports, a batch
+        # parked again because its messages were deleted meanwhile ends the retry
+        batch_written = write_delivery_reports(reports) if reports else 0
+        if not batch_written:
+            return written
+        written += batch_written
+
+@app.task(name="flush_delivery_reports")
+def flush_delivery_reports():
+    """Flush the delivery report buffer from a worker, queued by size and by celery beat"""
+    return flush_report_buffer() + retry_unmatched_reports()
@@ -1,10 +1,16 @@
 import re
+from itertools import chain as chain_iterables
+from django.conf import settings
 from django.db.utils import IntegrityError
-from django.db import models
+from django.db import connection, models
+from psycopg2.extras import execute_values
 from rest_framework.exceptions import ValidationError
+from openpyxl import load_workbook
+import numpy as np
 import pandas as pd
 import re
 import secrets
+import hashlib
 
 import logging
 
@@ -42,38 +48,181 @@ def get_errored_integrity_field(exc):
 class CsvExcelReader:
     """
     A class that is initialized with a csv or excel file another which is 
-    read and data placed in the data property
+    read and data placed in the data property.
+    In stream mode the file is read chunk by chunk from iter_chunks instead
+    and data is left as None
     """
-    def __init__(self, file, required_headers):
+    def __init__(self, file, required_headers, stream=False, chunk_size=None):
         self.data = None
+        self.chunks = None
+        self.headers = None
+        self.row_count = 0
         self.file = file
         self.required_headers = required_headers
+        self.stream = stream
+        self.chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+        self.seen_rows = np.array([], dtype=np.uint64)
         self.read_file()
         self.validate_headers()
 
     def read_csv(self):
-        self.data = pd.read_csv(self.file)
+        if not self.stream:
+            self.data = pd.read_csv(self.file)
+            return
+        self.row_count = self.count_lines() - 1
+        reader = pd.read_csv(self.file, chunksize=self.chunk_size)
+        first_chunk = next(reader)
+        self.headers = list(first_chunk)
+        self.chunks = chain_iterables([first_chunk], reader)
+
     def read_excel(self):
         self.data = pd.read_excel(self.file)
+
+    def read_xlsx(self):
+        if not self.stream:
+            self.read_excel()
+            return
+        workbook = load_workbook(self.file, read_only=True, data_only=True)
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        self.headers = list(next(rows, ()))
+        self.row_count = max((sheet.max_row or 1) - 1, 0)
+        self.chunks = self.read_sheet_chunks(rows)
+
+    def read_sheet_chunks(self, rows):
+        """Build DataFrames from the rows of a read only openpyxl sheet"""
+        width = len(self.headers)
+        start = 0
+        for chunk in chunk_list(rows, self.chunk_size):
+            chunk = [tuple(row[:width]) + (None,) * (width - len(row)) for row in chunk]
+            data = pd.DataFrame(chunk, columns=self.headers, index=range(start, start + len(chunk)))
+            start += len(chunk)
+            yield data.dropna(how="all")
+
+    def count_lines(self):
+        """Count the lines of the file without holding more than a chunk of it in memory"""
+        count = 0
+        last_chunk = b""
+        for last_chunk in self.file.chunks():
+            count += last_chunk.count(b"\n")
+        self.file.seek(0)
+        if last_chunk and not last_chunk.endswith(b"\n"):
+            count += 1
+        return count
     
     def read_file(self):
         read_file = {
             "csv": self.read_csv,
             "xls": self.read_excel,
-            "xlsx": self.read_excel
+            "xlsx": self.read_xlsx
         }
         ext = self.file.name.split(".")[-1]
         read_file[ext]()
-        self.data
+        if self.data is not None:
+            self.headers = list(self.data)
+            self.row_count = len(self.data)
     
     def validate_headers(self):
-        headers = sorted(self.data)
+        headers = sorted(self.headers, key=str)
         valid = all(value in headers for value in self.required_headers)
         if not valid:
             raise ValidationError({"detail": "The file does not have all the required column headers," \
                 + f"make sure it has the following headers: {str(self.required_headers)[1:-1]} "})
 
-        self.data = self.data.drop_duplicates(subset=self.required_headers, keep="first")
+        if self.data is not None:
+            self.data = self.data.drop_duplicates(subset=self.required_headers, keep="first")
+
+    def get_row_keys(self, data):
+        """
+        Normalise the required columns so that a value hashes the same in every chunk,
+        pandas reads a number column as float in chunks with a blank cell and as int otherwise
+        """
+        keys = pd.DataFrame(index=data.index)
+        for column in self.required_headers:
+            values = data[column]
+            keys[column] = values.astype(str).str.strip().where(values.notna())
+            if column == "phone":
+                phones = normalize_phone_numbers(values)
+                keys[column] = phones.where(phones.notna(), keys[column])
+        return keys
+
+    def drop_seen_rows(self, data):
+        """
+        Drop rows whose required columns were already seen in this or an earlier
+        chunk, only a uint64 hash is kept per distinct row
+        """
+        hashes = pd.util.hash_pandas_object(self.get_row_keys(data), index=False).values
+        keep = ~pd.Series(hashes).duplicated().values & ~np.isin(hashes, self.seen_rows)
+        self.seen_rows = np.union1d(self.seen_rows, hashes[keep])
+        return data[keep]
+
+    def iter_chunks(self, size=None):
+        """Iterate over the rows of the file in DataFrames of at most size rows"""
+        if self.chunks is not None:
+            for data in self.chunks:
+                yield self.drop_seen_rows(data)
+            return
+        size = size or self.chunk_size
+        for start in range(0, len(self.data), size):
+            yield self.data.iloc[start:start + size]
+
+    def get_valid_rows(self, columns, data=None, fallback_serializer=None):
+        """
+        Normalise and validate the phone, email and name columns with pandas
+        string operations in one pass instead of a serializer per row
+        args:
+            columns - list of column names to return, missing optional columns are left out
+            data - DataFrame, defaults to the whole file
+            fallback_serializer - serializer class that rejected emails are re-validated with
+        returns: a tuple of a dict of line number to row dict and a list of skipped line numbers
+        """
+        data = self.data if data is None else data
+        columns = [column for column in columns if column in data]
+        rows = pd.DataFrame(index=data.index)
+        valid = pd.Series(True, index=data.index)
+
+        for column in columns:
+            values = data[column]
+            if column == "phone":
+                rows[column] = normalize_phone_numbers(values)
+                valid &= rows[column].notna()
+                continue
+            rows[column] = values.astype(str).str.strip().where(values.notna())
+            if column == "email":
+                valid &= rows[column].str.match(EMAIL_PATTERN).fillna(False).astype(bool)
+            if column in self.required_headers:
+                valid &= rows[column].notna() & rows[column].ne("")
+
+        if fallback_serializer and "email" in columns:
+            for index in data.index[~valid]:
+                serializer = fallback_serializer(data={"email": data.at[index, "email"]})
+                if serializer.is_valid():
+                    rows.at[index, "email"] = serializer.validated_data["email"]
+                    valid[index] = True
+
+        rows = rows[valid].astype(object)
+        rows = rows.where(rows.notna(), None)
+        rows = dict(zip(rows.index + 1, rows.to_dict("records")))
+        skipped_lines = [index + 1 for index in data.index[~valid]]
+        return (rows, skipped_lines)
+
+
+# A subset of the addresses django's EmailValidator accepts, anything
+# this rejects is re-validated by a serializer
+EMAIL_PATTERN = r"^[A-Za-z0-9_%+-]+(?:\.[A-Za-z0-9_%+-]+)*@(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}$"
+
+def normalize_phone_numbers(numbers):
+    """
+    Vectorised add_country_code for a column of phone numbers
+    args:
+        numbers - Series
+    returns: Series of international numbers with NaN for invalid numbers
+    """
+    numbers = np.trunc(pd.to_numeric(numbers, errors="coerce"))
+    valid = numbers.between(10 ** 8, 10 ** 9 - 1)
+    phones = pd.Series(np.nan, index=numbers.index, dtype=object)
+    phones[valid] = "+254" + numbers[valid].astype("int64").astype(str)
+    return phones
 
 def add_country_code(number):
     """
@@ -94,16 +243,88 @@ def add_country_code(number):
         raise ValidationError()
 
 
+CAMEL_CASE_PATTERN = re.compile(r'(?<!^)(?=[A-Z])')
+
 def camel_to_snake(name):
     """Convert camelcase names to snake case"""
-    pattern = re.compile(r'(?<!^)(?=[A-Z])')
-    name = pattern.sub('_', name).lower()
+    name = CAMEL_CASE_PATTERN.sub('_', name).lower()
     return name
 
+def get_cache_key(prefix, *parts):
+    """Build a cache key such as sender_id:12 from a prefix and identifiers"""
+    return ":".join([prefix] + [str(part) for part in parts])
+
 def raise_validation_error(message=None):
     raise ValidationError(message)
 
 
+def chunk_list(items, size):
+    """
+    Split an iterable into lists of at most size items
+    args:
+        items - iterable
+        size - integer
+    returns: generator of lists
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bulk_add_to_m2m(model, instance_id, related_ids, field="members", batch_size=1000):
+    """
+    Add rows to a many to many through table with one INSERT per batch,
+    existing pairs are left as they are
+    args:
+        model - model declaring the many to many field, eg SMSGroup
+        instance_id - primary key of the model instance
+        related_ids - iterable of primary keys of the related model
+        field - name of the many to many field
+        batch_size - integer
+    returns: number of rows added
+    """
+    m2m_field = model._meta.get_field(field)
+    through = m2m_field.remote_field.through
+    source_column = through._meta.get_field(m2m_field.m2m_field_name()).column
+    target_column = through._meta.get_field(m2m_field.m2m_reverse_field_name()).column
+    added = 0
+    with connection.cursor() as cursor:
+        for chunk in chunk_list(related_ids, batch_size):
+            added += len(execute_values(
+                cursor,
+                f"INSERT INTO {through._meta.db_table} ({source_column}, {target_column}) VALUES %s "
+                f"ON CONFLICT DO NOTHING RETURNING 1",
+                [(instance_id, related_id) for related_id in chunk], page_size=len(chunk), fetch=True
+            ))
+    return added
+
+
+def bulk_remove_from_m2m(model, instance_id, related_ids, field="members", batch_size=1000):
+    """
+    Remove rows from a many to many through table with one DELETE per batch
+    args:
+        model - model declaring the many to many field, eg SMSGroup
+        instance_id - primary key of the model instance
+        related_ids - iterable of primary keys of the related model
+        field - name of the many to many field
+        batch_size - integer
+    returns: number of rows removed
+    """
+    m2m_field = model._meta.get_field(field)
+    through = m2m_field.remote_field.through
+    source_name = f"{m2m_field.m2m_field_name()}_id"
+    target_name = f"{m2m_field.m2m_reverse_field_name()}_id"
+    removed = 0
+    for chunk in chunk_list(related_ids, batch_size):
+        removed += through.objects.filter(**{source_name: instance_id, f"{target_name}__in": chunk}).delete()[0]
+    return removed
+
+
 def generate_token(length):
     """Generate token
     args:
@@ -112,13 +333,10 @@ def generate_token(length):
     """
     return secrets.token_urlsafe(length)
 
-def log_api_key_request(model, company, consumer_key, url, request_method):
-    """
-    Log api key activities
+def get_key_digest(key):
+    """Get the sha256 hex digest of a secret key, eg to use it in a cache key
     args:
-        model - activity models
-        url - requested url
-        request_method - request method
-    returns: None
+        key - string
+    returns: string
     """
-    model.objects.create(url=url, key=consumer_key,company=company, method=request_method)
+    return hashlib.sha256(key.encode()).hexdigest()
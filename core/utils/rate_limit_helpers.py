@@ -0,0 +1,166 @@
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+from .helpers import get_cache_key
+
+# Refill and take tokens from every bucket in KEYS, either all buckets
+# are charged or none is. ARGV holds now, the tokens requested and then
+# a rate and capacity per key. The tokens left in each bucket follow the
+# allowed flag and the wait, floats are returned as strings because redis
+# truncates lua numbers to integers.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local requested = tonumber(ARGV[2])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + i * 2])
+    local capacity = tonumber(ARGV[2 + i * 2])
+    local state = redis.call("HMGET", key, "tokens", "timestamp")
+    local tokens = tonumber(state[1]) or capacity
+    local timestamp = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * rate)
+    levels[i] = tokens
+    if tokens < requested then
+        wait = math.max(wait, (requested - tokens) / rate)
+    end
+end
+local result = {wait == 0 and 1 or 0, tostring(wait)}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + i * 2])
+    local capacity = tonumber(ARGV[2 + i * 2])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - requested
+    end
+    redis.call("HMSET", key, "tokens", tokens, "timestamp", now)
+    redis.call("EXPIRE", key, math.ceil(capacity / rate) + 1)
+    result[2 + i] = tostring(tokens)
+end
+return result
+"""
+
+_redis_connections = {}
+_local_token_bucket = None
+
+
+class ProviderRateLimited(Exception):
+    """Raised when capacity for a provider call is not available in time"""
+
+    def __init__(self, wait):
+        super().__init__(f"Provider rate limit exceeded, capacity is available in {wait:.2f}s")
+        self.wait = wait
+
+
+class RedisTokenBucket:
+    """Token buckets shared by every worker through redis"""
+
+    def __init__(self, connection):
+        self.script = connection.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def acquire(self, buckets, tokens=1):
+        """
+        Take tokens from all the passed buckets at once
+        args:
+            buckets - list of (key, rate per second, capacity) tuples
+            tokens - integer
+        returns: a tuple of whether the tokens were taken, a list of the tokens
+            left in each bucket and the seconds to wait before retrying
+        """
+        args = [time.time(), tokens]
+        for _, rate, capacity in buckets:
+            args += [rate, capacity]
+        allowed, wait, *levels = self.script(keys=[key for key, _, _ in buckets], args=args)
+        return (bool(allowed), [float(level) for level in levels], float(wait))
+
+
+class LocalTokenBucket:
+    """In process token buckets used when no redis url is configured, eg in tests"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, buckets, tokens=1):
+        """Same as RedisTokenBucket.acquire but limited to the current process"""
+        now = time.monotonic()
+        with self.lock:
+            levels = []
+            wait = 0
+            for key, rate, capacity in buckets:
+                stored, timestamp = self.buckets.get(key, (capacity, now))
+                level = min(capacity, stored + (now - timestamp) * rate)
+                levels.append(level)
+                if level < tokens:
+                    wait = max(wait, (tokens - level) / rate)
+            if not wait:
+                levels = [level - tokens for level in levels]
+            for (key, _, _), level in zip(buckets, levels):
+                self.buckets[key] = (level, now)
+        return (not wait, levels, wait)
+
+
+def get_redis_connection(url=None):
+    """Get a redis connection for url, RATE_LIMIT_REDIS_URL by default, None if no url is set"""
+    url = url or settings.RATE_LIMIT_REDIS_URL
+    if not url:
+        return None
+    if url not in _redis_connections:
+        _redis_connections[url] = redis.Redis.from_url(url)
+    return _redis_connections[url]
+
+def get_local_token_bucket():
+    """Get the token buckets of the current process"""
+    global _local_token_bucket
+    if _local_token_bucket is None:
+        _local_token_bucket = LocalTokenBucket()
+    return _local_token_bucket
+
+def get_token_bucket():
+    """Get the shared redis token bucket or the local fallback"""
+    connection = get_redis_connection()
+    if connection:
+        return RedisTokenBucket(connection)
+    return get_local_token_bucket()
+
+def acquire_tokens(buckets, tokens=1):
+    """
+    Same as RedisTokenBucket.acquire, limits fall back to the local buckets
+    of the process while redis can not be reached instead of failing requests
+    """
+    try:
+        return get_token_bucket().acquire(buckets, tokens)
+    except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
+        return get_local_token_bucket().acquire(buckets, tokens)
+
+def get_provider_buckets(sender_id):
+    """Get the global and sender id buckets a provider call is charged to"""
+    return [
+        (get_cache_key("rate_limit", "provider"), settings.PROVIDER_RATE_LIMIT, settings.PROVIDER_RATE_LIMIT_BURST),
+        (get_cache_key("rate_limit", "sender_id", sender_id), settings.SENDER_ID_RATE_LIMIT, settings.SENDER_ID_RATE_LIMIT_BURST)
+    ]
+
+def wait_for_provider_capacity(sender_id, message_count):
+    """
+    Block until the provider contract allows sending message_count messages,
+    large batches are charged in steps of at most the smallest bucket capacity
+    params:
+        sender_id - string
+        message_count - integer
+    raises: ProviderRateLimited if capacity is not available within PROVIDER_RATE_LIMIT_MAX_WAIT seconds
+    """
+    buckets = get_provider_buckets(sender_id)
+    step = min(capacity for _, _, capacity in buckets)
+    deadline = time.monotonic() + settings.PROVIDER_RATE_LIMIT_MAX_WAIT
+    while message_count > 0:
+        tokens = min(message_count, step)
+        allowed, _, wait = acquire_tokens(buckets, tokens)
+        if allowed:
+            message_count -= tokens
+            continue
+        if time.monotonic() + wait > deadline:
+            raise ProviderRateLimited(wait)
+        time.sleep(wait)
@@ -0,0 +1,94 @@
+import re
+from math import ceil
+
+import numpy as np
+
+# GSM 03.38 basic character set, the escape character itself is left out
+GSM7_BASIC_CHARACTERS = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Characters of the extension table are sent as an escape and a character
+GSM7_EXTENSION_CHARACTERS = "\f^{}\\[~]|€"
+
+GSM7_PATTERN = re.compile(
+    "^[" + "".join(re.escape(char) for char in GSM7_BASIC_CHARACTERS + GSM7_EXTENSION_CHARACTERS) + "]*$"
+)
+GSM7_EXTENSION_PATTERN = "[" + "".join(re.escape(char) for char in GSM7_EXTENSION_CHARACTERS) + "]"
+
+# Per code point lookup tables used to measure many names at once
+GSM7_SEPTETS = np.zeros(0x110000, dtype=np.uint8)
+GSM7_SEPTETS[[ord(char) for char in GSM7_BASIC_CHARACTERS]] = 1
+GSM7_SEPTETS[[ord(char) for char in GSM7_EXTENSION_CHARACTERS]] = 2
+# Characters outside the basic multilingual plane take two UTF-16 code units
+UTF16_UNITS = np.ones(0x110000, dtype=np.uint8)
+UTF16_UNITS[0x10000:] = 2
+
+# Units per single message and per part of a concatenated message
+SEGMENT_SIZES = {
+    "gsm7": (160, 153),
+    "ucs2": (70, 67)
+}
+
+def get_message_encoding(message):
+    """Get the encoding a message is sent in, gsm7 or ucs2"""
+    return "gsm7" if GSM7_PATTERN.match(message) else "ucs2"
+
+def get_message_length(message, encoding):
+    """
+    Get the length of a message in the units of its encoding, septets for gsm7
+    and UTF-16 code units for ucs2
+    """
+    if encoding == "gsm7":
+        return len(message) + len(re.findall(GSM7_EXTENSION_PATTERN, message))
+    return len(message.encode("utf-16-le")) // 2
+
+def count_segments(length, encoding):
+    """Get the number of sms segments a message of the passed length is split into"""
+    single_size, part_size = SEGMENT_SIZES[encoding]
+    if length <= single_size:
+        return 1 if length else 0
+    return ceil(length / part_size)
+
+def count_message_segments(message):
+    """Get the number of sms segments needed to send a message"""
+    encoding = get_message_encoding(message)
+    return count_segments(get_message_length(message, encoding), encoding)
+
+def sum_per_name(values, lengths):
+    """Sum per character values over the characters of each name"""
+    ends = np.cumsum(lengths)
+    totals = np.concatenate([[0], np.cumsum(values, dtype=np.int64)])
+    return totals[ends] - totals[ends - lengths]
+
+def count_personalized_segments(prefix, suffix, names):
+    """
+    Count the segments of prefix + name + suffix for every name with numpy,
+    the fixed parts of the message are measured once and the names are
+    measured through per code point lookup tables
+    args:
+        prefix - string before the name
+        suffix - string after the name
+        names - iterable of strings
+    returns: numpy array of segment counts in the order of names
+    """
+    names = [name or "" for name in names]
+    template = prefix + suffix
+    template_is_gsm7 = get_message_encoding(template) == "gsm7"
+    template_septets = get_message_length(template, "gsm7") if template_is_gsm7 else 0
+    template_units = get_message_length(template, "ucs2")
+
+    lengths = np.fromiter(map(len, names), dtype=np.int64, count=len(names))
+    code_points = np.frombuffer("".join(names).encode("utf-32-le"), dtype=np.uint32)
+    septets = GSM7_SEPTETS[code_points]
+    non_gsm7_count = sum_per_name(septets == 0, lengths)
+    is_gsm7 = (non_gsm7_count == 0) & template_is_gsm7
+    lengths = np.where(
+        is_gsm7,
+        template_septets + sum_per_name(septets, lengths),
+        template_units + sum_per_name(UTF16_UNITS[code_points], lengths)
+    )
+
+    single_sizes = np.where(is_gsm7, SEGMENT_SIZES["gsm7"][0], SEGMENT_SIZES["ucs2"][0])
+    part_sizes = np.where(is_gsm7, SEGMENT_SIZES["gsm7"][1], SEGMENT_SIZES["ucs2"][1])
+    return np.where(lengths <= single_sizes, 1, np.ceil(lengths / part_sizes)).astype(int)
@@ -1,23 +1,50 @@
 import os
-from math import ceil
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain as chain_iterables
+from datetime import timedelta
 from decimal import Decimal
-from rest_framework.exceptions import ValidationError
+import random
 import africastalking
+from africastalking.Service import AfricasTalkingException
+from celery import chain, group
+import requests
 
 from django.conf import settings
+from django.core.cache import caches
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
 
 from jamboSms.celery import app
 
-from api.authentication.models import Company
-from api.sms.models import SentSMS
-from .helpers import camel_to_snake
+from api.sms.models import SentSMS, SMSRequest, SMSGroup, SMSBranding, FailedSMS, SENDER_ID_CACHE_PREFIX
+from .helpers import camel_to_snake, chunk_list, bulk_add_to_m2m, bulk_remove_from_m2m, get_cache_key
+from .balance_helpers import credit_balance, debit_balance, settle_reservation
+from .rate_limit_helpers import wait_for_provider_capacity, ProviderRateLimited
+from .segment_helpers import count_message_segments, count_personalized_segments
 
 username = os.getenv("AIT_USERNAME")
 api_key = os.getenv("AIT_API_KEY")
 africastalking.initialize(username, api_key)
 sms = africastalking.SMS
 
+# Africa's Talking recipient status codes for Processed, Sent and Queued
+SMS_SENT_STATUS_CODES = (100, 101, 102)
+# InsufficientBalance, CouldNotRoute, InternalServerError and GatewayError
+SMS_TRANSIENT_STATUS_CODES = (405, 407, 500, 501)
+
+# ConnectionError includes connect timeouts, the request never reached the provider
+TRANSIENT_PROVIDER_ERRORS = (ProviderRateLimited, requests.exceptions.ConnectionError)
+PERMANENT_PROVIDER_ERROR_MESSAGES = ("authentication", "invalid sender", "missing required")
+
+def send_provider_sms(message, number_list, sender_id):
+    """Send through Africa's Talking once the provider rate limits allow it"""
+    wait_for_provider_capacity(sender_id, len(number_list))
+    return sms.send(message, number_list, sender_id)
+
 def company_is_branded(company):
     """
     Check if user has requested branding
@@ -33,24 +60,23 @@ def company_is_branded(company):
 
 def get_sms_branding(company_id):
     """
-    Get SMS branding name is avilable and approved
+    Get SMS branding name is avilable and approved, the name is cached per
+    company until its branding is saved or deleted
     params:
-        company - Company object
+        company_id - integer
     returns: String
     """
-    brand_name = settings.COMPANY_BRAND_NAME
-    
     if not company_id:
-        return brand_name
-
-    company = Company.objects.get(pk=company_id)
-    if not company_is_branded(company):
-        return brand_name
-
-    brand_object = company.brand
+        return settings.COMPANY_BRAND_NAME
 
-    if brand_object.is_active and brand_object.is_approved:
-        brand_name = brand_object.name
+    cache = caches[settings.SENDER_ID_CACHE_ALIAS]
+    cache_key = get_cache_key(SENDER_ID_CACHE_PREFIX, company_id)
+    brand_name = cache.get(cache_key)
+    if brand_name is None:
+        brand_name = SMSBranding.objects.filter(
+            company_id=company_id, is_active=True, is_approved=True
+        ).values_list("name", flat=True).first() or settings.COMPANY_BRAND_NAME
+        cache.set(cache_key, brand_name, settings.SENDER_ID_CACHE_TIMEOUT)
     return brand_name
 
 def log_sent_message(recipient, company):
@@ -59,51 +85,421 @@ def log_sent_message(recipient, company):
     recipient.pop("number")
     SentSMS.objects.create(company=company, **recipient)
 
-@app.task(name="send_sms")
-def send_sms(message, number_list, company_id=None):
+def normalize_sent_messages(recipients):
+    """
+    Map provider recipient payloads to SentSMS field values in one pass,
+    recipients the provider rejected have no message id and are skipped
+    params:
+        recipients - list of dicts from the AIT api
+    returns: list of dicts
+    """
+    return [{
+        "message_id": recipient["messageId"],
+        "status": recipient["status"],
+        "status_code": recipient["statusCode"]
+        } for recipient in recipients if recipient["messageId"] != "None"]
+
+def copy_sent_messages(rows, company_id, sms_request_id=None):
+    """
+    Write SentSMS rows with postgres COPY, message ids must not exist yet
+    params:
+        rows - list of dicts from normalize_sent_messages
+        company_id - integer
+        sms_request_id - integer or None
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row["message_id"], row["status"], row["status_code"], company_id, sms_request_id])
+    buffer.seek(0)
+
+    table = SentSMS._meta.db_table
+    company_column = SentSMS._meta.get_field("company").column
+    sms_request_column = SentSMS._meta.get_field("sms_request").column
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table} (message_id, status, status_code, {company_column}, {sms_request_column}) "
+            "FROM STDIN WITH CSV", buffer
+        )
+
+def log_sent_messages(recipients, company_id, sms_request_id=None):
+    """
+    Log provider recipients as SentSMS rows in chunks of SENT_SMS_LOG_BATCH_SIZE
+    params:
+        recipients - list of dicts from the AIT api
+        company_id - integer
+        sms_request_id - integer, the request delivery reports of the messages are counted against
+    """
+    rows = normalize_sent_messages(recipients)
+    for chunk in chunk_list(rows, settings.SENT_SMS_LOG_BATCH_SIZE):
+        if settings.SENT_SMS_LOG_METHOD == "copy":
+            copy_sent_messages(chunk, company_id, sms_request_id)
+            continue
+        SentSMS.objects.bulk_create(
+            [SentSMS(company_id=company_id, sms_request_id=sms_request_id, **row) for row in chunk],
+            ignore_conflicts=True
+        )
+
+def get_group_recipients(group_model, group_ids, field="phone", exclude=None):
+    """
+    Build a single SELECT DISTINCT over the members through table of the passed
+    groups, soft deleted members are left out
+    params:
+        group_model - SMSGroup or EmailGroup
+        group_ids - list of integers
+        field - member field to return, phone or email
+        exclude - list of values to leave out, eg recepients passed separately
+    returns: values_list queryset
+    """
+    members_field = group_model._meta.get_field("members")
+    group_name = members_field.m2m_field_name()
+    member_name = members_field.m2m_reverse_field_name()
+    queryset = members_field.remote_field.through.objects.filter(
+        **{f"{group_name}__in": group_ids, f"{member_name}__is_deleted": False}
+    )
+    if exclude:
+        queryset = queryset.exclude(**{f"{member_name}__{field}__in": exclude})
+    return queryset.values_list(f"{member_name}__{field}", flat=True).distinct()
+
+def stream_group_recipients(group_model, group_ids, field="phone", exclude=None):
+    """Iterate over group recipients with a server side cursor"""
+    queryset = get_group_recipients(group_model, group_ids, field, exclude)
+    return queryset.iterator(chunk_size=settings.RECIPIENT_STREAM_CHUNK_SIZE)
+
+def bulk_upsert_group_members(group, member_model, rows, field="phone"):
     """
-    sends an SMS to a list of phone numbers
+    Insert uploaded members that do not exist yet and add all of them to the group
+    params:
+        group - SMSGroup or EmailGroup instance
+        member_model - GroupMember or EmailGroupMember
+        rows - list of dicts of member fields
+        field - field members are unique on within a company, phone or email
+    returns: list of members in the order of rows
+    """
+    batch_size = settings.MEMBER_IMPORT_BATCH_SIZE
+    for chunk in chunk_list(rows, batch_size):
+        member_model.objects.bulk_create(
+            [member_model(company=group.company, **row) for row in chunk], ignore_conflicts=True
+        )
+    values = list(dict.fromkeys(row[field] for row in rows))
+    queryset = member_model.objects.filter(company=group.company, **{f"{field}__in": values})
+    members = {getattr(member, field): member for member in queryset}
+    members = [members[value] for value in values if value in members]
+    bulk_add_to_m2m(type(group), group.pk, [member.pk for member in members], batch_size=batch_size)
+    return members
+
+def add_group_members(group, members):
+    """
+    Add existing members to a group in chunks of MEMBER_IMPORT_BATCH_SIZE
+    params:
+        group - SMSGroup or EmailGroup instance
+        members - queryset of members of the group company
+    returns: number of members that were not in the group yet
+    """
+    member_ids = list(members.values_list("pk", flat=True))
+    return bulk_add_to_m2m(type(group), group.pk, member_ids, batch_size=settings.MEMBER_IMPORT_BATCH_SIZE)
+
+def remove_group_members(group, members):
+    """
+    Remove members from a group in chunks of MEMBER_IMPORT_BATCH_SIZE
+    params:
+        group - SMSGroup or EmailGroup instance
+        members - queryset of members of the group company
+    returns: number of members removed from the group
+    """
+    member_ids = list(members.values_list("pk", flat=True))
+    return bulk_remove_from_m2m(type(group), group.pk, member_ids, batch_size=settings.MEMBER_IMPORT_BATCH_SIZE)
+
+def is_transient_provider_error(exc):
+    """
+    Check if a failed provider call is worth retrying. A read timeout is not,
+    the provider may have sent the messages before the response was lost
+    """
+    if isinstance(exc, TRANSIENT_PROVIDER_ERRORS):
+        return True
+    if isinstance(exc, AfricasTalkingException):
+        return not any(message in str(exc).lower() for message in PERMANENT_PROVIDER_ERROR_MESSAGES)
+    return False
+
+def get_retry_countdown(retries):
+    """Exponential backoff with full jitter"""
+    backoff = min(settings.SMS_RETRY_BACKOFF_MAX, settings.SMS_RETRY_BACKOFF_BASE * 2 ** retries)
+    return random.uniform(0, backoff)
+
+def missing_recipient(number):
+    """Recipient used for a number the provider response left out"""
+    return {"number": number, "statusCode": None, "status": "Missing from provider response", "messageId": "None"}
+
+def sort_sms_outcomes(outcomes):
+    """
+    Split outcomes into sent messages, messages worth retrying and permanent failures
+    params:
+        outcomes - list of (number, message, result) where result is a provider recipient or an exception
+    returns: tuple of three lists of outcomes
+    """
+    sent, retryable, failed = [], [], []
+    for outcome in outcomes:
+        result = outcome[2]
+        if isinstance(result, Exception):
+            (retryable if is_transient_provider_error(result) else failed).append(outcome)
+        elif result["statusCode"] in SMS_SENT_STATUS_CODES:
+            sent.append(outcome)
+        elif result["statusCode"] in SMS_TRANSIENT_STATUS_CODES:
+            retryable.append(outcome)
+        else:
+            failed.append(outcome)
+    return (sent, retryable, failed)
+
+def dead_letter_sms(outcomes, company_id, sms_request_id, attempts):
+    """Store recipients that could not be sent to as FailedSMS rows"""
+    if not company_id or not outcomes:
+        return
+    failed_sms = []
+    for number, message, result in outcomes:
+        if isinstance(result, Exception):
+            status_code, reason = None, str(result) or type(result).__name__
+        else:
+            status_code, reason = result["statusCode"], result["status"]
+        failed_sms.append(FailedSMS(
+            company_id=company_id, sms_request_id=sms_request_id, phone_number=number,
+            message=message, status_code=status_code, reason=reason[:255], attempts=attempts
+        ))
+    FailedSMS.objects.bulk_create(failed_sms, batch_size=settings.SENT_SMS_LOG_BATCH_SIZE)
+
+def record_sms_outcomes(outcomes, company_id, sms_request_id, attempts, final_attempt):
+    """
+    Log sent messages, dead letter permanent failures and add both to the
+    request counters, on the final attempt transient failures are dead lettered too
+    returns: tuple of the sent count and the [number, message] pairs to retry
+    """
+    sent, retryable, failed = sort_sms_outcomes(outcomes)
+    if final_attempt:
+        failed, retryable = failed + retryable, []
+    if company_id:
+        log_sent_messages(
+            [result for _, _, result in sent + failed if isinstance(result, dict)], company_id, sms_request_id
+        )
+    dead_letter_sms(failed, company_id, sms_request_id, attempts)
+    segment_count = sum(get_number_of_sms_for_message(message) for _, message, _ in sent)
+    record_sms_batch_result(
+        sms_request_id, len(sent), len(failed), segment_count, completed_batches=0 if retryable else 1
+    )
+    return (len(sent), [[number, message] for number, message, _ in retryable])
+
+def record_sms_batch_result(sms_request_id, sent_count, failed_count, segment_count=0, completed_batches=1):
+    """
+    Add the outcome of a single batch to the counters of its sms request
+    params:
+        sms_request_id - integer
+        sent_count - integer
+        failed_count - integer
+        segment_count - integer, sms segments the provider accepted
+        completed_batches - integer, 0 for the partial result of a batch that is retried
+    """
+    if not sms_request_id:
+        return
+    SMSRequest.objects.filter(pk=sms_request_id).update(
+        sent_count=F("sent_count") + sent_count,
+        failed_count=F("failed_count") + failed_count,
+        segment_count=F("segment_count") + segment_count,
+        completed_batch_count=F("completed_batch_count") + completed_batches,
+        updated_at=timezone.now()
+    )
+    finalize_sms_request(sms_request_id)
+
+def get_sms_request_final_status(sent_count, failed_count):
+    """Get the status of an sms request whose batches have all completed"""
+    if not failed_count:
+        return "sent"
+    if not sent_count:
+        return "failed"
+    return "partially_failed"
+
+def finalize_sms_request(sms_request_id):
+    """
+    Set the final status of an sms request once all its batches have completed
+    and settle its balance reservation, only one of the concurrently finishing
+    batches wins the status update
+    params:
+        sms_request_id - integer
+    returns: Boolean, whether this call finalized the request
+    """
+    sms_request = SMSRequest.objects.get(pk=sms_request_id)
+    if sms_request.completed_batch_count < sms_request.batch_count:
+        return False
+
+    status = get_sms_request_final_status(sms_request.sent_count, sms_request.failed_count)
+    updated = SMSRequest.objects.filter(pk=sms_request_id, status="sending").update(status=status)
+    if updated and sms_request.reservation_id:
+        settle_reservation(sms_request.reservation_id, sms_request.segment_count)
+    return bool(updated)
+
+@app.task(name="finalize_stale_sms_requests")
+def finalize_stale_sms_requests():
+    """
+    Fail sms requests that are still sending SMS_REQUEST_STALE_AFTER seconds
+    after their last batch result, a batch whose worker died never reports
+    back. Their reservations are settled against the segments sent so far
+    returns: number of requests finalized
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.SMS_REQUEST_STALE_AFTER)
+    stale = SMSRequest.objects.filter(status="sending", updated_at__lt=cutoff)
+    finalized = 0
+    for sms_request in stale.only("sent_count", "segment_count", "reservation_id"):
+        status = "partially_failed" if sms_request.sent_count else "failed"
+        # a batch reporting meanwhile moves updated_at past the cutoff
+        if not stale.filter(pk=sms_request.pk).update(status=status):
+            continue
+        if sms_request.reservation_id:
+            settle_reservation(sms_request.reservation_id, sms_request.segment_count)
+        finalized += 1
+    return finalized
+
+@app.task(name="send_sms_batch", bind=True, max_retries=settings.SMS_BATCH_MAX_RETRIES)
+def send_sms_batch(self, message, number_list, company_id=None, sms_request_id=None):
+    """
+    sends an SMS to one provider sized batch of phone numbers, the batch is
+    retried on its own so a failure does not resend the other batches and a
+    retry only resends the numbers that failed transiently
     params:
         message - string
         number_list - list of strings
-    returns: response from AIT api
+    returns: number of recipients the message was sent to
     """
+    sender_id = get_sms_branding(company_id)
 
-    sender_id = None
+    try:
+        response_data = send_provider_sms(message, number_list, sender_id)
+        recipients = {recipient["number"]: recipient for recipient in response_data["SMSMessageData"]["Recipients"]}
+        outcomes = [(number, message, recipients.get(number, missing_recipient(number))) for number in number_list]
+    except Exception as exc:
+        outcomes = [(number, message, exc) for number in number_list]
 
-    
-    brand_name = get_sms_branding(company_id)
-    sender_id = brand_name
+    final_attempt = self.request.retries >= self.max_retries
+    sent_count, retry = record_sms_outcomes(outcomes, company_id, sms_request_id, self.request.retries + 1, final_attempt)
+    if retry:
+        raise self.retry(
+            args=(message, [number for number, _ in retry], company_id, sms_request_id),
+            countdown=get_retry_countdown(self.request.retries)
+        )
+    return sent_count
 
-    response_data = sms.send(message, number_list, sender_id)
+def create_sms_lanes(message, batches, company_id=None, sms_request_id=None):
+    """
+    Spread batches over at most SMS_MAX_CONCURRENT_BATCHES chains, each chain
+    sends its batches one after the other which bounds the batches in flight
+    params:
+        message - string
+        batches - list of lists of phone numbers
+    returns: list of celery chains
+    """
+    signatures = [send_sms_batch.si(message, batch, company_id, sms_request_id) for batch in batches]
+    return create_lanes(signatures)
 
-    if company_id:
-        company = Company.objects.get(pk=company_id)
-        recipients = response_data["SMSMessageData"]["Recipients"]
-        for recipient in recipients:
-            log_sent_message(recipient, company)        
+def create_lanes(signatures):
+    """Spread task signatures over at most SMS_MAX_CONCURRENT_BATCHES chains"""
+    lane_count = settings.SMS_MAX_CONCURRENT_BATCHES
+    return [chain(*signatures[lane::lane_count]) for lane in range(min(lane_count, len(signatures)))]
+
+@app.task(name="send_sms")
+def send_sms(message, number_list, company_id=None, sms_request_id=None, group_ids=None):
+    """
+    sends an SMS to a list of phone numbers by fanning out provider sized
+    batches across the workers
+    params:
+        message - string
+        number_list - list of strings
+        company_id - integer
+        sms_request_id - integer, request whose counters are updated per batch
+        group_ids - list of integers, groups whose members are resolved here
+    returns: number of batches dispatched
+    """
+    recipients = number_list
+    if group_ids:
+        group_recipients = stream_group_recipients(SMSGroup, group_ids, exclude=number_list)
+        recipients = chain_iterables(number_list, group_recipients)
+    batches = list(chunk_list(recipients, settings.SMS_BATCH_SIZE))
+
+    if sms_request_id:
+        SMSRequest.objects.filter(pk=sms_request_id).update(
+            status="sending", batch_count=len(batches), updated_at=timezone.now()
+        )
+        if not batches:
+            finalize_sms_request(sms_request_id)
+
+    if batches:
+        group(create_sms_lanes(message, batches, company_id, sms_request_id)).apply_async()
+    return len(batches)
     
 
+def get_personalized_message_parts(greeting_text, message):
+    """Get the text before and after the first name of a personalized message"""
+    return (greeting_text + ' ', ', ' + message)
+
 def create_personalized_message(greeting_text, first_name, message):
-    return greeting_text + ' ' + first_name + ', ' + message
+    prefix, suffix = get_personalized_message_parts(greeting_text, message)
+    return prefix + first_name + suffix
 
-@app.task(name="send_mass_unique_sms")
-def send_mass_unique_sms(message, greeting_text, contact_list, company_id):
-    """Loop through contacts and send unique sms"""
+def send_personalized_message(text, number, sender_id):
+    """Send one personalized message, errors are returned instead of raised"""
+    try:
+        recipients = send_provider_sms(text, [number], sender_id)["SMSMessageData"]["Recipients"]
+    except Exception as exc:
+        return exc
+    return recipients[0] if recipients else missing_recipient(number)
+
+@app.task(
+    name="send_personalized_sms_batch", bind=True,
+    max_retries=settings.SMS_BATCH_MAX_RETRIES, rate_limit=settings.PERSONALIZED_SMS_RATE_LIMIT
+)
+def send_personalized_sms_batch(self, messages, company_id, sms_request_id=None):
+    """
+    sends a batch of rendered personalized messages on a pool of at most
+    PERSONALIZED_SMS_THREADS threads, only the messages that failed
+    transiently are retried
+    params:
+        messages - list of [phone number, message] pairs
+    returns: number of recipients the messages were sent to
+    """
     sender_id = get_sms_branding(company_id)
-    company = Company.objects.get(pk=company_id)
+    with ThreadPoolExecutor(max_workers=settings.PERSONALIZED_SMS_THREADS) as executor:
+        results = list(executor.map(lambda item: send_personalized_message(item[1], item[0], sender_id), messages))
+    outcomes = [(number, text, result) for (number, text), result in zip(messages, results)]
+
+    final_attempt = self.request.retries >= self.max_retries
+    sent_count, retry = record_sms_outcomes(outcomes, company_id, sms_request_id, self.request.retries + 1, final_attempt)
+    if retry:
+        raise self.retry(args=(retry, company_id, sms_request_id), countdown=get_retry_countdown(self.request.retries))
+    return sent_count
+
+@app.task(name="send_mass_unique_sms")
+def send_mass_unique_sms(message, greeting_text, contact_list, company_id, sms_request_id=None):
+    """
+    Render a personalized message for every contact and send them in batches
+    of PERSONALIZED_SMS_BATCH_SIZE fanned out across the workers
+    returns: number of batches dispatched
+    """
+    messages = [
+        [contact["phone"], create_personalized_message(greeting_text, contact["first_name"], message)]
+        for contact in contact_list
+    ]
+    batches = list(chunk_list(messages, settings.PERSONALIZED_SMS_BATCH_SIZE))
+
+    if sms_request_id:
+        SMSRequest.objects.filter(pk=sms_request_id).update(
+            status="sending", batch_count=len(batches), updated_at=timezone.now()
+        )
+        if not batches:
+            finalize_sms_request(sms_request_id)
 
-    for contact in contact_list:
-        first_name = contact["first_name"]
-        number = contact["phone"]
-        personalized_message = create_personalized_message(greeting_text, first_name, message)
-        response_data = sms.send(personalized_message, [number], sender_id)
-        recipients = response_data["SMSMessageData"]["Recipients"]
-        log_sent_message(recipients[0], company)  
+    signatures = [send_personalized_sms_batch.si(batch, company_id, sms_request_id) for batch in batches]
+    if signatures:
+        group(create_lanes(signatures)).apply_async()
+    return len(batches)
 
 def get_number_of_sms_for_message(message):
-    """Gets the number of sms needed to send passed message"""
-    return ceil(len(message) / 160)
+    """Gets the number of gsm7 or ucs2 sms segments needed to send passed message"""
+    return count_message_segments(message)
 
 def count_sms(message, recepients):
     """Count same sms for a number of receipients"""
@@ -111,35 +507,27 @@ def count_sms(message, recepients):
     return sms_count
 
 def count_personalized_sms(message, greeting_text, contact_list):
-    total_sms = 0
-    for contact in contact_list:
-        personalized_message = create_personalized_message(greeting_text, contact["first_name"], message)
-        sms_count_for_message = get_number_of_sms_for_message(personalized_message)
-        total_sms += sms_count_for_message
-    return total_sms
-
-def update_sms_count(sms_count, company, add=False):
+    """Count the segments of the personalized messages of all contacts at once"""
+    prefix, suffix = get_personalized_message_parts(greeting_text, message)
+    first_names = [contact["first_name"] for contact in contact_list]
+    return int(count_personalized_segments(prefix, suffix, first_names).sum())
+
+def update_sms_count(sms_count, company, add=False, reason=None, reference=None):
+    """
+    Debit or credit the sms balance of a company through the balance ledger
+    returns: the new balance
+    """
     if add:
-        company.sms_count += sms_count
-    else:
-        if sms_count > company.sms_count:
-            raise ValidationError({"detail": f"You do not have enough SMS balance to send this messages, please top up. Your balance is {company.sms_count}"})
-        company.sms_count -= sms_count
-    company.save()
-    return company.sms_count
+        return credit_balance(company, sms_count, "sms", reason or "topup", reference)
+    return debit_balance(company, sms_count, "sms", reason or "send", reference)
 
-def update_email_count(email_count, company, add=False):
+def update_email_count(email_count, company, add=False, reason=None, reference=None):
     """
     Update email count
     """
     if add:
-        company.email_count += email_count
-    else:
-        if email_count > company.email_count:
-            raise ValidationError({"detail": f"You do not have enough emails balance to send this messages, please top up. Your balance is {company.email_count}"})
-        company.email_count -= email_count
-    company.save()
-    return company.email_count
+        return credit_balance(company, email_count, "email", reason or "topup", reference)
+    return debit_balance(company, email_count, "email", reason or "send", reference)
 
 
 def calculate_recharge_sms(queryset, amount):
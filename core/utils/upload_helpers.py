@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.utils import timezone
+
+from rest_framework.exceptions import ValidationError
+
+from jamboSms.celery import app
+
+from api.sms.models import UploadJob
+from api.sms import serializers
+
+UPLOAD_JOB_ACTIONS = {
+    "members": (serializers.CsvMembersUploadSerializer, "save"),
+    "sms": (serializers.CsvSmsContactUpload, "send_sms"),
+    "personalized_sms": (serializers.CsvSmsContactUpload, "send_personalized_sms"),
+    "email": (serializers.CsvSmsContactUpload, "send_email")
+}
+
+def is_large_upload(file):
+    """Check if an uploaded file should be processed by a background upload job"""
+    return file.size > settings.UPLOAD_JOB_SIZE_THRESHOLD
+
+def create_upload_job(request, kind):
+    """
+    Store the uploaded file and the rest of the request data and queue its processing
+    params:
+        request - the upload request
+        kind - one of UPLOAD_JOB_KINDS
+    returns: UploadJob instance
+    """
+    file = request.data["file"]
+    file.seek(0)
+    data = {key: value for key, value in request.data.items() if key != "file"}
+    # the file is copied to the storage in chunks as the job is saved
+    job = UploadJob.objects.create(
+        company=request.user.company,
+        kind=kind,
+        file_name=file.name,
+        file=file,
+        params={"data": data, "query_params": request.query_params.dict()}
+    )
+    process_upload_job.delay(job.pk)
+    return job
+
+def finish_upload_job(job, **fields):
+    """Record the outcome of an upload job and delete its stored file"""
+    job.file.delete(save=False)
+    UploadJob.objects.filter(pk=job.pk).update(file="", finished_at=timezone.now(), **fields)
+
+@app.task(name="process_upload_job")
+def process_upload_job(job_id):
+    """
+    Run the serializer action of a stored upload, the result is what the upload
+    endpoint would have returned for a small file
+    """
+    job = UploadJob.objects.select_related("company").get(pk=job_id)
+    UploadJob.objects.filter(pk=job_id).update(status="processing", started_at=timezone.now())
+    serializer_class, action = UPLOAD_JOB_ACTIONS[job.kind]
+    try:
+        with job.file.open("rb") as file:
+            serializer = serializer_class(data={**job.params["data"], "file": file}, context={"job": job})
+            serializer.is_valid(raise_exception=True)
+            result = getattr(serializer, action)()
+    except ValidationError as error:
+        finish_upload_job(job, status="failed", error=error.detail)
+        return
+    except Exception:
+        finish_upload_job(job, status="failed", error={"detail": "The file could not be processed"})
+        raise
+    finish_upload_job(job, status="completed", result=result)
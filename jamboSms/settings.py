@@ -64,6 +64,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.RateLimitHeadersMiddleware",
 ]
 
 REST_FRAMEWORK = {
@@ -73,6 +74,7 @@ REST_FRAMEWORK = {
         "core.backends.ConsumerKeyAuthentication"
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated","core.permissions.IsVerified"),
+    "DEFAULT_THROTTLE_CLASSES": ("core.throttling.TenantRateThrottle",),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 10
 }
@@ -201,6 +203,122 @@ MPESA_CALLBACK_URL = os.getenv("HOST") + "/api/v1/payments/"
 MPESA_LNM_URL = os.getenv("MPESA_LNM_URL")
 COMPANY_BRAND_NAME = os.getenv("COMPANY_BRAND_NAME")
 
+# Bulk sends are split into batches of SMS_BATCH_SIZE numbers, at most
+# SMS_MAX_CONCURRENT_BATCHES of which are in flight at the same time
+SMS_BATCH_SIZE = int(os.getenv("SMS_BATCH_SIZE", 1000))
+SMS_MAX_CONCURRENT_BATCHES = int(os.getenv("SMS_MAX_CONCURRENT_BATCHES", 10))
+SMS_BATCH_MAX_RETRIES = int(os.getenv("SMS_BATCH_MAX_RETRIES", 3))
+# Retries wait a random time of up to SMS_RETRY_BACKOFF_BASE * 2 ** retries seconds
+SMS_RETRY_BACKOFF_BASE = int(os.getenv("SMS_RETRY_BACKOFF_BASE", 2))
+SMS_RETRY_BACKOFF_MAX = int(os.getenv("SMS_RETRY_BACKOFF_MAX", 300))
+# Requests without a batch result for this many seconds are failed and their balance
+# reservation settled, it must be longer than a batch takes with all its retries
+SMS_REQUEST_STALE_AFTER = int(os.getenv("SMS_REQUEST_STALE_AFTER", 60 * 60))
+
+# Personalized messages are sent one provider call each, PERSONALIZED_SMS_THREADS at a
+# time within a batch, batch tasks are started at most PERSONALIZED_SMS_RATE_LIMIT per worker
+PERSONALIZED_SMS_BATCH_SIZE = int(os.getenv("PERSONALIZED_SMS_BATCH_SIZE", 200))
+PERSONALIZED_SMS_THREADS = int(os.getenv("PERSONALIZED_SMS_THREADS", 8))
+PERSONALIZED_SMS_RATE_LIMIT = os.getenv("PERSONALIZED_SMS_RATE_LIMIT", "30/m")
+
+# Every provider call takes one token per message from a global and a per sender id
+# token bucket, shared through redis when RATE_LIMIT_REDIS_URL is set. Rates are
+# messages per second, bursts the bucket capacities
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+PROVIDER_RATE_LIMIT = float(os.getenv("PROVIDER_RATE_LIMIT", 100))
+PROVIDER_RATE_LIMIT_BURST = int(os.getenv("PROVIDER_RATE_LIMIT_BURST", 1000))
+SENDER_ID_RATE_LIMIT = float(os.getenv("SENDER_ID_RATE_LIMIT", 50))
+SENDER_ID_RATE_LIMIT_BURST = int(os.getenv("SENDER_ID_RATE_LIMIT_BURST", 1000))
+PROVIDER_RATE_LIMIT_MAX_WAIT = int(os.getenv("PROVIDER_RATE_LIMIT_MAX_WAIT", 30))
+
+# Api requests are throttled per company and per consumer key with token buckets in the
+# same redis, rates are requests per second and bursts the bucket capacities
+COMPANY_RATE_LIMIT = float(os.getenv("COMPANY_RATE_LIMIT", 20))
+COMPANY_RATE_LIMIT_BURST = int(os.getenv("COMPANY_RATE_LIMIT_BURST", 200))
+CONSUMER_KEY_RATE_LIMIT = float(os.getenv("CONSUMER_KEY_RATE_LIMIT", 10))
+CONSUMER_KEY_RATE_LIMIT_BURST = int(os.getenv("CONSUMER_KEY_RATE_LIMIT_BURST", 100))
+
+# Group members are streamed from a server side cursor in chunks of this size
+RECIPIENT_STREAM_CHUNK_SIZE = int(os.getenv("RECIPIENT_STREAM_CHUNK_SIZE", 2000))
+
+# SentSMS rows are written in chunks with either bulk_create or postgres COPY
+SENT_SMS_LOG_BATCH_SIZE = int(os.getenv("SENT_SMS_LOG_BATCH_SIZE", 1000))
+SENT_SMS_LOG_METHOD = os.getenv("SENT_SMS_LOG_METHOD", "bulk_create")
+
+# Uploaded members and their group memberships are inserted in chunks of this size
+MEMBER_IMPORT_BATCH_SIZE = int(os.getenv("MEMBER_IMPORT_BATCH_SIZE", 2000))
+
+# Uploads larger than this many bytes are processed by a background upload job,
+# which reports its progress after every UPLOAD_CHUNK_SIZE rows
+UPLOAD_JOB_SIZE_THRESHOLD = int(os.getenv("UPLOAD_JOB_SIZE_THRESHOLD", 512 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 5000))
+# Upload job files are kept in the default storage until the job finishes, it must be
+# shared storage such as S3 wherever the celery workers run on other hosts
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
+
+# Sender ids are cached per company in this cache and invalidated when the branding changes
+SENDER_ID_CACHE_ALIAS = os.getenv("SENDER_ID_CACHE_ALIAS", "default")
+SENDER_ID_CACHE_TIMEOUT = int(os.getenv("SENDER_ID_CACHE_TIMEOUT", 24 * 60 * 60))
+
+# Delivery report callbacks are buffered in redis when DELIVERY_REPORT_REDIS_URL is set
+# and written in batches of DELIVERY_REPORT_BATCH_SIZE, otherwise each one is written as
+# it comes. A flush is queued every DELIVERY_REPORT_FLUSH_THRESHOLD buffered reports,
+# 0 leaves it to the periodic flush that runs every DELIVERY_REPORT_FLUSH_INTERVAL seconds
+DELIVERY_REPORT_REDIS_URL = os.getenv("DELIVERY_REPORT_REDIS_URL", RATE_LIMIT_REDIS_URL)
+DELIVERY_REPORT_BATCH_SIZE = int(os.getenv("DELIVERY_REPORT_BATCH_SIZE", 1000))
+DELIVERY_REPORT_FLUSH_THRESHOLD = int(os.getenv("DELIVERY_REPORT_FLUSH_THRESHOLD", 500))
+DELIVERY_REPORT_FLUSH_INTERVAL = int(os.getenv("DELIVERY_REPORT_FLUSH_INTERVAL", 10))
+# Reports of messages without a SentSMS row yet are parked and retried by the periodic
+# flush, they are dropped after DELIVERY_REPORT_UNMATCHED_RETENTION seconds
+DELIVERY_REPORT_UNMATCHED_RETENTION = int(os.getenv("DELIVERY_REPORT_UNMATCHED_RETENTION", 24 * 60 * 60))
+# Shared secret the provider callback url must carry, eg .../delivery_report/?token=<token>,
+# delivery reports are rejected while it is not set
+DELIVERY_REPORT_CALLBACK_TOKEN = os.getenv("DELIVERY_REPORT_CALLBACK_TOKEN")
+
+# Tests buffer writes in process instead of redis, celery workers can not flush such
+# a buffer so it must stay off wherever the web and worker processes are separate
+LOCAL_WRITE_BUFFERS = False
+
+# Consumer keys are cached by their sha256 digest, point the alias at a shared memory
+# cache such as redis so that key authentication needs no database query
+CONSUMER_KEY_CACHE_ALIAS = os.getenv("CONSUMER_KEY_CACHE_ALIAS", "default")
+CONSUMER_KEY_CACHE_TIMEOUT = int(os.getenv("CONSUMER_KEY_CACHE_TIMEOUT", 5 * 60))
+
+# Api key activity is buffered like delivery reports and inserted in bulk
+API_KEY_ACTIVITY_REDIS_URL = os.getenv("API_KEY_ACTIVITY_REDIS_URL", RATE_LIMIT_REDIS_URL)
+API_KEY_ACTIVITY_BATCH_SIZE = int(os.getenv("API_KEY_ACTIVITY_BATCH_SIZE", 1000))
+API_KEY_ACTIVITY_FLUSH_THRESHOLD = int(os.getenv("API_KEY_ACTIVITY_FLUSH_THRESHOLD", 500))
+API_KEY_ACTIVITY_FLUSH_INTERVAL = int(os.getenv("API_KEY_ACTIVITY_FLUSH_INTERVAL", 10))
+# Activity is rolled up per minute, hour and day as it is flushed, a daily task deletes raw
+# rows and finer rollups past their retention in batches of API_KEY_ACTIVITY_PRUNE_BATCH_SIZE
+API_KEY_ACTIVITY_RETENTION_DAYS = int(os.getenv("API_KEY_ACTIVITY_RETENTION_DAYS", 30))
+API_KEY_ACTIVITY_MINUTE_ROLLUP_RETENTION_DAYS = int(os.getenv("API_KEY_ACTIVITY_MINUTE_ROLLUP_RETENTION_DAYS", 7))
+API_KEY_ACTIVITY_HOUR_ROLLUP_RETENTION_DAYS = int(os.getenv("API_KEY_ACTIVITY_HOUR_ROLLUP_RETENTION_DAYS", 180))
+API_KEY_ACTIVITY_PRUNE_BATCH_SIZE = int(os.getenv("API_KEY_ACTIVITY_PRUNE_BATCH_SIZE", 10000))
+
+# List views paginated with core.pagination.ApproximateCountPagination count rows exactly
+# up to this many and use the query planner estimate past it
+PAGINATION_EXACT_COUNT_LIMIT = int(os.getenv("PAGINATION_EXACT_COUNT_LIMIT", 10000))
+
+CELERYBEAT_SCHEDULE = {
+    "flush-delivery-reports": {
+        "task": "flush_delivery_reports",
+        "schedule": DELIVERY_REPORT_FLUSH_INTERVAL
+    },
+    "flush-api-key-activity": {
+        "task": "flush_api_key_activity",
+        "schedule": API_KEY_ACTIVITY_FLUSH_INTERVAL
+    },
+    "prune-api-key-activity": {
+        "task": "prune_api_key_activity",
+        "schedule": 24 * 60 * 60
+    },
+    "finalize-stale-sms-requests": {
+        "task": "finalize_stale_sms_requests",
+        "schedule": 5 * 60
+    }
+}
+
 
 CACHES = {
    'default': {
@@ -1,10 +1,14 @@
+import os
+from tempfile import TemporaryDirectory
 from unittest.mock import patch
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import force_authenticate
 from rest_framework.test import APIClient
 
 from .base_tests import UploadBasetest
-from api.sms import views
+from api.sms import views, models
+from core.utils.upload_helpers import process_upload_job
 from . import dummy_data
 
 class TestCsvExcel(UploadBasetest):
@@ -81,3 +85,90 @@ class TestCsvExcel(UploadBasetest):
         self.assertEqual(response.data["greeting_text"], 'There must be a greeting message for personalized messages')
         self.assertEqual(response.status_code, 400)
 
+
+
+class TestUploadJobs(UploadBasetest):
+    """Test background processing of large uploads"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_upload_job(self):
+        """Post a members upload that is turned into a job, returns the stored job"""
+        file, headers = self.create_upload_file('csv.csv')
+        request = self.request_factory.post(self.create_list_sms_url, {"file": file, "group": self.group_id}, **headers)
+        force_authenticate(request, self.user)
+        response = views.MassMemberUploadView.as_view()(request)
+        return models.UploadJob.objects.get(pk=response.data["id"])
+
+    @override_settings(UPLOAD_JOB_SIZE_THRESHOLD=0, UPLOAD_CHUNK_SIZE=2)
+    @patch("core.utils.upload_helpers.process_upload_job.delay")
+    def test_large_member_upload_is_processed_as_job(self, mock_delay):
+        """Test that a large upload is stored, accepted and imported by the job"""
+        file, headers = self.create_upload_file('csv.csv')
+        data = {
+            "file": file,
+            "group": self.group_id
+        }
+
+        request = self.request_factory.post(self.create_list_sms_url, data, **headers)
+        force_authenticate(request, self.user)
+        response = views.MassMemberUploadView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], "queued")
+        mock_delay.assert_called_once_with(response.data["id"])
+
+        process_upload_job(response.data["id"])
+        job = models.UploadJob.objects.get(pk=response.data["id"])
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.processed_rows, job.total_rows)
+        self.assertTrue(job.skipped_rows)
+        self.assertEqual(job.result["members"][0]["phone"], '+254726406913')
+        self.assertFalse(job.file)
+
+    @override_settings(UPLOAD_JOB_SIZE_THRESHOLD=0)
+    @patch("core.utils.upload_helpers.process_upload_job.delay")
+    def test_failed_upload_job_records_errors(self, _):
+        """Test that validation errors of a job are kept for polling"""
+        file, headers = self.create_upload_file('csv.csv')
+        data = {
+            "file": file,
+            "message": "come mbio",
+        }
+
+        request = self.request_factory.post(self.create_list_sms_url + '?sms=personalized', data, **headers)
+        force_authenticate(request, self.user)
+        response = views.CsvSmsView.as_view()(request)
+        process_upload_job(response.data["id"])
+
+        request = self.request_factory.get(f"/api/v1/sms/upload/jobs/{response.data['id']}/")
+        force_authenticate(request, self.user)
+        response = views.SingleUploadJobView.as_view()(request, pk=response.data["id"])
+        self.assertEqual(response.data["status"], "failed")
+        self.assertEqual(response.data["error"]["greeting_text"], 'There must be a greeting message for personalized messages')
+
+    @override_settings(UPLOAD_JOB_SIZE_THRESHOLD=0)
+    @patch("core.utils.upload_helpers.process_upload_job.delay")
+    def test_upload_job_is_read_from_storage(self, _):
+        """Test that the upload is kept in the file storage instead of the job row"""
+        job = self.create_upload_job()
+        self.assertTrue(os.path.exists(job.file.path))
+        process_upload_job(job.pk)
+        self.assertFalse(os.path.exists(job.file.path))
+
+    @override_settings(UPLOAD_JOB_SIZE_THRESHOLD=0)
+    @patch("core.utils.upload_helpers.process_upload_job.delay")
+    def test_crashed_upload_job_deletes_its_file(self, _):
+        """Test that an unexpected error fails the job and still deletes the stored file"""
+        job = self.create_upload_job()
+        with patch("api.sms.serializers.CsvMembersUploadSerializer.save", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                process_upload_job(job.pk)
+        self.assertFalse(os.path.exists(job.file.path))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.file.name), ("failed", ""))
@@ -0,0 +1,178 @@
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.sms import views, models
+from core.utils import buffer_helpers, delivery_helpers
+from tests.factories.auth_factories import CompanyFactory, UserFactory
+
+
+def delivery_report(message_id, report_status="Success", **kwargs):
+    return {
+        "id": message_id,
+        "status": report_status,
+        "phoneNumber": "+254700000000",
+        "networkCode": "63902",
+        **kwargs
+    }
+
+
+@override_settings(
+    DELIVERY_REPORT_REDIS_URL=None, DELIVERY_REPORT_FLUSH_THRESHOLD=0, LOCAL_WRITE_BUFFERS=True,
+    DELIVERY_REPORT_CALLBACK_TOKEN="callback-secret"
+)
+class TestDeliveryReports(TestCase):
+    """Test buffered ingestion of provider delivery reports"""
+
+    def setUp(self):
+        buffer_helpers._local_buffers.clear()
+        self.request_factory = APIRequestFactory()
+        self.url = "/api/v1/sms/delivery_report/"
+        company = CompanyFactory.create()
+        self.sms_request = models.SMSRequest.objects.create(company=company, message="Hello", sent_count=3)
+        models.SentSMS.objects.bulk_create([
+            models.SentSMS(
+                company=company, sms_request=self.sms_request, message_id=f"ATXid_{index}",
+                status="Success", status_code=101
+            ) for index in range(3)
+        ])
+
+    def post_report(self, report, token="callback-secret"):
+        request = self.request_factory.post(f"{self.url}?token={token}", report)
+        return views.SMSDeliveryCallbackView.as_view()(request)
+
+    def test_callback_buffers_report_without_writing(self):
+        """Test that a callback with the token is accepted and only buffered"""
+        with self.assertNumQueries(0):
+            response = self.post_report(delivery_report("ATXid_0", failureReason="", retryCount=0))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        report = delivery_helpers.get_report_buffer().pop(10)[0]
+        self.assertEqual(report["sent_sms_id"], "ATXid_0")
+        self.assertEqual(report["network"], "Safaricom")
+        self.assertFalse(models.DeliveredSMS.objects.exists())
+
+    @override_settings(LOCAL_WRITE_BUFFERS=False)
+    def test_callback_writes_report_without_shared_buffer(self):
+        """Test that without redis a report is written right away instead of held in the web process"""
+        response = self.post_report(delivery_report("ATXid_0", "Failed"))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIsNone(delivery_helpers.get_report_buffer())
+        self.assertEqual(models.SentSMS.objects.get(pk="ATXid_0").status, "Failed")
+        self.assertEqual(delivery_helpers.flush_delivery_reports(), 0)
+
+    def test_callback_rejects_report_without_the_token(self):
+        """Test that reports without the shared callback token are rejected and not buffered"""
+        response = self.post_report(delivery_report("ATXid_0", "Failed"), token="guess")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        request = self.request_factory.post(self.url, delivery_report("ATXid_0", "Failed"))
+        response = views.SMSDeliveryCallbackView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(delivery_helpers.get_report_buffer().pop(10), [])
+
+    @override_settings(DELIVERY_REPORT_CALLBACK_TOKEN=None)
+    def test_callback_is_rejected_while_no_token_is_configured(self):
+        """Test that the callback fails closed when the token setting is missing"""
+        response = self.post_report(delivery_report("ATXid_0"), token="")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_callback_rejects_incomplete_report(self):
+        """Test that a report without a message id is rejected"""
+        report = delivery_report("ATXid_0")
+        del report["id"]
+        response = self.post_report(report)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(delivery_helpers.get_report_buffer().pop(10), [])
+
+    @override_settings(DELIVERY_REPORT_BATCH_SIZE=2)
+    def test_flush_upserts_reports_in_batches(self):
+        """Test that buffered reports are written in bulk and the latest report of a message wins"""
+        for report in [
+            delivery_report("ATXid_0", "Buffered"), delivery_report("ATXid_1"),
+            delivery_report("ATXid_0", "Failed", failureReason="AbsentSubscriber"),
+            delivery_report("ATXid_missing")
+        ]:
+            self.post_report(report)
+
+        # a lock, the upserts and an update inside a savepoint per batch of two,
+        # then the expired and matched parked reports
+        with self.assertNumQueries(17):
+            written = delivery_helpers.flush_delivery_reports()
+        self.assertEqual(written, 3)
+        self.assertTrue(models.UnmatchedDeliveryReport.objects.filter(pk="ATXid_missing").exists())
+        self.assertEqual(models.DeliveredSMS.objects.count(), 2)
+        delivered = models.DeliveredSMS.objects.get(sent_sms_id="ATXid_0")
+        self.assertEqual((delivered.status, delivered.failure_reason), ("Failed", "AbsentSubscriber"))
+        self.assertEqual(models.SentSMS.objects.get(pk="ATXid_0").status, "Failed")
+        self.assertEqual(models.SentSMS.objects.get(pk="ATXid_2").status, "Success")
+
+    @override_settings(DELIVERY_REPORT_FLUSH_THRESHOLD=2)
+    def test_flush_is_triggered_by_buffer_size(self):
+        """Test that reaching the flush threshold writes the buffered reports"""
+        self.post_report(delivery_report("ATXid_0"))
+        self.assertFalse(models.DeliveredSMS.objects.exists())
+        self.post_report(delivery_report("ATXid_1", "Rejected"))
+        self.assertEqual(models.DeliveredSMS.objects.count(), 2)
+        self.assertEqual(models.SentSMS.objects.get(pk="ATXid_1").status, "Rejected")
+
+    def test_flush_maintains_request_stats_per_network(self):
+        """Test that delivery counters follow a message from pending to its final outcome"""
+        for report in [
+            delivery_report("ATXid_0", "Buffered"),
+            delivery_report("ATXid_1", networkCode="63903"),
+            delivery_report("ATXid_2", "Failed")
+        ]:
+            self.post_report(report)
+        delivery_helpers.flush_delivery_reports()
+        self.post_report(delivery_report("ATXid_0"))
+        self.post_report(delivery_report("ATXid_2", "Failed"))
+        delivery_helpers.flush_delivery_reports()
+
+        stats = {
+            stats.network: (stats.delivered, stats.failed)
+            for stats in models.SMSRequestStats.objects.filter(sms_request=self.sms_request)
+        }
+        self.assertEqual(stats, {"Safaricom": (1, 1), "Airtel Kenya": (1, 0)})
+
+        user = UserFactory.create(company=self.sms_request.company)
+        request = self.request_factory.get(f"/api/v1/sms/{self.sms_request.pk}/stats/")
+        force_authenticate(request, user)
+        # the request, its company for the ownership check and its counters
+        with self.assertNumQueries(3):
+            response = views.SMSRequestStatsView.as_view()(request, pk=self.sms_request.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {key: response.data[key] for key in ("sent", "delivered", "failed", "pending")},
+            {"sent": 3, "delivered": 2, "failed": 1, "pending": 0}
+        )
+        self.assertEqual(response.data["networks"]["Airtel Kenya"], {"delivered": 1, "failed": 0})
+
+    @override_settings(LOCAL_WRITE_BUFFERS=False, DELIVERY_REPORT_REDIS_URL="redis://127.0.0.1:1/0")
+    def test_callback_writes_report_while_redis_is_down(self):
+        """Test that an unreachable buffer redis writes the report right away instead of failing"""
+        response = self.post_report(delivery_report("ATXid_0", "Failed"))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(models.SentSMS.objects.get(pk="ATXid_0").status, "Failed")
+
+    def test_report_arriving_before_its_message_is_retried(self):
+        """Test that a report of a message not saved yet is parked and written once the message exists"""
+        self.post_report(delivery_report("ATXid_late", "Failed"))
+        self.assertEqual(delivery_helpers.flush_delivery_reports(), 0)
+        self.assertTrue(models.UnmatchedDeliveryReport.objects.filter(pk="ATXid_late").exists())
+
+        models.SentSMS.objects.create(
+            company=self.sms_request.company, sms_request=self.sms_request, message_id="ATXid_late",
+            status="Success", status_code=101
+        )
+        self.assertEqual(delivery_helpers.flush_delivery_reports(), 1)
+        self.assertEqual(models.SentSMS.objects.get(pk="ATXid_late").status, "Failed")
+        self.assertEqual(models.DeliveredSMS.objects.get(sent_sms_id="ATXid_late").status, "Failed")
+        self.assertFalse(models.UnmatchedDeliveryReport.objects.exists())
+
+    @override_settings(DELIVERY_REPORT_UNMATCHED_RETENTION=0)
+    def test_unmatched_report_is_dropped_after_its_retention(self):
+        """Test that a report whose message never shows up is not retried forever"""
+        self.post_report(delivery_report("ATXid_never"))
+        delivery_helpers.flush_report_buffer()
+        self.assertTrue(models.UnmatchedDeliveryReport.objects.exists())
+        delivery_helpers.flush_delivery_reports()
+        self.assertFalse(models.UnmatchedDeliveryReport.objects.exists())
@@ -5,6 +5,7 @@ from rest_framework.test import force_authenticate
 
 from .base_tests import BaseTest
 from api.sms import views, models
+from tests.factories.auth_factories import UserFactory
 from . import dummy_data
 
 
@@ -28,6 +29,38 @@ class TestGroup(BaseTest):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
 
+    def test_groups_are_paginated_in_a_stable_order(self):
+        """Test that group pages follow the group ids so no group is skipped or repeated"""
+        groups = [self.group_id] + [
+            models.SMSGroup.objects.create(name=f"group {index}", company=self.user.company).pk
+            for index in range(2)
+        ]
+        listed = []
+        for offset in range(3):
+            request = self.request_factory.get(self.create_list_sms_url, {"limit": 1, "offset": offset})
+            force_authenticate(request, self.user)
+            response = views.GroupView.as_view()(request)
+            self.assertEqual(response.data["count"], 3)
+            listed += [group["id"] for group in response.data["results"]]
+        self.assertEqual(listed, groups)
+
+    def test_delete_groups_in_bulk(self):
+        """Test that only groups of the user company are deleted"""
+        other_user = UserFactory.create(phone="+254700000123")
+        other_group = models.SMSGroup.objects.create(name="other", company=other_user.company)
+        request = self.request_factory.delete(self.create_list_sms_url, {"groups": [self.group_id, other_group.pk]})
+        force_authenticate(request, self.user)
+        response = views.GroupView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["groups"][1], [f'Invalid pk "{other_group.pk}" - object does not exist.'])
+
+        request = self.request_factory.delete(self.create_list_sms_url, {"groups": [self.group_id]})
+        force_authenticate(request, self.user)
+        response = views.GroupView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(models.SMSGroup.objects.filter(pk=self.group_id).exists())
+
+
 class TestMembers(BaseTest):
     def test_create_member_creation_succeeds(self):
         """Test that group members creation with correct data will be successful"""
@@ -48,6 +81,22 @@ class TestMembers(BaseTest):
         response = views.SingleGroupMembersView.as_view()(request, pk=pk)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_delete_group_members_in_bulk(self):
+        """Test that members are deleted with one query to validate them"""
+        members = [
+            models.GroupMember.objects.create(phone=f"+25470000000{index}", company=self.user.company)
+            for index in range(3)
+        ]
+        self.group_instance.members.add(*members)
+        request = self.request_factory.delete(
+            self.create_list_sms_url, {"members": [member.pk for member in members]}
+        )
+        force_authenticate(request, self.user)
+        response = views.GroupMembersView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(models.GroupMember.objects.filter(company=self.user.company).exists())
+        self.assertFalse(self.group_instance.members.exists())
+
     def test_add_group_members_succeeds(self):
         """Test that add group members successful"""
         instance = models.GroupMember(phone=self.user.phone, company=self.user.company)
@@ -57,7 +106,8 @@ class TestMembers(BaseTest):
         request = self.request_factory.patch(self.create_list_sms_url, data)
         force_authenticate(request, self.user)
         response = views.SingleGroupView.as_view()(request, pk=self.group_id)
-        self.assertEqual(member_pk, response.data["members"][0])
+        self.assertEqual(response.data["member_count"], 1)
+        self.assertNotIn("members", response.data)
 
     def test_remove_group_members_succeeds(self):
         """Test that remove group members successful"""
@@ -71,4 +121,88 @@ class TestMembers(BaseTest):
         request = self.request_factory.put(self.create_list_sms_url, data)
         force_authenticate(request, self.user)
         response = views.SingleGroupView.as_view()(request, pk=self.group_id)
-        self.assertEqual([], response.data["members"])
+        self.assertEqual(response.data["member_count"], 0)
+
+    def test_member_count_leaves_out_deleted_members(self):
+        """Test that soft deleted members are not counted as group members"""
+        group = models.SMSGroup.objects.get(pk=self.group_id)
+        members = [
+            models.GroupMember.objects.create(phone=f"+25470000000{index}", company=self.user.company)
+            for index in range(3)
+        ]
+        group.members.add(*members)
+        members[0].soft_delete(commit=True)
+
+        request = self.request_factory.get(self.create_list_sms_url)
+        force_authenticate(request, self.user)
+        response = views.GroupView.as_view()(request)
+        self.assertEqual(response.data["results"][0]["member_count"], 2)
+
+    def test_group_members_are_listed_by_cursor(self):
+        """Test that group members are listed a page at a time following the next cursor"""
+        group = models.SMSGroup.objects.get(pk=self.group_id)
+        members = [
+            models.GroupMember.objects.create(phone=f"+25470000000{index}", company=self.user.company)
+            for index in range(3)
+        ]
+        group.members.add(*members)
+
+        request = self.request_factory.get(self.create_list_sms_url)
+        force_authenticate(request, self.user)
+        response = views.GroupView.as_view()(request)
+        self.assertEqual(response.data["results"][0]["member_count"], 3)
+
+        url = f"/api/v1/sms/groups/{self.group_id}/members/?page_size=2"
+        listed = []
+        while url:
+            request = self.request_factory.get(url)
+            force_authenticate(request, self.user)
+            response = views.GroupMemberListView.as_view()(request, pk=self.group_id)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            listed += [member["id"] for member in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(listed, [member.pk for member in members])
+
+    def test_members_are_added_and_removed_in_bulk(self):
+        """Test that listed members are validated in one query and counts are returned"""
+        members = [
+            models.GroupMember.objects.create(phone=f"+25470000000{index}", company=self.user.company)
+            for index in range(3)
+        ]
+        self.group_instance.members.add(members[0])
+        url = f"/api/v1/sms/groups/{self.group_id}/members/"
+        request = self.request_factory.post(url, {"members": [member.pk for member in members]}, format="json")
+        force_authenticate(request, self.user)
+        # the group, the member check, the member ids, the insert and the member count
+        with self.assertNumQueries(5):
+            response = views.GroupMemberListView.as_view()(request, pk=self.group_id)
+        self.assertEqual(response.data, {"added": 2, "member_count": 3})
+
+        request = self.request_factory.delete(url, {"members": [members[0].pk]}, format="json")
+        force_authenticate(request, self.user)
+        response = views.GroupMemberListView.as_view()(request, pk=self.group_id)
+        self.assertEqual(response.data, {"removed": 1, "member_count": 2})
+
+    def test_members_are_added_by_filter(self):
+        """Test that members selected with a filter are added and members of other companies rejected"""
+        other_group = models.SMSGroup.objects.create(name="other", company=self.user.company)
+        members = [
+            models.GroupMember.objects.create(phone=f"+25470000000{index}", company=self.user.company)
+            for index in range(3)
+        ]
+        other_group.members.add(*members[:2])
+        url = f"/api/v1/sms/groups/{self.group_id}/members/"
+        request = self.request_factory.post(url, {"filter": {"group": other_group.pk}}, format="json")
+        force_authenticate(request, self.user)
+        response = views.GroupMemberListView.as_view()(request, pk=self.group_id)
+        self.assertEqual(response.data, {"added": 2, "member_count": 2})
+
+        other_user = UserFactory.create(phone="+254700000123")
+        foreign_member = models.GroupMember.objects.create(phone="+254700000009", company=other_user.company)
+        request = self.request_factory.post(url, {"members": [members[2].pk, foreign_member.pk]}, format="json")
+        force_authenticate(request, self.user)
+        response = views.GroupMemberListView.as_view()(request, pk=self.group_id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["members"][1], [f'Invalid pk "{foreign_member.pk}" - object does not exist.']
+        )
@@ -3,6 +3,7 @@ from rest_framework import status
 from rest_framework.test import force_authenticate
 
 from .base_tests import BaseTest
+from api.payment.models import BalanceReservation
 from api.sms import views, models
 from . import dummy_data
 
@@ -15,8 +16,36 @@ class SMSRequestViewsTest(BaseTest):
         request = self.request_factory.post(self.create_list_sms_url, dummy_data.valid_sms_data)
         force_authenticate(request, self.user)
         response = views.SMSRequestView.as_view()(request)
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], "queued")
+
+    @patch("django.db.transaction.on_commit", side_effect=lambda callback: callback())
+    @patch("api.sms.serializers.send_sms")
+    def test_sms_request_creation_enqueues_send(self, mock_send_sms, _):
+        """Test that sms creation hands the send to a worker instead of sending inline"""
+        request = self.request_factory.post(self.create_list_sms_url, dummy_data.valid_sms_data)
+        force_authenticate(request, self.user)
+        response = views.SMSRequestView.as_view()(request)
+        mock_send_sms.assert_not_called()
+        mock_send_sms.delay.assert_called_once_with(
+            dummy_data.valid_sms_data["message"], dummy_data.valid_sms_data["recepients"],
+            self.user.company.pk, response.data["id"], []
+        )
     
+    @patch("api.sms.serializers.SMSRequestSerializer.save_request", side_effect=RuntimeError)
+    @patch("api.sms.serializers.send_sms")
+    def test_failed_sms_request_creation_releases_reservation(self, mock_send_sms, _):
+        """Test that the balance reserved for a request that is not saved is not held"""
+        balance = self.user.company.sms_count
+        request = self.request_factory.post(self.create_list_sms_url, dummy_data.valid_sms_data)
+        force_authenticate(request, self.user)
+        with self.assertRaises(RuntimeError):
+            views.SMSRequestView.as_view()(request)
+        self.user.company.refresh_from_db()
+        self.assertEqual(self.user.company.sms_count, balance)
+        self.assertFalse(BalanceReservation.objects.exists())
+        mock_send_sms.delay.assert_not_called()
+
     def test_create_sms_request_fails_with_no_group_or_recepients_fails(self):
         """Test that sms creation without group or receipient will fail"""
         request = self.request_factory.post(self.create_list_sms_url, dummy_data.data_without_recepient_or_group)
@@ -36,7 +65,25 @@ class SMSRequestViewsTest(BaseTest):
         self.group_instance.members.add(instance)
         self.group_instance.save()
         response = views.SMSRequestView.as_view()(request)
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    @patch("django.db.transaction.on_commit", side_effect=lambda callback: callback())
+    @patch("api.sms.serializers.send_sms")
+    def test_create_sms_request_counts_distinct_group_recepients(self, mock_send_sms, _):
+        """Test that group members are billed once and resolved by the worker"""
+        second_group = models.SMSGroup.objects.create(name="second", company=self.user.company)
+        for phone in ["+254754333000", "+254754333001", "+254754333002"]:
+            instance = models.GroupMember.objects.create(phone=phone, company=self.user.company)
+            self.group_instance.members.add(instance)
+            second_group.members.add(instance)
+        data = dummy_data.data_with_both_recepient_or_group.copy()
+        data["groups"] = [self.group_id, second_group.pk]
+        request = self.request_factory.post(self.create_list_sms_url, data)
+        force_authenticate(request, self.user)
+        response = views.SMSRequestView.as_view()(request)
+        self.assertEqual(response.data["sms_count"], 3)
+        self.assertEqual(response.data["recepients"], data["recepients"])
+        self.assertEqual(mock_send_sms.delay.call_args[0][4], [self.group_id, second_group.pk])
 
     @patch("api.sms.serializers.send_sms")
     def test_get_sms_requests_succeeds(self, _):
@@ -49,6 +96,7 @@ class SMSRequestViewsTest(BaseTest):
         response = views.SMSRequestView.as_view()(get_request)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual((response.data)['results'][0]["message"], dummy_data.valid_sms_data["message"])
+        self.assertEqual((response.data)['results'][0]["status"], "queued")
 
     @patch("api.sms.serializers.send_sms")
     def test_delete_sms_requests_valid_data_succeeds(self, _):
@@ -61,6 +109,21 @@ class SMSRequestViewsTest(BaseTest):
         response = views.SMSRequestView.as_view()(delete_request)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_delete_sms_requests_in_bulk(self):
+        """Test that sms requests are validated and soft deleted with one query each"""
+        instances = models.SMSRequest.objects.bulk_create(
+            models.SMSRequest(company=self.user.company, recepients=["+254726406733"], message="Come")
+            for _ in range(3)
+        )
+        ids = [instance.pk for instance in instances]
+        delete_request = self.request_factory.delete(self.create_list_sms_url, {"message_requests": ids})
+        force_authenticate(delete_request, self.user)
+        with self.assertNumQueries(2):
+            response = views.SMSRequestView.as_view()(delete_request)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(models.SMSRequest.objects.filter(pk__in=ids, is_deleted=True).count(), 3)
+        self.assertEqual(models.SMSRequest.objects.filter(pk__in=ids).undo_soft_delete(), 3)
+
     def test_delete_sms_requests_non_existent_id_fails(self):
         """Test that delete sms requests  with non-existent id fails"""
         delete_request = self.request_factory.delete(self.create_list_sms_url, {
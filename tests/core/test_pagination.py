@@ -0,0 +1,39 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.sms import views, models
+from core.pagination import ApproximateCountPagination
+from tests.factories.auth_factories import UserFactory
+
+
+class TestPagination(TestCase):
+    """Test keyset pagination and approximate counts of list views"""
+
+    def setUp(self):
+        self.request_factory = APIRequestFactory()
+        self.user = UserFactory.create(is_verified=True)
+        self.members = [
+            models.GroupMember.objects.create(phone=f"+25470000000{index}", company=self.user.company)
+            for index in range(5)
+        ]
+
+    def test_members_are_listed_newest_first_by_cursor(self):
+        """Test that following the next cursor lists every member once, newest first"""
+        url = "/api/v1/sms/groups/members/?page_size=2"
+        listed = []
+        while url:
+            request = self.request_factory.get(url)
+            force_authenticate(request, self.user)
+            response = views.GroupMembersView.as_view()(request)
+            self.assertNotIn("count", response.data)
+            listed += [member["id"] for member in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(listed, [member.pk for member in reversed(self.members)])
+
+    def test_count_is_exact_up_to_the_limit(self):
+        """Test that small lists are counted and larger ones estimated without a full count"""
+        queryset = models.GroupMember.objects.filter(company=self.user.company)
+        with override_settings(PAGINATION_EXACT_COUNT_LIMIT=5):
+            self.assertEqual(ApproximateCountPagination().get_count(queryset), 5)
+        with override_settings(PAGINATION_EXACT_COUNT_LIMIT=3), self.assertNumQueries(2):
+            self.assertGreater(ApproximateCountPagination().get_count(queryset), 3)
@@ -0,0 +1,106 @@
+import json
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.authentication import views as authentication_views
+from api.authentication.models import Company, ConsumerKey, APIKeyActivityRollup
+from api.payment import views as payment_views
+from api.payment.models import Payment
+from api.sms import views as sms_views
+from api.sms.models import SMSRequest, EmailRequest, GroupMember
+from tests.factories.auth_factories import UserFactory
+
+COMPANY_COUNT = 50
+ROWS_PER_COMPANY = 200
+
+
+def get_seq_scans(plan):
+    """Get the tables read with a sequential scan anywhere in a plan"""
+    tables = {plan["Relation Name"]} if plan["Node Type"] == "Seq Scan" else set()
+    for child in plan.get("Plans", []):
+        tables |= get_seq_scans(child)
+    return tables
+
+
+class TestListQueryPlans(TestCase):
+    """
+    Test that the main list endpoints read large company scoped tables
+    through their indexes instead of scanning them
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory.create(is_verified=True)
+        companies = Company.objects.bulk_create(
+            Company(name=f"company {index}", county="Nairobi") for index in range(COMPANY_COUNT)
+        ) + [cls.user.company]
+        consumer_key = ConsumerKey.objects.create(user=cls.user, company=cls.user.company, name="shop")
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        rows = [(company, index) for index in range(ROWS_PER_COMPANY) for company in companies]
+
+        SMSRequest.objects.bulk_create(
+            (SMSRequest(company=company, message="hello", is_deleted=index % 10 == 0) for company, index in rows),
+            batch_size=5000
+        )
+        EmailRequest.objects.bulk_create(
+            (EmailRequest(company=company, message="hello", subject="hi") for company, _ in rows), batch_size=5000
+        )
+        GroupMember.objects.bulk_create(
+            (GroupMember(company=company, phone=f"+2547{number:08d}") for number, (company, _) in enumerate(rows)),
+            batch_size=5000
+        )
+        Payment.objects.bulk_create((Payment(company=company, amount=100) for company, _ in rows), batch_size=5000)
+        APIKeyActivityRollup.objects.bulk_create(
+            (
+                APIKeyActivityRollup(
+                    company=company, key=consumer_key, url=f"/api/v1/{company.pk}/", method="GET",
+                    granularity="hour", period_start=hour - timedelta(hours=index), count=1
+                )
+                for company, index in rows
+            ),
+            batch_size=5000
+        )
+        cls.tables = {
+            model._meta.db_table for model in (SMSRequest, EmailRequest, GroupMember, Payment, APIKeyActivityRollup)
+        }
+        with connection.cursor() as cursor:
+            for table in cls.tables:
+                cursor.execute(f"ANALYZE {table}")
+
+    def assert_no_seq_scans(self, view, url, **kwargs):
+        """Explain every query a list request runs and fail on sequential scans of the seeded tables"""
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query["sql"].startswith("SELECT"):
+                    continue
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {query['sql']}")
+                plan = cursor.fetchone()[0]
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                self.assertFalse(get_seq_scans(plan[0]["Plan"]) & self.tables, query["sql"])
+
+    def test_sms_request_list_uses_indexes(self):
+        self.assert_no_seq_scans(sms_views.SMSRequestView.as_view(), "/api/v1/sms/")
+
+    def test_email_request_list_uses_indexes(self):
+        self.assert_no_seq_scans(sms_views.SMSRequestView.as_view(), "/api/v1/sms/?medium=email")
+
+    def test_group_member_list_uses_indexes(self):
+        self.assert_no_seq_scans(sms_views.GroupMembersView.as_view(), "/api/v1/sms/groups/members/")
+
+    def test_payment_list_uses_indexes(self):
+        self.assert_no_seq_scans(payment_views.PaymentListView.as_view(), "/api/v1/payment/")
+
+    def test_key_activity_list_uses_indexes(self):
+        self.assert_no_seq_scans(
+            authentication_views.GetKeyActivityKeyView.as_view(), "/api/v1/auth/consumer-keys/activity/"
+        )
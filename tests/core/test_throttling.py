@@ -0,0 +1,63 @@
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.authentication.models import ConsumerKey
+from api.sms import views
+from core.middleware import RateLimitHeadersMiddleware
+from core.utils import rate_limit_helpers
+from tests.factories.auth_factories import UserFactory
+
+
+@override_settings(
+    RATE_LIMIT_REDIS_URL=None, COMPANY_RATE_LIMIT=1, COMPANY_RATE_LIMIT_BURST=3,
+    CONSUMER_KEY_RATE_LIMIT=1, CONSUMER_KEY_RATE_LIMIT_BURST=2
+)
+class TestTenantRateThrottle(TestCase):
+    """Test request throttling per company and per consumer key"""
+
+    def setUp(self):
+        rate_limit_helpers._local_token_bucket = None
+        self.request_factory = APIRequestFactory()
+        self.user = UserFactory.create(is_verified=True)
+
+    def list_templates(self, token=None):
+        request = self.request_factory.get("/api/v1/sms/template/")
+        force_authenticate(request, self.user, token=token)
+        return views.SMSTemplateView.as_view()(request), request
+
+    def test_company_is_throttled_after_its_burst(self):
+        """Test that requests past the company bucket are rejected with a retry time"""
+        for remaining in (2, 1, 0):
+            response, request = self.list_templates()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(request.rate_limit["remaining"], remaining)
+        response, request = self.list_templates()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_consumer_key_is_throttled_before_its_company(self):
+        """Test that a key running out of requests leaves its company requests for other callers"""
+        consumer_key = ConsumerKey.objects.create(user=self.user, company=self.user.company, name="shop")
+        for _ in range(2):
+            self.assertEqual(self.list_templates(consumer_key)[0].status_code, status.HTTP_200_OK)
+        self.assertEqual(self.list_templates(consumer_key)[0].status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.list_templates()[0].status_code, status.HTTP_200_OK)
+
+    def test_headers_describe_the_emptiest_bucket(self):
+        """Test that the limit, remaining and reset values all come from the bucket that throttles first"""
+        consumer_key = ConsumerKey.objects.create(user=self.user, company=self.user.company, name="shop")
+        self.assertEqual(self.list_templates(consumer_key)[1].rate_limit, {"limit": 2, "remaining": 1, "reset": 1})
+        self.list_templates()
+        self.assertEqual(self.list_templates(consumer_key)[1].rate_limit, {"limit": 3, "remaining": 0, "reset": 3})
+
+    def test_middleware_adds_rate_limit_headers(self):
+        """Test that the throttle state of a request is returned in the rate limit headers"""
+        request = RequestFactory().get("/api/v1/sms/")
+        request.rate_limit = {"limit": 3, "remaining": 1, "reset": 2}
+        response = RateLimitHeadersMiddleware(lambda request: HttpResponse())(request)
+        self.assertEqual(
+            [response[header] for header in ("X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset")],
+            ["3", "1", "2"]
+        )
@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.authentication import views
+from api.authentication.models import ConsumerKey, APIKeyActivity, APIKeyActivityRollup
+from core.backends import ConsumerKeyAuthentication
+from core.utils import api_key_helpers, buffer_helpers
+from tests.factories.auth_factories import UserFactory
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    API_KEY_ACTIVITY_REDIS_URL=None, API_KEY_ACTIVITY_FLUSH_THRESHOLD=0, LOCAL_WRITE_BUFFERS=True
+)
+class TestConsumerKeyAuthentication(TestCase):
+    """Test cached consumer key authentication and buffered activity logging"""
+
+    def setUp(self):
+        buffer_helpers._local_buffers.clear()
+        user = UserFactory.create(is_api_key_agent=True)
+        self.consumer_key = ConsumerKey.objects.create(user=user, company=user.company, name="integration")
+        self.request_factory = APIRequestFactory()
+
+    def authenticate(self, key):
+        request = self.request_factory.get("/api/v1/sms/", HTTP_CONSUMER_KEY=key)
+        return ConsumerKeyAuthentication().authenticate(request)
+
+    def test_authentication_is_served_from_the_cache(self):
+        """Test that repeated requests with a key run no queries and log no rows inline"""
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(self.consumer_key.key)
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(self.consumer_key.key)
+            self.assertEqual(user.company.pk, self.consumer_key.company_id)
+        self.assertFalse(APIKeyActivity.objects.exists())
+
+    @override_settings(API_KEY_ACTIVITY_REDIS_URL="redis://127.0.0.1:1/0")
+    def test_unreachable_redis_does_not_break_authentication(self):
+        """Test that activity is written inline while the buffer redis is down"""
+        user, _ = self.authenticate(self.consumer_key.key)
+        self.assertEqual(user.pk, self.consumer_key.user_id)
+        self.assertEqual(APIKeyActivity.objects.filter(key=self.consumer_key).count(), 1)
+
+    def test_only_the_prefix_and_digest_of_a_key_are_stored(self):
+        """Test that a stored key can not be read back and a key sharing its prefix is rejected"""
+        stored = ConsumerKey.objects.get(pk=self.consumer_key.pk)
+        self.assertFalse(hasattr(stored, "key"))
+        self.assertEqual(stored.prefix, self.consumer_key.key[:ConsumerKey.PREFIX_LENGTH])
+        self.assertEqual(len(stored.digest), 64)
+        self.assertIsNone(self.authenticate(stored.prefix + "x" * 20))
+
+    def test_raw_key_is_only_shown_on_create(self):
+        """Test that listing keys shows their prefix instead of the key"""
+        user = UserFactory.create(phone="+254700000123")
+        request = self.request_factory.post("/api/v1/auth/consumer-keys/", {"name": "shop"})
+        force_authenticate(request, user)
+        response = views.CreateConsumerKeyView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["prefix"], response.data["key"][:ConsumerKey.PREFIX_LENGTH])
+        self.assertEqual(self.authenticate(response.data["key"])[0].full_name, "shop")
+
+        request = self.request_factory.get("/api/v1/auth/consumer-keys/")
+        force_authenticate(request, user)
+        response = views.CreateConsumerKeyView.as_view()(request)
+        self.assertNotIn("key", response.data["results"][0])
+
+    def test_deleted_key_stops_authenticating(self):
+        """Test that deleting a key invalidates its cached entry"""
+        self.authenticate(self.consumer_key.key)
+        self.consumer_key.delete()
+        self.assertIsNone(self.authenticate(self.consumer_key.key))
+
+    def test_company_changes_reach_cached_keys(self):
+        """Test that saving the company of a cached key drops the cached copy"""
+        self.authenticate(self.consumer_key.key)
+        company = self.consumer_key.user.company
+        company.is_reseller = True
+        company.save()
+        user, _ = self.authenticate(self.consumer_key.key)
+        self.assertTrue(user.company.is_reseller)
+
+    def test_flush_inserts_buffered_activity_in_bulk(self):
+        """Test that buffered activity is inserted with one statement keeping the request path"""
+        for _ in range(3):
+            self.authenticate(self.consumer_key.key)
+        # the activity insert and the rollup upsert inside a savepoint
+        with self.assertNumQueries(4):
+            self.assertEqual(api_key_helpers.flush_activity_buffer(), 3)
+        activity = APIKeyActivity.objects.filter(key=self.consumer_key)
+        self.assertEqual(activity.count(), 3)
+        self.assertEqual((activity[0].url, activity[0].method), ("/api/v1/sms/", "GET"))
+
+    def test_activity_views_are_served_from_rollups(self):
+        """Test that flushed activity is counted per minute, hour and day and listed per key"""
+        for _ in range(3):
+            self.authenticate(self.consumer_key.key)
+        api_key_helpers.flush_activity_buffer()
+        self.authenticate(self.consumer_key.key)
+        api_key_helpers.flush_activity_buffer()
+        totals = APIKeyActivityRollup.objects.filter(key=self.consumer_key).values("granularity").annotate(
+            total=Sum("count")
+        )
+        self.assertEqual({row["granularity"]: row["total"] for row in totals}, {"minute": 4, "hour": 4, "day": 4})
+
+        request = self.request_factory.get("/api/v1/auth/consumer-keys/activity/", {"granularity": "day"})
+        force_authenticate(request, self.consumer_key.user)
+        response = views.GetKeyActivityKeyView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row["url"], row["count"]) for row in response.data["results"]], [("/api/v1/sms/", 4)]
+        )
+        request = self.request_factory.get(
+            f"/api/v1/auth/consumer-keys/{self.consumer_key.pk}/activity/", {"granularity": "week"}
+        )
+        force_authenticate(request, self.consumer_key.user)
+        response = views.GetSingleKeyActivityKeyView.as_view()(request, pk=self.consumer_key.pk)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(API_KEY_ACTIVITY_RETENTION_DAYS=30, API_KEY_ACTIVITY_PRUNE_BATCH_SIZE=2)
+    def test_prune_deletes_old_activity_in_batches(self):
+        """Test that raw activity past its retention is deleted and recent activity kept"""
+        for _ in range(5):
+            self.authenticate(self.consumer_key.key)
+        api_key_helpers.flush_activity_buffer()
+        old_ids = APIKeyActivity.objects.values_list("id", flat=True)[:3]
+        APIKeyActivity.objects.filter(id__in=list(old_ids)).update(created_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(api_key_helpers.prune_api_key_activity(), 3)
+        self.assertEqual(APIKeyActivity.objects.count(), 2)
+        self.assertTrue(APIKeyActivityRollup.objects.filter(granularity="minute").exists())
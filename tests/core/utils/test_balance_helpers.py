@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from rest_framework.exceptions import ValidationError
+
+from api.authentication.models import Company
+from api.payment.models import LedgerEntry, BalanceReservation
+from core.utils import balance_helpers
+from tests.factories.auth_factories import CompanyFactory
+
+
+class TestBalanceLedger(TestCase):
+    """Test debits, credits and reservations of the sms balance"""
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        Company.objects.filter(pk=self.company.pk).update(sms_count=10)
+        self.company.refresh_from_db()
+
+    def test_debit_balance_records_ledger_entry(self):
+        """Test that a debit updates the balance and is appended to the ledger"""
+        balance = balance_helpers.debit_balance(self.company, 4, reference="sms_request:1")
+        self.assertEqual(balance, 6)
+        self.assertEqual(Company.objects.get(pk=self.company.pk).sms_count, 6)
+        entry = LedgerEntry.objects.get(company=self.company)
+        self.assertEqual((entry.amount, entry.balance_after, entry.reason), (-4, 6, "send"))
+
+    def test_debit_balance_fails_without_enough_balance(self):
+        """Test that a debit larger than the balance changes nothing"""
+        with self.assertRaises(ValidationError) as error:
+            balance_helpers.debit_balance(self.company, 11)
+        self.assertIn("Your balance is 10", str(error.exception.detail["detail"]))
+        self.assertEqual(Company.objects.get(pk=self.company.pk).sms_count, 10)
+        self.assertFalse(LedgerEntry.objects.filter(company=self.company).exists())
+
+    def test_settle_reservation_refunds_unused_balance_once(self):
+        """Test that the unused part of a reservation is refunded a single time"""
+        reservation = balance_helpers.reserve_balance(self.company, 8)
+        self.assertEqual(Company.objects.get(pk=self.company.pk).sms_count, 2)
+        self.assertTrue(balance_helpers.settle_reservation(reservation.pk, 5))
+        self.assertFalse(balance_helpers.settle_reservation(reservation.pk, 5))
+        self.assertEqual(Company.objects.get(pk=self.company.pk).sms_count, 5)
+        self.assertEqual(BalanceReservation.objects.get(pk=reservation.pk).consumed, 5)
+        ledger_total = LedgerEntry.objects.filter(company=self.company).aggregate(total=Sum("amount"))["total"]
+        self.assertEqual(ledger_total, -5)
+
+
+    def test_settle_reservation_records_unpaid_overage(self):
+        """Test that an overage the balance can not cover is recorded instead of dropped"""
+        reservation = balance_helpers.reserve_balance(self.company, 8)
+        self.assertTrue(balance_helpers.settle_reservation(reservation.pk, 12))
+        reservation.refresh_from_db()
+        self.assertEqual((reservation.status, reservation.consumed, reservation.unpaid), ("settled", 12, 4))
+        self.assertEqual(Company.objects.get(pk=self.company.pk).sms_count, 2)
+
+
+class TestConcurrentDebits(TransactionTestCase):
+    """Test that debits from many threads neither overdraw nor get lost"""
+
+    def debit(self, company_id):
+        company = Company.objects.get(pk=company_id)
+        try:
+            balance_helpers.debit_balance(company, 3)
+            return True
+        except ValidationError:
+            return False
+        finally:
+            connection.close()
+
+    def test_concurrent_debits_do_not_overdraw(self):
+        company = CompanyFactory.create()
+        Company.objects.filter(pk=company.pk).update(sms_count=100)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(self.debit, [company.pk] * 60))
+
+        balance = Company.objects.get(pk=company.pk).sms_count
+        self.assertEqual(results.count(True), 33)
+        self.assertEqual(balance, 1)
+        ledger_total = LedgerEntry.objects.filter(company=company).aggregate(total=Sum("amount"))["total"]
+        self.assertEqual(ledger_total, -99)
@@ -0,0 +1,101 @@
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+from openpyxl import Workbook
+import pandas as pd
+
+from api.sms.serializers import EmailGroupMemberUploadSerializer
+from core.utils.helpers import CsvExcelReader, add_country_code, normalize_phone_numbers
+
+
+class TestCsvExcelReader(TestCase):
+    """Test vectorised validation of uploaded contacts"""
+
+    def create_reader(self, content, required_headers, **kwargs):
+        file = SimpleUploadedFile("contacts.csv", content.encode(), content_type="text/csv")
+        return CsvExcelReader(file, required_headers, **kwargs)
+
+    def read_all_rows(self, reader, columns):
+        rows = {}
+        skipped_lines = []
+        for data in reader.iter_chunks():
+            chunk_rows, chunk_skipped_lines = reader.get_valid_rows(columns, data)
+            rows.update(chunk_rows)
+            skipped_lines += chunk_skipped_lines
+        return (rows, skipped_lines)
+
+    def test_normalize_phone_numbers_matches_add_country_code(self):
+        """Test that the vectorised normaliser agrees with add_country_code"""
+        numbers = ["726406913", "726406913.0", "0726406913", "12345", "+254726406913", "abc", None]
+        normalized = normalize_phone_numbers(pd.Series(numbers, dtype=object)).tolist()
+        for number, phone in zip(numbers, normalized):
+            try:
+                expected = add_country_code(str(number))
+            except (ValidationError, ValueError):
+                expected = None
+            self.assertEqual(phone if isinstance(phone, str) else None, expected)
+
+    def test_get_valid_rows_skips_invalid_phone_numbers(self):
+        """Test that rows are normalised and invalid lines reported"""
+        reader = self.create_reader(
+            "phone,first_name\n726406913,Jane\n1234,John\n724056913,\n", ["phone", "first_name"]
+        )
+        rows, skipped_lines = reader.get_valid_rows(["phone", "first_name", "last_name"])
+        self.assertEqual(rows, {1: {"phone": "+254726406913", "first_name": "Jane"}})
+        self.assertEqual(skipped_lines, [2, 3])
+
+    def test_get_valid_rows_falls_back_to_serializer_for_emails(self):
+        """Test that emails the pattern rejects are re-validated by the serializer"""
+        reader = self.create_reader(
+            "email\njane@example.com\njane.o'neil@example.com\nnot-an-email\n", ["email"]
+        )
+        rows, skipped_lines = reader.get_valid_rows(
+            ["email"], fallback_serializer=EmailGroupMemberUploadSerializer
+        )
+        self.assertEqual([row["email"] for row in rows.values()], ["jane@example.com", "jane.o'neil@example.com"])
+        self.assertEqual(skipped_lines, [3])
+
+    def test_stream_mode_matches_whole_file_mode(self):
+        """Test that reading in chunks drops the same duplicates as reading the whole file"""
+        content = "phone,first_name\n726406913,Jane\n726406914,John\n726406913,Jane\n1234,Jim\n726406914,John\n"
+        reader = self.create_reader(content, ["phone"])
+        stream_reader = self.create_reader(content, ["phone"], stream=True, chunk_size=2)
+        self.assertIsNone(stream_reader.data)
+        self.assertEqual(stream_reader.row_count, 5)
+        self.assertEqual(
+            self.read_all_rows(stream_reader, ["phone", "first_name"]),
+            self.read_all_rows(reader, ["phone", "first_name"])
+        )
+
+    def test_stream_mode_drops_duplicates_across_chunks_with_blank_cells(self):
+        """Test that a number read as int in one chunk and as float in another is dropped once seen"""
+        content = "phone,first_name\n726406913,Jane\n726406914,John\n,X\n726406913,Jane\n"
+        reader = self.create_reader(content, ["phone"])
+        stream_reader = self.create_reader(content, ["phone"], stream=True, chunk_size=2)
+        rows, skipped_lines = self.read_all_rows(stream_reader, ["phone", "first_name"])
+        self.assertEqual([row["phone"] for row in rows.values()], ["+254726406913", "+254726406914"])
+        self.assertEqual((rows, skipped_lines), self.read_all_rows(reader, ["phone", "first_name"]))
+
+    def test_stream_mode_validates_headers_from_first_chunk(self):
+        """Test that missing headers are reported before the rest of the file is read"""
+        with self.assertRaises(ValidationError):
+            self.create_reader("email\njane@example.com\n", ["phone"], stream=True, chunk_size=1)
+
+    def test_stream_mode_reads_xlsx_in_read_only_mode(self):
+        """Test that xlsx rows are read in chunks with their line numbers"""
+        workbook = Workbook()
+        sheet = workbook.active
+        for row in [("phone", "first_name"), (726406913, "Jane"), (1234, "Jim"), (726406913, "Jane"), (726406914, None)]:
+            sheet.append(row)
+        content = BytesIO()
+        workbook.save(content)
+        file = SimpleUploadedFile("contacts.xlsx", content.getvalue())
+        reader = CsvExcelReader(file, ["phone"], stream=True, chunk_size=2)
+        rows, skipped_lines = self.read_all_rows(reader, ["phone", "first_name"])
+        self.assertEqual(rows, {
+            1: {"phone": "+254726406913", "first_name": "Jane"},
+            4: {"phone": "+254726406914", "first_name": None}
+        })
+        self.assertEqual(skipped_lines, [2])
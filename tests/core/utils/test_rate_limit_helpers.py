@@ -0,0 +1,64 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from core.utils import rate_limit_helpers
+from core.utils.rate_limit_helpers import LocalTokenBucket, ProviderRateLimited
+
+
+class TestTokenBucket(SimpleTestCase):
+    """Test the in process token bucket"""
+
+    def test_acquire_charges_every_bucket_or_none(self):
+        """Test that a request denied by one bucket leaves the others untouched"""
+        token_bucket = LocalTokenBucket()
+        buckets = [("global", 10, 20), ("sender", 5, 8)]
+        self.assertEqual(token_bucket.acquire(buckets, 5)[:2], (True, [15, 3]))
+        allowed, _, wait = token_bucket.acquire(buckets, 5)
+        self.assertFalse(allowed)
+        self.assertGreater(wait, 0)
+        self.assertEqual(round(token_bucket.buckets["global"][0]), 15)
+
+    @patch("core.utils.rate_limit_helpers.time.monotonic")
+    def test_acquire_refills_at_the_bucket_rate(self, mock_monotonic):
+        """Test that tokens are added back at the configured rate up to the capacity"""
+        token_bucket = LocalTokenBucket()
+        buckets = [("global", 10, 20)]
+        mock_monotonic.return_value = 100
+        token_bucket.acquire(buckets, 20)
+        mock_monotonic.return_value = 101
+        self.assertEqual(token_bucket.acquire(buckets, 10), (True, [0], 0))
+        mock_monotonic.return_value = 110
+        self.assertEqual(token_bucket.acquire(buckets, 1), (True, [19], 0))
+
+
+@override_settings(RATE_LIMIT_REDIS_URL=None)
+class TestProviderRateLimit(SimpleTestCase):
+    """Test throttling of provider calls"""
+
+    def setUp(self):
+        rate_limit_helpers._local_token_bucket = None
+
+    @override_settings(SENDER_ID_RATE_LIMIT=1, SENDER_ID_RATE_LIMIT_BURST=5, PROVIDER_RATE_LIMIT_MAX_WAIT=0)
+    def test_wait_for_provider_capacity_is_limited_per_sender_id(self):
+        """Test that one sender id running out of capacity does not block another"""
+        rate_limit_helpers.wait_for_provider_capacity("Jambo", 5)
+        with self.assertRaises(ProviderRateLimited):
+            rate_limit_helpers.wait_for_provider_capacity("Jambo", 1)
+        rate_limit_helpers.wait_for_provider_capacity("Other", 5)
+
+    @override_settings(PROVIDER_RATE_LIMIT=100, PROVIDER_RATE_LIMIT_BURST=10)
+    @patch("core.utils.rate_limit_helpers.time.sleep")
+    def test_large_batches_are_charged_in_steps(self, mock_sleep):
+        """Test that a batch larger than a bucket waits for refills instead of failing"""
+        rate_limit_helpers.wait_for_provider_capacity("Jambo", 25)
+        self.assertTrue(mock_sleep.called)
+
+    @override_settings(RATE_LIMIT_REDIS_URL="redis://127.0.0.1:1/0")
+    def test_provider_calls_fall_back_to_local_buckets_while_redis_is_down(self):
+        """Test that an unreachable redis limits sends per process instead of failing them"""
+        rate_limit_helpers.wait_for_provider_capacity("Jambo", 5)
+        self.assertIn(
+            rate_limit_helpers.get_cache_key("rate_limit", "sender_id", "Jambo"),
+            rate_limit_helpers.get_local_token_bucket().buckets
+        )
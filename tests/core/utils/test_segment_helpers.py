@@ -0,0 +1,40 @@
+from django.test import SimpleTestCase
+
+from core.utils.segment_helpers import (
+    count_message_segments, count_personalized_segments, get_message_encoding)
+
+
+class TestSegmentCounting(SimpleTestCase):
+    """Test GSM-7 and UCS-2 aware sms segment counting"""
+
+    def test_gsm7_messages_use_153_characters_per_part(self):
+        """Test that concatenated gsm7 messages lose 7 characters per part to the header"""
+        self.assertEqual(get_message_encoding("Hello [world] €"), "gsm7")
+        self.assertEqual(count_message_segments("a" * 160), 1)
+        self.assertEqual(count_message_segments("a" * 161), 2)
+        self.assertEqual(count_message_segments("a" * 306), 2)
+        self.assertEqual(count_message_segments("a" * 307), 3)
+
+    def test_gsm7_extension_characters_count_twice(self):
+        """Test that characters of the extension table take two septets"""
+        self.assertEqual(count_message_segments("€" * 80), 1)
+        self.assertEqual(count_message_segments("€" * 81), 2)
+
+    def test_ucs2_messages_use_70_characters(self):
+        """Test that a single non gsm character switches the message to ucs2"""
+        self.assertEqual(get_message_encoding("Habari Łukasz"), "ucs2")
+        self.assertEqual(count_message_segments("ł" * 70), 1)
+        self.assertEqual(count_message_segments("ł" * 71), 2)
+        self.assertEqual(count_message_segments("ł" * 135), 3)
+        self.assertEqual(count_message_segments("😀" * 35), 1)
+        self.assertEqual(count_message_segments("😀" * 36), 2)
+
+    def test_personalized_segments_match_counting_each_message(self):
+        """Test that the vectorised count agrees with counting every rendered message"""
+        prefix, suffix = "Hi ", ", " + "come to the meeting " * 7
+        names = ["Jane", "Łukasz", "Ann{e}", "😀", "", "a" * 20, "Zoë"]
+        expected = [count_message_segments(prefix + name + suffix) for name in names]
+        self.assertEqual(list(count_personalized_segments(prefix, suffix, names)), expected)
+        unicode_suffix = suffix + "ł"
+        expected = [count_message_segments(prefix + name + unicode_suffix) for name in names]
+        self.assertEqual(list(count_personalized_segments(prefix, unicode_suffix, names)), expected)
@@ -0,0 +1,317 @@
+from unittest.mock import patch
+
+from africastalking.Service import AfricasTalkingException
+from celery.exceptions import Retry
+import requests
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from api.authentication.models import Company
+from api.sms import models
+from core.utils import sms_helpers
+from core.utils.balance_helpers import reserve_balance
+from core.utils.helpers import chunk_list
+from tests.factories.auth_factories import CompanyFactory
+
+
+def create_provider_response(number_list, status_code=101):
+    recipients = [{
+        "statusCode": status_code,
+        "number": number,
+        "status": "Success",
+        "cost": "KES 0.8000",
+        "messageId": f"ATXid_{number}"
+    } for number in number_list]
+    return {"SMSMessageData": {"Recipients": recipients}}
+
+
+class TestSMSFanOut(TestCase):
+    """Test splitting of bulk sms into provider sized batches"""
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.sms_request = models.SMSRequest.objects.create(company=self.company, message="Come")
+        self.numbers = ["+254700000%03d" % i for i in range(7)]
+
+    def test_chunk_list_splits_into_batches(self):
+        """Test that the last batch holds the remainder"""
+        batches = list(chunk_list(self.numbers, 3))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+
+    @override_settings(SMS_MAX_CONCURRENT_BATCHES=2)
+    def test_create_sms_lanes_bounds_concurrent_batches(self):
+        """Test that batches are spread over at most the configured number of chains"""
+        batches = list(chunk_list(self.numbers, 2))
+        lanes = sms_helpers.create_sms_lanes("Come", batches, self.company.pk, self.sms_request.pk)
+        self.assertEqual(len(lanes), 2)
+        self.assertEqual(sum(len(lane.tasks) for lane in lanes), len(batches))
+
+    @patch("core.utils.sms_helpers.sms")
+    def test_send_sms_batch_updates_sms_request(self, mock_sms):
+        """Test that a batch adds its results to the originating request"""
+        mock_sms.send.return_value = create_provider_response(self.numbers[:3])
+        sms_helpers.send_sms_batch("Come", self.numbers[:3], self.company.pk, self.sms_request.pk)
+        self.sms_request.refresh_from_db()
+        self.assertEqual(self.sms_request.sent_count, 3)
+        self.assertEqual(self.sms_request.completed_batch_count, 1)
+        self.assertEqual(models.SentSMS.objects.filter(company=self.company).count(), 3)
+
+    @patch("core.utils.sms_helpers.sms")
+    def test_sms_request_is_finalized_after_last_batch(self, mock_sms):
+        """Test that the request status reflects all of its batches once they complete"""
+        models.SMSRequest.objects.filter(pk=self.sms_request.pk).update(status="sending", batch_count=2)
+        mock_sms.send.return_value = create_provider_response(self.numbers[:3])
+        sms_helpers.send_sms_batch("Come", self.numbers[:3], self.company.pk, self.sms_request.pk)
+        self.sms_request.refresh_from_db()
+        self.assertEqual(self.sms_request.status, "sending")
+
+        mock_sms.send.return_value = create_provider_response(self.numbers[3:], status_code=403)
+        sms_helpers.send_sms_batch("Come", self.numbers[3:], self.company.pk, self.sms_request.pk)
+        self.sms_request.refresh_from_db()
+        self.assertEqual(self.sms_request.status, "partially_failed")
+        self.assertEqual(self.sms_request.failed_count, 4)
+
+    @patch("core.utils.sms_helpers.sms")
+    def test_finalized_sms_request_settles_reservation(self, mock_sms):
+        """Test that segments of failed recipients are refunded once the request completes"""
+        Company.objects.filter(pk=self.company.pk).update(sms_count=10)
+        reservation = reserve_balance(self.company, 7)
+        models.SMSRequest.objects.filter(pk=self.sms_request.pk).update(
+            status="sending", batch_count=1, reservation=reservation
+        )
+        response = create_provider_response(self.numbers)
+        for recipient in response["SMSMessageData"]["Recipients"][:2]:
+            recipient["statusCode"] = 403
+        mock_sms.send.return_value = response
+        sms_helpers.send_sms_batch("Come", self.numbers, self.company.pk, self.sms_request.pk)
+        self.assertEqual(Company.objects.get(pk=self.company.pk).sms_count, 5)
+
+    @override_settings(SMS_REQUEST_STALE_AFTER=0)
+    @patch("core.utils.sms_helpers.sms")
+    def test_stale_sms_request_is_failed_and_settled(self, mock_sms):
+        """Test that a request whose last batch never reports back is failed and refunded"""
+        Company.objects.filter(pk=self.company.pk).update(sms_count=10)
+        reservation = reserve_balance(self.company, 7)
+        models.SMSRequest.objects.filter(pk=self.sms_request.pk).update(
+            status="sending", batch_count=2, reservation=reservation
+        )
+        mock_sms.send.return_value = create_provider_response(self.numbers[:3])
+        sms_helpers.send_sms_batch("Come", self.numbers[:3], self.company.pk, self.sms_request.pk)
+
+        self.assertEqual(sms_helpers.finalize_stale_sms_requests(), 1)
+        self.sms_request.refresh_from_db()
+        self.assertEqual(self.sms_request.status, "partially_failed")
+        self.assertEqual(Company.objects.get(pk=self.company.pk).sms_count, 7)
+        self.assertEqual(sms_helpers.finalize_stale_sms_requests(), 0)
+
+    def test_sending_sms_request_is_not_stale(self):
+        """Test that a request with recent batch results is left to its batches"""
+        models.SMSRequest.objects.filter(pk=self.sms_request.pk).update(status="sending", batch_count=2)
+        sms_helpers.record_sms_batch_result(self.sms_request.pk, 3, 0)
+        self.assertEqual(sms_helpers.finalize_stale_sms_requests(), 0)
+        self.assertEqual(models.SMSRequest.objects.get(pk=self.sms_request.pk).status, "sending")
+
+
+
+
+
+class TestSMSRetries(TestCase):
+    """Test retrying and dead lettering of failed provider sends"""
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        Company.objects.filter(pk=self.company.pk).update(sms_count=10)
+        self.sms_request = models.SMSRequest.objects.create(
+            company=self.company, message="Come", status="sending", batch_count=1,
+            reservation=reserve_balance(self.company, 3)
+        )
+        self.numbers = ["+254700000%03d" % i for i in range(3)]
+
+    def test_is_transient_provider_error(self):
+        """Test that only errors where nothing was sent are retried"""
+        self.assertTrue(sms_helpers.is_transient_provider_error(requests.exceptions.ConnectTimeout()))
+        self.assertTrue(sms_helpers.is_transient_provider_error(AfricasTalkingException("Bad gateway")))
+        self.assertFalse(sms_helpers.is_transient_provider_error(requests.exceptions.ReadTimeout()))
+        self.assertFalse(sms_helpers.is_transient_provider_error(
+            AfricasTalkingException("The supplied authentication is invalid")
+        ))
+
+    @patch("core.utils.sms_helpers.send_sms_batch.retry", side_effect=Retry)
+    @patch("core.utils.sms_helpers.sms")
+    def test_only_transient_failures_are_retried(self, mock_sms, mock_retry):
+        """Test that a retry resends the transient failures only"""
+        response = create_provider_response(self.numbers)
+        recipients = response["SMSMessageData"]["Recipients"]
+        recipients[1]["statusCode"], recipients[1]["messageId"] = 500, "None"
+        recipients[2]["statusCode"], recipients[2]["messageId"] = 403, "None"
+        mock_sms.send.return_value = response
+        with self.assertRaises(Retry):
+            sms_helpers.send_sms_batch("Come", self.numbers, self.company.pk, self.sms_request.pk)
+
+        self.assertEqual(mock_retry.call_args[1]["args"][1], [self.numbers[1]])
+        self.assertEqual(list(models.FailedSMS.objects.values_list("phone_number", "status_code")), [(self.numbers[2], 403)])
+        self.sms_request.refresh_from_db()
+        self.assertEqual((self.sms_request.sent_count, self.sms_request.failed_count), (1, 1))
+        self.assertEqual(self.sms_request.completed_batch_count, 0)
+
+    @patch("core.utils.sms_helpers.sms")
+    def test_exhausted_batch_is_dead_lettered_and_refunded(self, mock_sms):
+        """Test that recipients of a batch that keeps failing are stored and their balance refunded"""
+        mock_sms.send.side_effect = requests.exceptions.ConnectionError("Connection refused")
+        with patch.object(sms_helpers.send_sms_batch, "max_retries", 0):
+            sms_helpers.send_sms_batch("Come", self.numbers, self.company.pk, self.sms_request.pk)
+
+        self.assertEqual(models.FailedSMS.objects.filter(sms_request=self.sms_request).count(), 3)
+        self.sms_request.refresh_from_db()
+        self.assertEqual(self.sms_request.status, "failed")
+        self.assertEqual(Company.objects.get(pk=self.company.pk).sms_count, 10)
+
+class TestPersonalizedSMS(TestCase):
+    """Test batched sending of personalized sms"""
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.sms_request = models.SMSRequest.objects.create(company=self.company, message="Come")
+        self.contacts = [{"phone": "+254700000%03d" % i, "first_name": f"Name{i}"} for i in range(5)]
+
+    @override_settings(PERSONALIZED_SMS_BATCH_SIZE=2, SMS_MAX_CONCURRENT_BATCHES=2)
+    @patch("core.utils.sms_helpers.group")
+    def test_send_mass_unique_sms_renders_messages_into_batches(self, mock_group):
+        """Test that messages are rendered up front and spread over lanes of batches"""
+        batch_count = sms_helpers.send_mass_unique_sms("come", "Hi", self.contacts, self.company.pk, self.sms_request.pk)
+        self.assertEqual(batch_count, 3)
+        lanes = mock_group.call_args[0][0]
+        self.assertEqual(len(lanes), 2)
+        first_batch = lanes[0].tasks[0].args[0]
+        self.assertEqual(first_batch, [["+254700000000", "Hi Name0, come"], ["+254700000001", "Hi Name1, come"]])
+        self.sms_request.refresh_from_db()
+        self.assertEqual((self.sms_request.status, self.sms_request.batch_count), ("sending", 3))
+
+    @patch("core.utils.sms_helpers.sms")
+    def test_send_personalized_sms_batch_logs_every_contact(self, mock_sms):
+        """Test that each rendered message is sent on its own and logged"""
+        mock_sms.send.side_effect = lambda text, numbers, sender_id: create_provider_response(numbers)
+        messages = [[contact["phone"], f"Hi {contact['first_name']}"] for contact in self.contacts]
+        sent_count = sms_helpers.send_personalized_sms_batch(messages, self.company.pk, self.sms_request.pk)
+        self.assertEqual(sent_count, 5)
+        self.assertCountEqual(
+            [call[0][0] for call in mock_sms.send.call_args_list], [text for _, text in messages]
+        )
+        self.assertEqual(models.SentSMS.objects.filter(company=self.company).count(), 5)
+        self.sms_request.refresh_from_db()
+        self.assertEqual((self.sms_request.sent_count, self.sms_request.segment_count), (5, 5))
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TestSenderIdCache(TestCase):
+    """Test caching of the sender id of branded companies"""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.company = CompanyFactory.create()
+        self.brand = models.SMSBranding.objects.create(name="Jambo", company=self.company)
+
+    def test_get_sms_branding_is_cached(self):
+        """Test that the sender id is resolved once per company"""
+        with self.assertNumQueries(1):
+            self.assertEqual(sms_helpers.get_sms_branding(self.company.pk), settings.COMPANY_BRAND_NAME)
+        with self.assertNumQueries(0):
+            self.assertEqual(sms_helpers.get_sms_branding(self.company.pk), settings.COMPANY_BRAND_NAME)
+
+    def test_branding_approval_invalidates_sender_id(self):
+        """Test that an approved branding is used by the next send"""
+        sms_helpers.get_sms_branding(self.company.pk)
+        self.brand.is_active = True
+        self.brand.is_approved = True
+        self.brand.save()
+        self.assertEqual(sms_helpers.get_sms_branding(self.company.pk), "Jambo")
+        self.brand.delete()
+        self.assertEqual(sms_helpers.get_sms_branding(self.company.pk), settings.COMPANY_BRAND_NAME)
+
+class TestGroupRecipients(TestCase):
+    """Test resolving recipients of several groups"""
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.groups = [models.SMSGroup.objects.create(name=name, company=self.company) for name in ["a", "b"]]
+        for phone in ["+254700000001", "+254700000002"]:
+            member = models.GroupMember.objects.create(phone=phone, company=self.company)
+            for group in self.groups:
+                group.members.add(member)
+
+    def test_get_group_recipients_is_distinct(self):
+        """Test that members of several groups are returned once"""
+        group_ids = [group.pk for group in self.groups]
+        recipients = sms_helpers.get_group_recipients(models.SMSGroup, group_ids)
+        self.assertCountEqual(list(recipients), ["+254700000001", "+254700000002"])
+
+    def test_stream_group_recipients_leaves_out_excluded(self):
+        """Test that recepients passed separately are not streamed again"""
+        group_ids = [group.pk for group in self.groups]
+        recipients = sms_helpers.stream_group_recipients(models.SMSGroup, group_ids, exclude=["+254700000001"])
+        self.assertEqual(list(recipients), ["+254700000002"])
+
+    def test_get_group_recipients_leaves_out_deleted_members(self):
+        """Test that soft deleted members are not sent to"""
+        models.GroupMember.objects.filter(phone="+254700000001").update(is_deleted=True)
+        recipients = sms_helpers.get_group_recipients(models.SMSGroup, [group.pk for group in self.groups])
+        self.assertEqual(list(recipients), ["+254700000002"])
+
+
+class TestSentSMSLogging(TestCase):
+    """Test bulk logging of provider responses"""
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.numbers = ["+254700000%03d" % i for i in range(5)]
+
+    @override_settings(SENT_SMS_LOG_BATCH_SIZE=2)
+    def test_log_sent_messages_creates_rows_in_chunks(self):
+        """Test that every recipient is logged when written in chunks"""
+        recipients = create_provider_response(self.numbers)["SMSMessageData"]["Recipients"]
+        sms_helpers.log_sent_messages(recipients, self.company.pk)
+        sms_helpers.log_sent_messages(recipients, self.company.pk)
+        self.assertEqual(models.SentSMS.objects.filter(company=self.company).count(), 5)
+
+    def test_log_sent_messages_skips_rejected_recipients(self):
+        """Test that recipients without a message id are not logged"""
+        recipients = create_provider_response(self.numbers, status_code=403)["SMSMessageData"]["Recipients"]
+        for recipient in recipients:
+            recipient["messageId"] = "None"
+        sms_helpers.log_sent_messages(recipients, self.company.pk)
+        self.assertFalse(models.SentSMS.objects.filter(company=self.company).exists())
+
+    @override_settings(SENT_SMS_LOG_METHOD="copy")
+    def test_log_sent_messages_with_copy(self):
+        """Test that recipients can be logged through postgres COPY"""
+        recipients = create_provider_response(self.numbers)["SMSMessageData"]["Recipients"]
+        sms_helpers.log_sent_messages(recipients, self.company.pk)
+        self.assertEqual(models.SentSMS.objects.filter(company=self.company).count(), 5)
+
+
+class TestBulkUpsertGroupMembers(TestCase):
+    """Test bulk import of uploaded group members"""
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.group = models.SMSGroup.objects.create(name="a", company=self.company)
+        self.existing = models.GroupMember.objects.create(phone="+254700000001", first_name="Old", company=self.company)
+        self.rows = [{"phone": "+254700000%03d" % i, "first_name": "New"} for i in range(5)]
+
+    def test_bulk_upsert_group_members_adds_new_and_existing_members(self):
+        """Test that existing members are reused and every member is added to the group"""
+        members = sms_helpers.bulk_upsert_group_members(self.group, models.GroupMember, self.rows)
+        self.assertEqual([member.phone for member in members], [row["phone"] for row in self.rows])
+        self.assertIn(self.existing, members)
+        self.assertEqual(self.group.members.count(), 5)
+        self.assertEqual(models.GroupMember.objects.filter(company=self.company).count(), 5)
+
+    @override_settings(MEMBER_IMPORT_BATCH_SIZE=1000)
+    def test_bulk_upsert_group_members_query_count_is_constant(self):
+        """Test that the import does not issue queries per member"""
+        rows = [{"phone": "+254711%06d" % i} for i in range(500)]
+        with self.assertNumQueries(3):
+            sms_helpers.bulk_upsert_group_members(self.group, models.GroupMember, rows)
+        self.assertEqual(self.group.members.count(), 500)
+